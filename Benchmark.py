@@ -0,0 +1,210 @@
+"""Mikro-Benchmarks für die zeitkritischen Teile des SB-GoE-Überschussladens, ganz ohne Netzwerk.
+Programm CC-BY Musicaloris
+Projekt-Repository: https://github.com/Musicaloris/sb-goe-ueberschussladen/
+
+Aufruf:
+    python Benchmark.py messen [--speichern ergebnis.json]
+    python Benchmark.py vergleichen basis.json neu.json [--toleranz 15]"""
+
+# Python Standard Libraries importieren
+import argparse  # Für die Kommandozeilenparameter
+import contextlib  # Für das Umleiten der Konsolenausgaben
+import glob  # Für das Finden der JSON-Beispiele
+import json  # Für das Lesen und Speichern der Ergebnisse
+import os  # Für Dateioperationen
+import platform  # Für die Beschreibung des Systems
+import statistics  # Für Median und Streuung
+import subprocess  # Für die Messung der Startzeit
+import sys  # Für Systemoperationen
+import tempfile  # Für ein Log-Verzeichnis, das nach dem Benchmark wieder verschwindet
+import time  # Für Zeitmessung und Zeitstempel
+import timeit  # Für die eigentlichen Messungen
+import tracemalloc  # Für den Speicherbedarf
+
+# 3rd Party Libraries importieren
+import tomli  # Für das Einlesen der Konfigurationsdatei
+
+# Funktionen-Library dieses Projekts importieren
+import sbgoelib
+
+BEISPIEL_VERZEICHNIS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Beispieldaten', 'JSON Beispiele')
+KONFIGURATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.toml')
+WIEDERHOLUNGEN = 7  # Messreihen je Benchmark
+
+
+def zeit_messen(funktion, aufrufe: int) -> dict:
+    """Misst eine Funktion in WIEDERHOLUNGEN Messreihen zu je aufrufe Aufrufen.
+
+    :return: dict-Objekt mit Median, Minimum und Streuung in Mikrosekunden je Aufruf
+    """
+    reihen = [zeit / aufrufe * 1e6 for zeit in timeit.repeat(funktion, number=aufrufe, repeat=WIEDERHOLUNGEN)]
+    return {'median_us': statistics.median(reihen), 'min_us': min(reihen), 'stdev_us': statistics.stdev(reihen)}
+
+
+def beispiele_laden() -> dict:
+    """Lädt die JSON-Beispiele als Text und als Status-Objekte wie aus daten_holen."""
+    beispiele = {}
+    for name in sorted(glob.glob(os.path.join(BEISPIEL_VERZEICHNIS, '*.json'))):
+        with open(name, encoding='utf-8') as beispiel:
+            beispiele[os.path.basename(name)[:-5]] = beispiel.read()
+    return beispiele
+
+
+def messen(konf: dict) -> dict:
+    """Führt alle Benchmarks aus.
+
+    :param konf: dict-Objekt mit der Konfiguration aus config.toml
+    :return: dict-Objekt {Benchmark-Name: Messwerte}
+    """
+    ergebnisse = {}
+    beispiele = beispiele_laden()
+    goe_daten = json.loads(beispiele['goe beispiel laden 7A'])
+    goe_status = sbgoelib.GoEStatus('Go-E', time.time(), 0.01, 200).uebernehmen(goe_daten, True)
+    sb_status = sbgoelib.SBStatus('SB', time.time(), 0.01, 200).uebernehmen(json.loads(beispiele['sb entladen']), True)
+    ladekurve = sbgoelib.Ladekurve(konf['ladekurve'], konf['ladekurve_glaettung'])
+
+    # JSON-Dekodierung der Geräte-Antworten
+    for name, text in beispiele.items():
+        ergebnisse[f'json_dekodieren[{name}]'] = zeit_messen(lambda text=text: json.loads(text), 2000)
+
+    # Umwandeln der JSON-Daten in ein Status-Objekt wie in daten_holen, mit und ohne Behalten für das Logging
+    for rohdaten_behalten in (True, False):
+        ergebnisse[f'status_einlesen[goe,rohdaten={rohdaten_behalten}]'] = zeit_messen(
+            lambda rohdaten_behalten=rohdaten_behalten: sbgoelib.GoEStatus('Go-E', 0.0, 0.01, 200).uebernehmen(
+                goe_daten, rohdaten_behalten), 5000)
+
+    # Konfigurationsprüfung
+    ergebnisse['konfigurationswerte_pruefen'] = zeit_messen(lambda: sbgoelib.konfigurationswerte_pruefen(konf), 5000)
+
+    # Ladekurve: Lernen eines Messpunkts und Suche mit frisch berechneter Hülle
+    ergebnisse['ladekurve_lernen_und_suchen'] = zeit_messen(
+        lambda: (ladekurve.lernen(7, 2500), ladekurve.max_amp(5000)), 5000)
+    ladekurve = sbgoelib.Ladekurve(konf['ladekurve'], konf['ladekurve_glaettung'])
+
+    # Ladeleistung in allen Lademodi, einmal mit und einmal ohne Sprungbegrenzung
+    with open(os.devnull, 'w') as nichts, contextlib.redirect_stdout(nichts):
+        for modus in konf['laden_prio_text']:
+            for simulieren in (True, False):
+                konf_modus = konf | {'laden_prio': modus, 'simulieren': simulieren}
+                ergebnisse[f'goe_ladeleistung_bestimmen[{modus},simulieren={simulieren}]'] = zeit_messen(
+                    lambda konf_modus=konf_modus: sbgoelib.goe_ladeleistung_bestimmen(sb_status, goe_status,
+                                                                                     ladekurve, konf_modus), 2000)
+
+    # Logging: Kosten in der Hauptschleife (Einreihen) und Durchsatz des LogSchreibers bis alles auf der Platte ist
+    arbeitsverzeichnis = os.getcwd()
+    with tempfile.TemporaryDirectory() as log_verzeichnis, open(os.devnull, 'w') as nichts, \
+            contextlib.redirect_stdout(nichts):
+        os.chdir(log_verzeichnis)
+        os.mkdir('logs')
+        konf_log = konf | {'logging_nrg': True, 'logging_events': True, 'log_nur_aenderungen': False,
+                           'log_warteschlange_max': 10 ** 6, 'log_flush_zeilen': 500, 'log_flush_s': 1}
+        try:
+            for log_format in ('csv', 'binaer'):
+                konf_format = konf_log | {'log_format': log_format}
+                ergebnisse[f'log_nrg[{log_format}]'] = zeit_messen(
+                    lambda: sbgoelib.log_nrg('goe', goe_status, konf_format), 1000)
+            ergebnisse['log_event'] = zeit_messen(lambda: sbgoelib.log_event('Benchmark-Meldung', konf_log), 1000)
+            sbgoelib.log_schreiber_holen(konf_log).beenden(timeout=600)
+
+            # Durchsatz eines eigenen LogSchreibers vom ersten Einreihen bis alles geschrieben ist
+            zeile = (f'{time.strftime("%H:%M:%S")};' + ''.join(f'{wert};' for wert in goe_status.als_dict().values())
+                     + '\n')
+            schreiber = sbgoelib.LogSchreiber(10 ** 6, 500, 3600)
+            zeilen = 20000
+            start = time.perf_counter()
+            for _ in range(zeilen):
+                schreiber.schreiben('logs/durchsatz-log.csv', zeile)
+            schreiber.beenden(timeout=600)
+            dauer = time.perf_counter() - start
+            ergebnisse['log_schreiber_durchsatz'] = {'zeilen': zeilen, 'dauer_s': dauer,
+                                                     'us_je_zeile': dauer / zeilen * 1e6}
+        finally:
+            os.chdir(arbeitsverzeichnis)
+
+    # Speicherbedarf eines Zyklus aus Dekodieren, Ladeleistung bestimmen und Logzeile bauen
+    with open(os.devnull, 'w') as nichts, contextlib.redirect_stdout(nichts):
+        tracemalloc.start()
+        for _ in range(100):
+            goe_zyklus = sbgoelib.GoEStatus('Go-E', time.time(), 0.01, 200).uebernehmen(
+                json.loads(beispiele['goe beispiel laden 7A']), konf['logging_nrg'])
+            sb_zyklus = sbgoelib.SBStatus('SB', time.time(), 0.01, 200).uebernehmen(
+                json.loads(beispiele['sb entladen']), konf['logging_nrg'])
+            sbgoelib.goe_ladeleistung_bestimmen(sb_zyklus, goe_zyklus, ladekurve, konf)
+            ';'.join(f'{wert}' for wert in goe_zyklus.als_dict().values())
+        _, spitze = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    ergebnisse['zyklus_speicher_spitze'] = {'kib': spitze / 1024}
+
+    # Startzeit und Speicher eines frischen Interpreters mit Library und Konfiguration
+    start_code = ('import resource, tomli, sbgoelib\n'
+                  f'konf = tomli.load(open({KONFIGURATION!r}, "rb"))\n'
+                  'sbgoelib.konfigurationswerte_pruefen(konf)\n'
+                  'print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)')
+    startzeiten, max_rss = [], []
+    for _ in range(WIEDERHOLUNGEN):
+        start = time.perf_counter()
+        ausgabe = subprocess.run([sys.executable, '-c', start_code], capture_output=True, text=True, check=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__)))
+        startzeiten.append((time.perf_counter() - start) * 1000)
+        max_rss.append(int(ausgabe.stdout.strip()))
+    ergebnisse['start'] = {'median_ms': statistics.median(startzeiten), 'min_ms': min(startzeiten),
+                           'max_rss_kib': statistics.median(max_rss)}
+    return ergebnisse
+
+
+def vergleichen(basis: dict, neu: dict, toleranz: float) -> int:
+    """Vergleicht zwei gespeicherte Ergebnisse und markiert Verschlechterungen über toleranz Prozent.
+
+    :return: Anzahl der Verschlechterungen
+    """
+    # Kleiner ist besser. Verglichen wird das Minimum der Messreihen, das schwankt deutlich weniger als der Median.
+    messgroessen = ('min_us', 'us_je_zeile', 'kib', 'min_ms', 'max_rss_kib')
+    verschlechterungen = 0
+    print(f'Basis: {basis["system"]["zeit"]} auf {basis["system"]["plattform"]}')
+    print(f'Neu:   {neu["system"]["zeit"]} auf {neu["system"]["plattform"]}')
+    print('-' * 35)
+    for name, werte_neu in neu['ergebnisse'].items():
+        if name not in basis['ergebnisse']:
+            print(f'    {name}: neu, kein Vergleich möglich')
+            continue
+        for messgroesse in messgroessen:
+            if messgroesse not in werte_neu or messgroesse not in basis['ergebnisse'][name]:
+                continue
+            alt, aktuell = basis['ergebnisse'][name][messgroesse], werte_neu[messgroesse]
+            aenderung = (aktuell - alt) / alt * 100 if alt else 0.0
+            markierung = ''
+            if aenderung > toleranz:
+                markierung = '  <== VERSCHLECHTERUNG'
+                verschlechterungen += 1
+            print(f'    {name} {messgroesse}: {alt:.2f} → {aktuell:.2f} ({aenderung:+.1f} %){markierung}')
+    print('-' * 35)
+    print(f'{verschlechterungen} Verschlechterung(en) über {toleranz} %.')
+    return verschlechterungen
+
+
+parser = argparse.ArgumentParser(description='Benchmarks des SB-GoE-Überschussladens')
+befehle = parser.add_subparsers(dest='befehl', required=True)
+befehl_messen = befehle.add_parser('messen', help='Benchmarks ausführen')
+befehl_messen.add_argument('--speichern', help='Ergebnis als JSON-Datei speichern (Basis für spätere Vergleiche)')
+befehl_vergleichen = befehle.add_parser('vergleichen', help='Zwei gespeicherte Ergebnisse vergleichen')
+befehl_vergleichen.add_argument('basis', help='JSON-Datei mit dem Basis-Ergebnis')
+befehl_vergleichen.add_argument('neu', help='JSON-Datei mit dem neuen Ergebnis')
+befehl_vergleichen.add_argument('--toleranz', type=float, default=15, help='Erlaubte Verschlechterung in %%')
+argumente = parser.parse_args()
+
+if argumente.befehl == 'messen':
+    with open(KONFIGURATION, 'rb') as konfiguration_datei:
+        konf = tomli.load(konfiguration_datei)
+    sbgoelib.konfigurationswerte_pruefen(konf)
+    ergebnis = {'system': {'zeit': time.strftime('%Y-%m-%d %H:%M:%S'), 'plattform': platform.platform(),
+                           'python': platform.python_version(), 'prozessor': platform.machine()},
+                'ergebnisse': messen(konf)}
+    for name, werte in ergebnis['ergebnisse'].items():
+        print(f'{name}: ' + ', '.join(f'{messgroesse} {wert:.2f}' for messgroesse, wert in werte.items()))
+    if argumente.speichern:
+        with open(argumente.speichern, 'w', encoding='utf-8') as ergebnis_datei:
+            json.dump(ergebnis, ergebnis_datei, indent=2, ensure_ascii=False)
+        print(f'Ergebnis gespeichert in <{argumente.speichern}>.')
+else:
+    with open(argumente.basis, encoding='utf-8') as basis_datei, open(argumente.neu, encoding='utf-8') as neu_datei:
+        sys.exit(1 if vergleichen(json.load(basis_datei), json.load(neu_datei), argumente.toleranz) else 0)
@@ -0,0 +1,343 @@
+"""Lokaler Stellvertreter für SonnenBatterie und Go-eCharger, für Last- und Dauertests ohne echte Hardware.
+Programm CC-BY Musicaloris
+Projekt-Repository: https://github.com/Musicaloris/sb-goe-ueberschussladen/
+
+Stellt SB /api/v2/status sowie Go-E /status und /mqtt?payload= bereit. Die Daten kommen aus den JSON-Beispielen oder
+werden aus aufgezeichneten Energielogs abgespielt. Über /mqtt gesetzte amp/amx/alw-Werte ändern die Go-E-Ladeleistung
+und damit auch Verbrauch und Einspeisung der SB. Antwortzeit, Hänger, HTTP 500 und Rate-Limiting (HTTP 429) lassen sich
+je Gerät einstellen.
+
+Aufruf: python GeraeteEmulator.py [--goe-port 8081] [--sb-port 8082] [--goe-latenz 0.2] [--sb-fehler-rate 0.1] ...
+In der config.toml dann z.B. goe_adresse = "127.0.0.1:8081" und sb_adresse = "127.0.0.1:8082" eintragen, im
+SBstatusVisualizer als Base URL 127.0.0.1:8082."""
+
+# Python Standard Libraries importieren
+import argparse  # Für die Kommandozeilenparameter
+import copy  # Für das Kopieren der Startzustände
+import csv  # Für das Abspielen von CSV-Logs
+import http.server  # Für die HTTP-Schnittstellen
+import json  # Für die Antworten
+import os  # Für Dateipfade
+import random  # Für zufällige Störungen
+import threading  # Für gleichzeitige Anfragen und mehrere Server
+import time  # Für Latenzen und Zeitstempel
+from urllib.parse import urlsplit, unquote  # Für das Zerlegen der /mqtt-Anfragen
+
+# Funktionen-Library dieses Projekts importieren
+from sbgoelib import binaerlog_lesen, binaerlog_namen, log_datei_name, log_datei_oeffnen
+
+BEISPIEL_VERZEICHNIS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Beispieldaten', 'JSON Beispiele')
+LOG_METADATEN = ('Uhrzeit_F', 'objekt', 'status_code', 'zeitstempel', 'abrufdauer', 'zeitpunkt', '')
+
+
+class Stoerungen:
+    """Einstellbare Störungen eines emulierten Geräts und Zähler, wie oft sie aufgetreten sind."""
+
+    def __init__(self, latenz: float = 0, streuung: float = 0, fehler_rate: float = 0, haenger_rate: float = 0,
+                 haenger_s: float = 30, rate_limit_s: float = 0):
+        self.latenz = latenz  # Grundlatenz jeder Antwort in s
+        self.streuung = streuung  # Zusätzliche zufällige Latenz 0..streuung in s
+        self.fehler_rate = fehler_rate  # Anteil der Anfragen mit HTTP 500
+        self.haenger_rate = haenger_rate  # Anteil der Anfragen, die erst nach haenger_s beantwortet werden
+        self.haenger_s = haenger_s
+        self.rate_limit_s = rate_limit_s  # Mindestabstand zwischen zwei Anfragen, sonst HTTP 429
+        self.letzte_anfrage = 0.0
+        self.zaehler = {'anfragen': 0, 'http_500': 0, 'http_429': 0, 'haenger': 0}
+        self.lock = threading.Lock()
+
+    def anwenden(self):
+        """Wartet die eingestellte Latenz ab und entscheidet über Störungen.
+
+        :return: HTTP-Statuscode der Störung oder None, falls normal geantwortet werden soll
+        """
+        with self.lock:
+            jetzt = time.monotonic()
+            self.zaehler['anfragen'] += 1
+            zu_schnell = self.rate_limit_s and jetzt - self.letzte_anfrage < self.rate_limit_s
+            self.letzte_anfrage = jetzt
+            if zu_schnell:
+                self.zaehler['http_429'] += 1
+                return 429
+            haenger = random.random() < self.haenger_rate
+            fehler = not haenger and random.random() < self.fehler_rate
+            if haenger:
+                self.zaehler['haenger'] += 1
+            if fehler:
+                self.zaehler['http_500'] += 1
+        time.sleep(self.latenz + random.random() * self.streuung + self.haenger_s * haenger)
+        return 500 if fehler else None
+
+
+def json_beispiel_laden(name: str) -> dict:
+    """Lädt eine Datei aus den JSON-Beispielen (ohne Endung .json)."""
+    with open(os.path.join(BEISPIEL_VERZEICHNIS, f'{name}.json'), encoding='utf-8') as beispiel:
+        return json.load(beispiel)
+
+
+def _csv_wert(wert: str):
+    """Wandelt einen CSV-Wert der SB zurück in den JSON-Typ."""
+    if wert in ('True', 'False'):
+        return wert == 'True'
+    if wert == 'None':
+        return None
+    for typ in (int, float):
+        try:
+            return typ(wert)
+        except ValueError:
+            pass
+    return wert
+
+
+def log_laden(verzeichnis: str, datum: str, objekt: str) -> list:
+    """Lädt ein Tages-Energielog (Binär-Log falls vorhanden, sonst CSV, jeweils auch komprimiert) zum Abspielen.
+
+    :return: Liste aus Tupeln (Sekunden seit Tagesbeginn, Status im JSON-Aufbau des Geräts)
+    """
+    bin_name, _ = binaerlog_namen(objekt, datum, verzeichnis)
+    if log_datei_name(bin_name):
+        zeilen = list(binaerlog_lesen(bin_name))
+    else:
+        with log_datei_oeffnen(f'{verzeichnis}/{datum}-{objekt}-log.csv', newline='') as csv_datei:
+            zeilen = list(csv.DictReader(csv_datei, delimiter=';'))
+        for zeile in zeilen:
+            for name, wert in zeile.items():
+                if name == 'nrg':
+                    zeile[name] = json.loads(wert)
+                elif objekt == 'sb' and name not in LOG_METADATEN:
+                    zeile[name] = _csv_wert(wert)
+
+    wiedergabe = []
+    for zeile in zeilen:
+        stunden, minuten, sekunden = (int(teil) for teil in zeile['Uhrzeit_F'].split(':'))
+        wiedergabe.append((stunden * 3600 + minuten * 60 + sekunden,
+                           {name: wert for name, wert in zeile.items() if name not in LOG_METADATEN}))
+    return wiedergabe
+
+
+class Geraet:
+    """Gemeinsame Grundlage der emulierten Geräte: Startzustand oder Wiedergabe eines Logs, Störungen."""
+
+    def __init__(self, name: str, status: dict, stoerungen: Stoerungen, wiedergabe: list = None, tempo: float = 1):
+        self.name = name
+        self.status = copy.deepcopy(status)
+        self.stoerungen = stoerungen
+        self.wiedergabe = wiedergabe or []
+        self.tempo = tempo
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wiedergabe_status(self):
+        """Status aus dem abgespielten Log zur aktuellen virtuellen Uhrzeit, am Ende beginnt das Log von vorn."""
+        if not self.wiedergabe:
+            return None
+        beginn = self.wiedergabe[0][0]
+        dauer = max(self.wiedergabe[-1][0] - beginn, 1)
+        virtuell = beginn + ((time.monotonic() - self.start) * self.tempo) % dauer
+        status = self.wiedergabe[0][1]
+        for zeit, zeile in self.wiedergabe:
+            if zeit > virtuell:
+                break
+            status = zeile
+        return status
+
+
+class GoE(Geraet):
+    """Emulierter Go-eCharger (API v1)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.wiedergabe:
+            self.status = copy.deepcopy(self.wiedergabe[0][1])
+        # Verhältnis aus tatsächlicher und rechnerischer Ladeleistung des Start-Datensatzes, wie beim Fahrzeug
+        spannung = sum(self.status['nrg'][0:3]) / 3 or 230
+        rechnerisch = 3 * spannung * int(self.status['amp'])
+        self.wirkfaktor = min(self.status['nrg'][11] * 10 / rechnerisch, 1) if rechnerisch and \
+            self.status['nrg'][11] else 0.7
+        self.leistung_aufzeichnung = self.status['nrg'][11] * 10
+        self._leistung_berechnen()
+
+    def _leistung_berechnen(self):
+        """Passt die nrg-Werte an amp und alw an."""
+        nrg = self.status['nrg']
+        spannung = sum(nrg[0:3]) / 3 or 230
+        laedt = self.status['alw'] in ('1', 1) and self.status['car'] in ('2', 2)
+        strom = int(self.status['amp']) * self.wirkfaktor * laedt
+        nrg[4:7] = [round(strom * 10)] * 3  # Strom je Phase in 0,1 A
+        nrg[7:10] = [round(spannung * strom / 100)] * 3  # Leistung je Phase in 0,1 kW
+        nrg[11] = round(3 * spannung * strom / 10)  # Gesamtleistung in 0,01 kW
+
+    def leistung_w(self) -> int:
+        """Aktuelle Ladeleistung in W"""
+        return self.status['nrg'][11] * 10
+
+    def status_holen(self) -> dict:
+        with self.lock:
+            aufgezeichnet = self.wiedergabe_status()
+            if aufgezeichnet is not None:  # Messwerte aus dem Log, gesetzte Werte bleiben erhalten
+                gesetzt = {name: self.status[name] for name in ('amp', 'amx', 'alw') if name in self.status}
+                self.status = copy.deepcopy(aufgezeichnet) | gesetzt
+                self.leistung_aufzeichnung = aufgezeichnet['nrg'][11] * 10
+                self._leistung_berechnen()
+            self.status['tme'] = time.strftime('%d%m%y%H%M')
+            return copy.deepcopy(self.status)
+
+    def mqtt(self, payload: str) -> dict:
+        """Setzt einen Wert wie über /mqtt?payload=parameter=wert
+
+        :return: Status nach dem Setzen
+        """
+        parameter, _, wert = unquote(payload).partition('=')
+        with self.lock:
+            if parameter == 'amx':  # amx wird nicht gespeichert, ändert aber amp
+                self.status['amp'] = wert
+            elif parameter == 'rst':
+                self.status['rbc'] = str(int(self.status.get('rbc', 0)) + 1)
+                self.status['rbt'] = '0'
+                self.status['err'] = '0'
+            else:
+                self.status[parameter] = wert
+            self._leistung_berechnen()
+        return self.status_holen()
+
+
+class SonnenBatterie(Geraet):
+    """Emulierte SonnenBatterie (JSON API v2 status). Verbrauch und Einspeisung folgen der Ladeleistung der Go-Es."""
+
+    def __init__(self, *args, goes: list = (), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.goes = list(goes)
+        if self.wiedergabe:
+            self.status = copy.deepcopy(self.wiedergabe[0][1])
+        # Hausverbrauch ohne Go-E aus dem Startzustand
+        self.haus_w = self.status['Consumption_W'] - sum(goe.leistung_aufzeichnung for goe in self.goes)
+
+    def status_holen(self) -> dict:
+        with self.lock:
+            aufgezeichnet = self.wiedergabe_status()
+            if aufgezeichnet is not None:
+                self.status = copy.deepcopy(aufgezeichnet)
+                self.haus_w = self.status['Consumption_W'] - sum(goe.leistung_aufzeichnung for goe in self.goes)
+            status = copy.deepcopy(self.status)
+        status['Consumption_W'] = max(self.haus_w, 0) + sum(goe.leistung_w() for goe in self.goes)
+        status['GridFeedIn_W'] = status['Production_W'] - status['Consumption_W'] + status['Pac_total_W']
+        status['Timestamp'] = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        return status
+
+
+def handler_erstellen(geraet: Geraet):
+    """Erstellt die Request-Handler-Klasse für ein Gerät."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive wie bei echten Geräten mit persistenten Verbindungen
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if isinstance(geraet, SonnenBatterie) and url.path == '/api/v2/status':
+                antwort = geraet.status_holen
+            elif isinstance(geraet, GoE) and url.path == '/status':
+                antwort = geraet.status_holen
+            elif isinstance(geraet, GoE) and url.path == '/mqtt' and url.query.startswith('payload='):
+                antwort = lambda: geraet.mqtt(url.query[len('payload='):])
+            else:
+                self.antworten(404, {'error': 'not found'})
+                return
+            stoerung = geraet.stoerungen.anwenden()
+            if stoerung:
+                self.antworten(stoerung, {'error': f'emulierte Störung {stoerung}'})
+            else:
+                self.antworten(200, antwort())
+
+        def antworten(self, status_code: int, inhalt: dict):
+            daten = json.dumps(inhalt).encode()
+            try:
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(daten)))
+                self.end_headers()
+                self.wfile.write(daten)
+            except (BrokenPipeError, ConnectionResetError):  # Client hat nach Timeout aufgegeben
+                pass
+
+        def log_message(self, format, *args):
+            pass  # Keine Zeile je Anfrage auf der Konsole
+
+    return Handler
+
+
+def server_starten(geraet: Geraet, host: str, port: int):
+    """Startet den HTTP-Server eines Geräts in einem Hintergrund-Thread.
+
+    :return: ThreadingHTTPServer-Objekt, beenden mit shutdown()
+    """
+    server = http.server.ThreadingHTTPServer((host, port), handler_erstellen(geraet))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=f'Emulator {geraet.name}', daemon=True).start()
+    return server
+
+
+def stoerungen_argumente(parser: argparse.ArgumentParser, geraet: str):
+    """Fügt die Störungs-Parameter eines Geräts zum ArgumentParser hinzu."""
+    parser.add_argument(f'--{geraet}-latenz', type=float, default=0, help='Grundlatenz in s')
+    parser.add_argument(f'--{geraet}-streuung', type=float, default=0, help='Zufällige Zusatzlatenz bis s')
+    parser.add_argument(f'--{geraet}-fehler-rate', type=float, default=0, help='Anteil HTTP 500, 0..1')
+    parser.add_argument(f'--{geraet}-haenger-rate', type=float, default=0, help='Anteil Hänger, 0..1')
+    parser.add_argument(f'--{geraet}-haenger-s', type=float, default=30, help='Dauer eines Hängers in s')
+    parser.add_argument(f'--{geraet}-rate-limit-s', type=float, default=0,
+                        help='Mindestabstand zwischen Anfragen in s, sonst HTTP 429')
+
+
+def stoerungen_aus_argumenten(argumente: argparse.Namespace, geraet: str) -> Stoerungen:
+    """Erstellt die Störungen eines Geräts aus den Kommandozeilenparametern."""
+    return Stoerungen(**{name: getattr(argumente, f'{geraet}_{name}')
+                         for name in ('latenz', 'streuung', 'fehler_rate', 'haenger_rate', 'haenger_s', 'rate_limit_s')})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Lokaler Stellvertreter für SonnenBatterie und Go-eCharger')
+    parser.add_argument('--host', default='127.0.0.1', help='Adresse, auf der die Server lauschen')
+    parser.add_argument('--goe-port', type=int, default=8081, help='Port des (ersten) Go-eChargers')
+    parser.add_argument('--goe-anzahl', type=int, default=1,
+                        help='Anzahl Go-eCharger hinter der SB, auf aufeinanderfolgenden Ports ab --goe-port')
+    parser.add_argument('--sb-port', type=int, default=8082, help='Port der SonnenBatterie')
+    parser.add_argument('--goe-beispiel', default='goe beispiel laden 7A', help='JSON-Beispiel als Startzustand')
+    parser.add_argument('--sb-beispiel', default='sb voll', help='JSON-Beispiel als Startzustand')
+    parser.add_argument('--log-verzeichnis', help='Statt der JSON-Beispiele Energielogs aus diesem Verzeichnis abspielen')
+    parser.add_argument('--tag', help='Tag des abzuspielenden Logs im Format JJJJ-MM-TT')
+    parser.add_argument('--tempo', type=float, default=1, help='Abspielgeschwindigkeit des Logs, 1 = Echtzeit')
+    for geraet_name in ('goe', 'sb'):
+        stoerungen_argumente(parser, geraet_name)
+    argumente = parser.parse_args()
+    if argumente.goe_anzahl < 1:
+        parser.error('--goe-anzahl muss mindestens 1 sein')
+    if argumente.goe_port <= argumente.sb_port < argumente.goe_port + argumente.goe_anzahl:
+        parser.error(f'--sb-port {argumente.sb_port} liegt zwischen den Ports der Go-eCharger {argumente.goe_port} bis '
+                     f'{argumente.goe_port + argumente.goe_anzahl - 1}, bitte einen anderen --sb-port wählen')
+
+    goe_wiedergabe = sb_wiedergabe = None
+    if argumente.log_verzeichnis:
+        if not argumente.tag:
+            parser.error('--log-verzeichnis braucht --tag')
+        goe_wiedergabe = log_laden(argumente.log_verzeichnis, argumente.tag, 'goe')
+        sb_wiedergabe = log_laden(argumente.log_verzeichnis, argumente.tag, 'sb')
+
+    goes = [GoE(f'Go-E{nummer + 1}' if argumente.goe_anzahl > 1 else 'Go-E',
+                json_beispiel_laden(argumente.goe_beispiel), stoerungen_aus_argumenten(argumente, 'goe'),
+                goe_wiedergabe, argumente.tempo)
+            for nummer in range(argumente.goe_anzahl)]
+    sb = SonnenBatterie('SB', json_beispiel_laden(argumente.sb_beispiel), stoerungen_aus_argumenten(argumente, 'sb'),
+                        sb_wiedergabe, argumente.tempo, goes=goes)
+    server = [server_starten(goe, argumente.host, argumente.goe_port + nummer) for nummer, goe in enumerate(goes)]
+    server.append(server_starten(sb, argumente.host, argumente.sb_port))
+    for nummer, goe in enumerate(goes):
+        print(f'{goe.name.ljust(15)} http://{argumente.host}:{argumente.goe_port + nummer}/status')
+    print(f'SonnenBatterie: http://{argumente.host}:{argumente.sb_port}/api/v2/status')
+    print('Zum Beenden des Programms Strg + C drücken.')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for laufender_server in server:
+            laufender_server.shutdown()
+        for geraet in goes + [sb]:
+            print(f'{geraet.name}: {geraet.stoerungen.zaehler}')
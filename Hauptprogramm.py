@@ -4,24 +4,35 @@ Projekt-Repository: https://github.com/Musicaloris/sb-goe-ueberschussladen/
 Webseite Musicaloris: https://www.musicaloris.de/"""
 
 # Python Standard Libraries importieren
+import argparse  # Für die Kommandozeilenparameter
 import os  # Für das Leerräumen der Konsole und Dateioperationen
+import signal  # Für das saubere Beenden mit Strg+C oder SIGTERM
 import sys  # Für Systemoperationen
 import time  # Für das Setzen von Zeitstempeln und Wartefunktionen
 
 # 3rd Party Libraries importieren
 import tomli  # Für das Einlesen der Konfigurationsdatei
-import requests  # Für das Abrufen der Daten
 
 # Funktionen-Library dieses Projekts importieren
 from sbgoelib import *
 
 
+# Kommandozeilenparameter, z.B. eine eigene Konfigurationsdatei für den GeraeteEmulator
+parser = argparse.ArgumentParser(description='PV-Überschussladen mit einer SonnenBatterie und einem Go-eCharger')
+parser.add_argument('--konfiguration', default='config.toml', help='Konfigurationsdatei, Standard config.toml')
+parser.add_argument('--spur', metavar='DATEI',
+                    help='Phasen jedes Zyklus als Chrome-Trace-Events in DATEI schreiben (chrome://tracing, Perfetto)')
+parser.add_argument('--profil-zyklen', type=int, default=0, metavar='N',
+                    help='Stichproben-Profiler: alle N Zyklen die Funktionen mit der meisten Rechenzeit ausgeben')
+argumente = parser.parse_args()
+
 # Konfigurationsdatei einlesen
 try:
-    with open('config.toml', 'rb') as konfiguration_datei:
+    with open(argumente.konfiguration, 'rb') as konfiguration_datei:
         konf = tomli.load(konfiguration_datei)
 except tomli.TOMLDecodeError as toml_err:
-    print(f'Fehler beim Einlesen der Konfigurationsdatei <config.toml>. Ist die Datei gemäß TOML-Standard kodiert?')
+    print(f'Fehler beim Einlesen der Konfigurationsdatei <{argumente.konfiguration}>. Ist die Datei gemäß TOML-Standard '
+          f'kodiert?')
     print(f'Fehlermeldung: {toml_err}')
     sys.exit(1)
 
@@ -29,27 +40,63 @@ except tomli.TOMLDecodeError as toml_err:
 konfigurationswerte_pruefen(konf)
 
 
-def hotkey():
-    """Setzt die Variable zum Beenden der Hauptschleife"""
+def hotkey(signalnummer=None, rahmen=None):
+    """Setzt die Variable zum Beenden der Hauptschleife und beendet das Warten des Zyklus-Takts. Dient auch als
+    Signal-Handler für Strg+C (SIGINT) und SIGTERM, setzt deshalb nur Flags und nimmt keine Sperren."""
     global forrest
-    forrest = 'Exit-Hotkey wurde gedrückt'
+    if signalnummer == signal.SIGINT:
+        forrest = 'Strg+C wurde gedrückt'
+    elif signalnummer is not None:
+        forrest = f'Signal {signal.Signals(signalnummer).name} empfangen'
+    else:
+        forrest = 'Exit-Hotkey wurde gedrückt'
+    takt.signal_stoppen()
 
 
 # Initialisieren Variablen
 sb_status_url = 'http://' + konf['sb_adresse'] + '/api/v2/status'  # Nutzt v2 JSON API
 goe_status_url = 'http://' + konf['goe_adresse'] + '/status'  # Nutzt v1 API
 goe_mqtt_url = 'http://' + konf['goe_adresse'] + '/mqtt?payload='  # Nutzt V1 API
-zyklus_timestamp = time.time() - konf['wartezeit']  # Zeitstempel in der Vergangenheit initialisieren
-sb_status = {'objekt': 'SB', 'zeitstempel': zyklus_timestamp}  # Standard-Objektzustand
-goe_status = {'objekt': 'Go-E', 'zeitstempel': zyklus_timestamp}  # Standard-Objektzustand
+takt = ZyklusTakt(konf['wartezeit'])  # Fester Zyklus-Takt der Hauptschleife
+sb_status = SBStatus('SB', time.time() - konf['wartezeit'])  # Standard-Objektzustand
+goe_status = GoEStatus('Go-E', time.time() - konf['wartezeit'])  # Standard-Objektzustand
 forrest = 'run'  # Variable zur Kontrolle der Hauptschleife
 goe_stop_laden = False
+goe_reset_rbc = None  # Boot-Zähler rbc vor einem Reset-Versuch, None solange kein Reset läuft
 ladeleistung = {'W': 'undefiniert'}  # Standard-Objektzustand
-ladekurve = {0: 0}  # Standard-Objektzustand
 
-# Ladekurve aus Konfigurationsdatei laden
-for datenpunkt_a, datenpunkt_w in konf['ladekurve'].items():  # Zahlenfeld mit Ampere-Watt Beziehungen initialisieren
-    ladekurve[int(datenpunkt_a)] = datenpunkt_w
+# Ladekurve aus Konfigurationsdatei laden, eine gelernte Ladekurve des Fahrzeugprofils hat Vorrang
+ladekurve = Ladekurve(konf['ladekurve'], konf['ladekurve_glaettung'])
+ladekurve_datei = f'ladekurven/{konf["fahrzeug_profil"]}.json'
+try:
+    os.mkdir('ladekurven')
+    print('Verzeichnis <ladekurven> wurde erstellt.')
+except FileExistsError:
+    pass
+try:
+    if ladekurve.laden(ladekurve_datei):
+        print(f'Gelernte Ladekurve <{ladekurve_datei}> wurde geladen.')
+except (ValueError, KeyError, OSError) as kurven_err:  # Defekte Datei: mit der Ladekurve aus config.toml starten
+    print(f'!!!!Fehler beim Laden der Ladekurve <{ladekurve_datei}>, nutze config.toml: {kurven_err}')
+ladekurve_gespeichert = time.monotonic()
+prognose = UeberschussPrognose()  # Glättet die verfügbare Leistung, siehe prognose_* in config.toml
+abfrage_planer = AbfragePlaner(konf)  # Abfrage-Intervall je Gerät, siehe abfrage_* in config.toml
+
+# Warmstart: Zustand der Hauptschleife vom letzten Lauf übernehmen, falls er nicht älter als zustand_max_alter_s ist
+try:
+    zustand = zustand_laden(konf['zustand_datei'], konf['zustand_max_alter_s'])
+except (ValueError, KeyError, OSError) as zustand_err:  # Defekte Datei: ohne gesicherten Zustand starten
+    print(f'!!!!Fehler beim Laden des Zustands <{konf["zustand_datei"]}>, starte ohne: {zustand_err}')
+    zustand = {}
+if zustand:
+    # Innerhalb von wartezeit nach dem Sichern überspringt daten_holen den Abruf
+    goe_status = GoEStatus.aus_dict(zustand['goe_status'], konf['logging_nrg'])
+    sb_status = SBStatus.aus_dict(zustand['sb_status'], konf['logging_nrg'])
+    goe_stop_laden = zustand['goe_stop_laden']
+    ladeleistung = zustand['ladeleistung']
+    print(f'Zustand vom {time.strftime("%d.%m.%Y %H:%M:%S", time.localtime(zustand["zeit"]))} wurde übernommen.')
+zustand_gespeichert = time.monotonic()
+konfiguration_beobachter = KonfigurationBeobachter(argumente.konfiguration)
 
 # Initialisieren der Logdatei-Verzeichnisse falls Logging aktiviert
 if konf['logging_nrg'] or konf['logging_events']:
@@ -63,17 +110,43 @@ if konf['logging_nrg'] or konf['logging_events']:
         print(ordner_err)
         raise
 
+# Logs abgeschlossener Tage komprimieren und alte Logs löschen, falls konfiguriert
+log_rotation = log_rotation_starten(konf) if konf['logging_nrg'] or konf['logging_events'] else None
+
+# Metrik-Endpunkt für Prometheus starten, falls metriken_port gesetzt ist
+metriken_server = metriken_server_starten(konf)
+
+# Profiling: Phasen-Spur und Stichproben-Profiler, falls über die Kommandozeile gewünscht
+spur = spur_starten(argumente.spur, konf) if argumente.spur else spur_holen()
+profiler = Stichprobenprofiler().starten() if argumente.profil_zyklen else None
+zyklus_nummer = 0
+
+# Strg+C und SIGTERM beenden die Hauptschleife nach dem aktuellen Zyklus, Warten wird sofort unterbrochen
+signal.signal(signal.SIGINT, hotkey)
+signal.signal(signal.SIGTERM, hotkey)
+if hasattr(signal, 'SIGHUP'):  # SIGHUP lädt die Konfigurationsdatei neu, gibt es unter Windows nicht
+    signal.signal(signal.SIGHUP, konfiguration_beobachter.anfordern)
+takt.signale_wecken()
+
 # Programmkopf Konfigurationswerte ausgeben
 print('-' * 35)
 print('Programm-Konfiguration:')
 print(f'    Logging der Energiewerte ist {"de" * (not konf["logging_nrg"])}aktiviert.')
 print(f'    Logging der Meldungen ist {"de" * (not konf["logging_events"])}aktiviert.')
+if log_rotation:
+    print(f'    Log-Rotation: komprimieren {"an" if konf["log_komprimieren"] else "aus"}, aufbewahren '
+          f'{str(konf["log_aufbewahren_tage"]) + " Tage" if konf["log_aufbewahren_tage"] else "unbegrenzt"}, '
+          f'höchstens {str(konf["log_max_mb"]) + " MB" if konf["log_max_mb"] else "unbegrenzt"}')
 print(f'    Go-eCharger Status URL: <{goe_status_url}>')
 print(f'    SonnenBatterie Status URL: <{sb_status_url}>')
+print(f'    HTTP-Transport: {konf["transport"]}')
+if metriken_server:
+    print(f'    Metriken: <http://{konf["metriken_adresse"]}:{konf["metriken_port"]}/metrics>')
 print(f'    Lademodus <{konf["laden_prio"]}>: {konf["laden_prio_text"][konf["laden_prio"]]}')
 if konf['laden_prio'] == 'PV+SB':
     print(f'    Zu erhaltender minimaler Batteriestand: {konf["min_batterie_soc"]}%')
-print(f'    Aktualisierungsgeschwindigkeit / Wartezeit: {konf["wartezeit"]} Sekunden')
+print(f'    Aktualisierungsgeschwindigkeit / Wartezeit: {konf["wartezeit"]} Sekunden (angepasst zwischen '
+      f'{konf["abfrage_min_s"]} und {konf["abfrage_max_s"]} Sekunden)')
 if konf['simulieren']:
     print('    Simulieren ist aktiv, es werden keine Werte auf den Go-eCharger geschrieben!')
 if konf['zoe_modus']:
@@ -84,99 +157,146 @@ print('-' * 10)
 
 #########################################
 while forrest == 'run':  # Programm-Hauptschleife. Ist wie eine Schachtel Pralinen.
-    # Daten aktualisieren zum Schleifenbeginn
-    goe_status_puffer = daten_holen('Go-E', goe_status, goe_status_url, konf)
-    sb_status_puffer = daten_holen('SB', sb_status, sb_status_url, konf)
+    zyklus_nummer += 1
+    if profiler and zyklus_nummer > 1 and (zyklus_nummer - 1) % argumente.profil_zyklen == 0:
+        log_event(f'Profil der letzten {argumente.profil_zyklen} Zyklen (Anteil eigen / inkl. Aufrufe):', konf)
+        for funktion, eigen, gesamt in profiler.top(10):
+            log_event(f'    {eigen:5.1f} % / {gesamt:5.1f} %  {funktion}', konf)
+        profiler.zuruecksetzen()
+    spur.markieren('Zyklus', nummer=zyklus_nummer)
+
+    # Geänderte Konfigurationsdatei übernehmen. Ein laufender Ladevorgang wird dabei nicht unterbrochen
+    konf_neu = konfiguration_beobachter.pruefen(konf)
+    if konf_neu:
+        sb_status_url = 'http://' + konf_neu['sb_adresse'] + '/api/v2/status'
+        goe_status_url = 'http://' + konf_neu['goe_adresse'] + '/status'
+        goe_mqtt_url = 'http://' + konf_neu['goe_adresse'] + '/mqtt?payload='
+        takt.periode_s = konf_neu['wartezeit']
+        if konf_neu['fahrzeug_profil'] != konf['fahrzeug_profil'] or konf_neu['ladekurve'] != konf['ladekurve']:
+            try:
+                ladekurve.speichern(ladekurve_datei)  # Gelerntes vom bisherigen Profil behalten
+            except OSError as kurven_err:
+                log_event(f'Fehler beim Speichern der Ladekurve <{ladekurve_datei}>: {kurven_err!r}', konf)
+            ladekurve = Ladekurve(konf_neu['ladekurve'], konf_neu['ladekurve_glaettung'])
+            ladekurve_datei = f'ladekurven/{konf_neu["fahrzeug_profil"]}.json'
+            try:
+                ladekurve.laden(ladekurve_datei)
+            except (ValueError, KeyError, OSError) as kurven_err:
+                log_event(f'Fehler beim Laden der Ladekurve <{ladekurve_datei}>, nutze config.toml: {kurven_err}',
+                          konf_neu)
+        ladekurve.glaettung = konf_neu['ladekurve_glaettung']
+        konf = konf_neu
+
+    # Daten aktualisieren zum Schleifenbeginn, beide Geräte gleichzeitig mit gemeinsamer Frist
+    spur.phase('Daten holen')
+    status_puffer = daten_holen_parallel({'Go-E': (goe_status, goe_status_url),
+                                          'SB': (sb_status, sb_status_url)}, konf, abfrage_planer.intervalle)
+    goe_status_puffer = status_puffer['Go-E']
+    sb_status_puffer = status_puffer['SB']
+    # Nicht abgefragte Geräte und Geräte mit den letzten gültigen Daten liefern das bisherige Objekt zurück
+    neu = {'Go-E': goe_status_puffer is not goe_status, 'SB': sb_status_puffer is not sb_status}
 
     # Konnten die Daten erfolgreich abgeholt werden?
-    if 'status_code' in goe_status_puffer and 'status_code' in sb_status_puffer:  # Daten holen war iO
+    if goe_status_puffer.gueltig and sb_status_puffer.gueltig:  # Daten holen war iO
         goe_status = goe_status_puffer
         sb_status = sb_status_puffer
     else:  # Daten sind invalide, vermutlich Fehler beim Holen
         log_event("Datenobjekt(e) ungültig? Abwarten und nochmal versuchen...", konf)
-        zyklus_timestamp = time.time()
-        abwarten(True, konf, zyklus_timestamp)
+        abwarten(True, konf, takt)
         continue
 
-    ladekurve[int(goe_status['amp'])] = goe_status['nrg'][11] * 10  # ladekurve mit aktuellem Datenpunkt updaten
-    ladeleistung = goe_ladeleistung_bestimmen(sb_status, goe_status, ladekurve, konf)  # Ladeleistung bestimmen
+    spur.phase('Berechnung')
+    takt.periode_s = min(abfrage_planer.anpassen(goe_status, sb_status, neu, konf).values())
+    # ladekurve mit neuem Datenpunkt updaten, nur während des Ladens
+    if neu['Go-E'] and ladekurve_lernen_erlaubt(goe_status):
+        ladekurve.lernen(goe_status.amp, goe_status.nrg[11] * 10)
+    if time.monotonic() - ladekurve_gespeichert >= konf['ladekurve_speichern_s']:
+        try:
+            ladekurve.speichern(ladekurve_datei)
+        except OSError as kurven_err:  # Z.B. SD-Karte voll, nächster Versuch nach ladekurve_speichern_s
+            log_event(f'Fehler beim Speichern der Ladekurve <{ladekurve_datei}>: {kurven_err!r}', konf)
+        ladekurve_gespeichert = time.monotonic()
+    if neu['SB']:  # Neue Vorgabe nur mit neuen SB-Daten, alte Netzleistung passt nicht zur neuen Ladeleistung
+        ladeleistung = goe_ladeleistung_bestimmen(sb_status, goe_status, ladekurve, konf, prognose)
+    metriken_holen().setzen('sbgoe_ladestrom_vorgabe_ampere', ladeleistung['A'])
+    metriken_holen().setzen('sbgoe_ladeleistung_watt', goe_status.nrg[11] * 10)
 
     # Es gibt Daten von Go-E und SB, aktuelle Daten ausgeben
+    spur.phase('Konsolenausgabe')
     print(f'\nAktuelle Werte Stand {time.strftime("%H:%M:%S")}:')
-    print(f'    {str(sb_status["Production_W"]).rjust(5)} W PV-Leistung')
-    print(f'    {str(sb_status["Consumption_W"]).rjust(5)} W Verbrauch '
-          f'{"inkl. Go-E" * bool(int(goe_status["nrg"][11]))}')
-    if int(goe_status["nrg"][11]):  # Falls Go-E Ladeleistung > 0
-        print(f'    {str(goe_status["nrg"][11] * 10).rjust(5)} W Go-E Ladeleistung')
-        print(f'    {str(sb_status["Consumption_W"] - int(goe_status["nrg"][11]) * 10).rjust(5)} W '
+    print(f'    {str(sb_status.Production_W).rjust(5)} W PV-Leistung')
+    print(f'    {str(sb_status.Consumption_W).rjust(5)} W Verbrauch '
+          f'{"inkl. Go-E" * bool(goe_status.nrg[11])}')
+    if goe_status.nrg[11]:  # Falls Go-E Ladeleistung > 0
+        print(f'    {str(goe_status.nrg[11] * 10).rjust(5)} W Go-E Ladeleistung')
+        print(f'    {str(sb_status.Consumption_W - goe_status.nrg[11] * 10).rjust(5)} W '
               f'Verbrauch exkl. Go-E')
     if ladeleistung['W'] > 0:
         print(f'    {str(ladeleistung["W"]).rjust(5)} W errechnete mögliche Go-E Ladeleistung')
-    if sb_status['Pac_total_W'] > 0 and sb_status['BatteryDischarging']:
-        print(f'    {str(abs(sb_status["Pac_total_W"])).rjust(5)} W SonnenBatterie-Entladeleistung bei '
-              f'{sb_status["USOC"]}% Batterie-Ladestand')
-    elif sb_status['Pac_total_W'] < 0 and sb_status['BatteryCharging']:
-        print(f'    {str(abs(sb_status["Pac_total_W"])).rjust(5)} W SonnenBatterie-Aufladeleistung bei '
-              f'{sb_status["USOC"]}% Batterie-Ladestand')
-    if sb_status['GridFeedIn_W'] < 0:
-        print(f'    {str(abs(sb_status["GridFeedIn_W"])).rjust(5)} W Netzbezug')
+    if sb_status.Pac_total_W > 0 and sb_status.BatteryDischarging:
+        print(f'    {str(abs(sb_status.Pac_total_W)).rjust(5)} W SonnenBatterie-Entladeleistung bei '
+              f'{sb_status.USOC}% Batterie-Ladestand')
+    elif sb_status.Pac_total_W < 0 and sb_status.BatteryCharging:
+        print(f'    {str(abs(sb_status.Pac_total_W)).rjust(5)} W SonnenBatterie-Aufladeleistung bei '
+              f'{sb_status.USOC}% Batterie-Ladestand')
+    if sb_status.GridFeedIn_W < 0:
+        print(f'    {str(abs(sb_status.GridFeedIn_W)).rjust(5)} W Netzbezug')
     else:
-        print(f'    {str(abs(sb_status["GridFeedIn_W"])).rjust(5)} W Einspeiseleistung')
-    if not sb_status['BatteryDischarging'] and not sb_status['BatteryCharging']:
-        print(f'    {str(sb_status["USOC"]).rjust(5)} % Ladestand SonnenBatterie im idle')
+        print(f'    {str(abs(sb_status.GridFeedIn_W)).rjust(5)} W Einspeiseleistung')
+    if not sb_status.BatteryDischarging and not sb_status.BatteryCharging:
+        print(f'    {str(sb_status.USOC).rjust(5)} % Ladestand SonnenBatterie im idle')
     print('-' * 10)
     print('Meldungen:')
 
     # Liegt ein Fehler am go-E an? Automatischer Reset-Versuch. Ungetestet.
-    if not goe_status['err'] == '0':
-        log_event(f'Am go-eCharger liegt ein Fehler an: {konf["goe_err"][goe_status["err"]]}', konf)
+    spur.phase('Fehlerbehandlung')
+    if goe_reset_rbc is not None:  # Erste Daten nach einem Reset: ist der Boot-Zähler rbc gestiegen?
+        goe_rst = goe_status.rbc > goe_reset_rbc
+        goe_reset_rbc = None
+        log_event(f'Automatischer Reset / Reboot war {"nicht " * (not goe_rst)}erfolgreich.', konf)
+        if not goe_rst:
+            forrest = 'Go-E Fehler lässt sich nicht resetten'
+            continue
+    if not goe_status.err == 0:
+        log_event(f'Am go-eCharger liegt ein Fehler an: {konf["goe_err"][str(goe_status.err)]}', konf)
         log_event('Versuche automatischen Reset / Reboot über MQTT.', konf)
         try:
-            requests.get(f'{goe_mqtt_url}rst=1', timeout=konf['wartezeit'])
-            print('Bitte 10s warten...')
-            time.sleep(10)
-            goe_rst = daten_holen('Go-E', goe_status, goe_status_url, konf)
+            transport_holen(konf).get(f'{goe_mqtt_url}rst=1', timeout=konf['wartezeit'],
+                                      verbindung_timeout=konf['verbindung_timeout_s'])
         except Exception as rst_err:
             log_event(f'Fehler {rst_err} beim Senden des Resets am Go-eCharger', konf)
-            goe_rst = False
             forrest = 'Go-E Fehler lässt sich nicht resetten'
         else:
-            if goe_rst.status_code == 200:
-                goe_rst = bool(int(goe_rst.json()['rbc']) > int(goe_status['rbc']))
-            else:
-                log_event(f'Go-E MQTT HTTP Fehler Status {goe_rst.status_code}', konf)
-        log_event(f'Automatischer Reset / Reboot war {"nicht" * goe_rst}erfolgreich.', konf)
-        if not goe_rst:
-            forrest = 'Go-E Fehler lässt sich nicht resetten'
-        zyklus_timestamp = time.time()
-        abwarten(True, konf, zyklus_timestamp)
+            # Statt hier zu schlafen, wird der Go-E während des Neustarts nicht abgefragt. Ob der Reset geklappt hat,
+            # zeigen die ersten Daten danach
+            goe_reset_rbc = goe_status.rbc
+            schutzschalter_holen('Go-E').pausieren(10)
+            print('Der Go-eCharger startet neu und wird 10 s lang nicht abgefragt.')
+        abwarten(True, konf, takt)
         if not konf['simulieren']:
             continue
 
     # ist ein Auto angeschlossen und bereit?
-    if goe_status['car'] == '1':
+    if goe_status.car == 1:
         log_event('Kein Fahrzeug am Go-eCharger angeschlossen.', konf)
-    elif goe_status['car'] == '2':
-        if goe_status["nrg"][11] * 10 == 0:
+    elif goe_status.car == 2:
+        if goe_status.nrg[11] * 10 == 0:
             log_event('Fahrzeug ist am Go-eCharger angeschlossen und bereit zum Laden.', konf)
         else:
             log_event('Fahrzeug ist am Go-eCharger angeschlossen und lädt.', konf)
-    elif goe_status['car'] == '3':
+    elif goe_status.car == 3:
         log_event('Go-eCharger wartet auf Fahrzeug.', konf)
-        zyklus_timestamp = time.time()
-        abwarten(False, konf, zyklus_timestamp)
-    elif goe_status['car'] == '4':
+        abwarten(False, konf, takt)
+    elif goe_status.car == 4:
         log_event('Go-eCharger meldet Ladung beendet & Auto angeschlossen.', konf)
-        # Default-Ladekurve laden, da beim Beenden Ladeleistung und Strom entkoppelt sind
-        for datenpunkt_a, datenpunkt_w in konf['ladekurve'].items():
-            ladekurve[str(datenpunkt_a)] = datenpunkt_w
+        # Ladeleistung und Strom sind beim Beenden entkoppelt, ladekurve_lernen_erlaubt lässt die Ladekurve in Ruhe
 
     # Befindet sich der Go-E im Stop-Modus (wurde eine maximale Lademenge definiert)? Ungetestet
-    if goe_status['stp'] == '2':
+    if goe_status.stp == 2:
         goe_stop_laden = True
-        log_event(f'Automatische Abschaltung nach {goe_status["dwo"] / 10} kWh ist aktiviert.', konf)
-        log_event(f'Davon sind bereits {int(goe_status["dws"]) / 3600000} kWh geladen.', konf)
-    elif goe_status['stp'] == '0' and goe_stop_laden:
+        log_event(f'Automatische Abschaltung nach {goe_status.dwo / 10} kWh ist aktiviert.', konf)
+        log_event(f'Davon sind bereits {goe_status.dws / 3600000} kWh geladen.', konf)
+    elif goe_status.stp == 0 and goe_stop_laden:
         log_event('Das Laden am Go-eCharger wurde durch die automatische Abschaltung beendet, oder die Ladegrenze wurde'
                   ' manuell entfernt.', konf)
         laden_fortsetzen = input('Soll weiter geladen werden? (J/N) >> ')
@@ -189,25 +309,26 @@ while forrest == 'run':  # Programm-Hauptschleife. Ist wie eine Schachtel Pralin
         continue
 
     # Yaey, Verbindung steht, Auto bereit! Aber ist genug Ladeleistung da? Der Go-E Charger lädt mit mindestens 6A!
+    spur.phase('Ansteuerung')
     if ladeleistung['A'] < 6:
         log_event(f'Nicht ausreichend Überschuss zum Fahrzeug laden: Möglicher Ladestrom: {ladeleistung["A"]} A, '
                   f'minimaler go-e Ladestrom 6 A', konf)
-        if goe_status['alw'] == '1':
+        if goe_status.alw == 1:
             if goe_setzen('alw', 0, goe_status, konf):
                 log_event(f'{"[simuliert] " * konf["simulieren"]}Laden wurde aufgrund zu kleiner zur Verfügung '
                           f'stehender Leistung unterbrochen.', konf)
             else:
                 log_event('Fehler beim Unterbrechen der Fahrzeugladung!', konf)
     elif ladeleistung['A'] >= 6:  # Yaey, es ist genug Ladeleistung da! Ladeleistung setzen!
-        if goe_status['alw'] == '1':  # Wenn Laden schon erlaubt ist, Ladeleistung setzen
+        if goe_status.alw == 1:  # Wenn Laden schon erlaubt ist, Ladeleistung setzen
+            amp_alt = goe_status.amp  # goe_setzen übernimmt den neuen Status in goe_status
             if goe_setzen('amx', ladeleistung['A'], goe_status, konf):
                 log_event(f'{"[simuliert] " * konf["simulieren"]}Ladestrom-Vorgabe ist {ladeleistung["A"]} A' +
-                          f' (war {goe_status["amp"]} A)' * (not int(goe_status["amp"]) == ladeleistung["A"]) +
-                          '.', konf)
+                          f' (war {amp_alt} A)' * (not amp_alt == ladeleistung["A"]) + '.', konf)
             else:
                 log_event('Fehler beim Setzen der Ladeleistung!', konf)
         else:  # Wenn Laden noch nicht erlaubt war, Ladeleistung setzen und Laden erlauben. Ungetestet
-            if goe_setzen('amx', ladeleistung['A'], goe_status, konf) and goe_setzen('alw', 1, goe_status, konf):
+            if goe_mehrfach_setzen({'amx': ladeleistung['A'], 'alw': 1}, goe_status, konf):
                 log_event(f'{"[simuliert] " * konf["simulieren"]}Ladevorgang wurde mit {ladeleistung["A"]} A gestartet '
                           f'/ wieder aufgenommen!', konf)
             else:
@@ -215,15 +336,21 @@ while forrest == 'run':  # Programm-Hauptschleife. Ist wie eine Schachtel Pralin
         if ladeleistung['A'] == 6 and konf['zoe_modus']:
             log_event('Hinweis: Der Zoe-Modus ist aktiv!', konf)
 
-    if konf['logging_nrg']:
+    spur.phase('Logging')
+    if konf['logging_nrg'] and (neu['Go-E'] or neu['SB']):  # Beide gemeinsam, damit die Uhrzeiten zusammenpassen
         log_nrg('goe', goe_status, konf)
         log_nrg('sb', sb_status, konf)
 
-    zyklus_timestamp = time.time()  # Zeitstempel erneuern
-    try:
-        abwarten(False, konf, zyklus_timestamp)
-    except KeyboardInterrupt:
-        forrest = "Strg+C wurde gedrückt"
+    if time.monotonic() - zustand_gespeichert >= konf['zustand_speichern_s']:
+        try:
+            zustand_speichern(konf['zustand_datei'], {'goe_status': goe_status.als_dict(),
+                                                      'sb_status': sb_status.als_dict(),
+                                                      'goe_stop_laden': goe_stop_laden, 'ladeleistung': ladeleistung})
+        except OSError as zustand_err:  # Z.B. SD-Karte voll, nächster Versuch nach zustand_speichern_s
+            log_event(f'Fehler beim Speichern des Zustands <{konf["zustand_datei"]}>: {zustand_err!r}', konf)
+        zustand_gespeichert = time.monotonic()
+
+    abwarten(False, konf, takt)
 
     print('\n' * 2)
     # Ende des Hauptschleife-while-Loop-Codeblocks
@@ -231,10 +358,30 @@ while forrest == 'run':  # Programm-Hauptschleife. Ist wie eine Schachtel Pralin
 else:  # Block für das reguläre Beenden der Hauptschleife, else gehört noch zu while
     print('-' * 35)
     log_event(f'Das Programm wurde regulär beendet. Grund: {forrest}', konf)
+    log_event(f'Zyklus-Takt: {takt.statistik()}', konf)
 ###################################
 
 
 # Reste zusammenfegen
+transport_holen(konf).schliessen()
+try:
+    ladekurve.speichern(ladekurve_datei)
+except OSError as kurven_err:
+    log_event(f'Fehler beim Speichern der Ladekurve <{ladekurve_datei}>: {kurven_err!r}', konf)
+try:
+    zustand_speichern(konf['zustand_datei'], {'goe_status': goe_status.als_dict(), 'sb_status': sb_status.als_dict(),
+                                              'goe_stop_laden': goe_stop_laden, 'ladeleistung': ladeleistung})
+except OSError as zustand_err:
+    log_event(f'Fehler beim Speichern des Zustands <{konf["zustand_datei"]}>: {zustand_err!r}', konf)
 if forrest == 'run':
     print('-' * 35)
     log_event(f'Das Programm wurde unerwartet beendet.', konf)
+if profiler:
+    profiler.stoppen()
+if spur.aktiv:
+    spur.beenden()
+    print(f'Spur gespeichert in <{argumente.spur}>, zum Ansehen in chrome://tracing oder ui.perfetto.dev laden.')
+if log_rotation:
+    log_rotation.beenden()
+if konf['logging_nrg'] or konf['logging_events'] or argumente.spur:
+    log_schreiber_holen(konf).beenden()  # Alle noch wartenden Logzeilen schreiben
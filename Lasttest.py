@@ -0,0 +1,88 @@
+"""Lasttest für Mehrfachladen.py: startet lokale Stellvertreter für eine SonnenBatterie und viele Go-eCharger (siehe
+GeraeteEmulator.py) und misst, wie lange ein Regelzyklus bei wachsender Anzahl Ladepunkte dauert. Solange die
+Zyklusdauer unter der Wartezeit bleibt, wird kein Takt übersprungen und die Zyklusperiode wächst nicht.
+Zum Schluss prüft ein Durchlauf mit einem Go-eCharger, der erst nach der Wartezeit antwortet, dass die Regelschleife
+ein Gerät ohne Antwort übersteht.
+Programm CC-BY Musicaloris
+Projekt-Repository: https://github.com/Musicaloris/sb-goe-ueberschussladen/
+
+Aufruf: python Lasttest.py [--anzahl 1 10 50] [--zyklen 10] [--wartezeit 1] [--latenz 0.05] [--streuung 0.2]"""
+
+# Python Standard Libraries importieren
+import argparse  # Für die Kommandozeilenparameter
+import asyncio  # Für das Ausführen des Mehrfachladens
+import contextlib  # Für das Umleiten der Konsolenausgaben
+import os  # Für Dateioperationen
+import tempfile  # Für ein Arbeitsverzeichnis, das nach dem Test wieder verschwindet
+
+# 3rd Party Libraries importieren
+import tomli  # Für das Einlesen der Konfigurationsdatei
+
+# Funktionen-Library und Programme dieses Projekts importieren
+import sbgoelib
+from GeraeteEmulator import GoE, SonnenBatterie, Stoerungen, json_beispiel_laden, server_starten
+from Mehrfachladen import mehrfachladen, zyklusdauer_text
+
+KONFIGURATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.toml')
+
+
+def durchlauf(konf: dict, anzahl: int, argumente: argparse.Namespace, langsam: int = 0) -> dict:
+    """Startet anzahl emulierte Go-eCharger und eine SB und lässt das Mehrfachladen argumente.zyklen Zyklen laufen.
+
+    :param langsam: So viele der Go-eCharger antworten erst nach der Wartezeit, verpassen also jede Frist
+    :return: Ergebnis von mehrfachladen
+    """
+    goes = [GoE(f'Go-E{nummer + 1}', json_beispiel_laden('goe beispiel laden 7A'),
+                Stoerungen(argumente.wartezeit + 0.1, 0) if nummer < langsam
+                else Stoerungen(argumente.latenz, argumente.streuung)) for nummer in range(anzahl)]
+    sb = SonnenBatterie('SB', json_beispiel_laden('sb voll'), Stoerungen(argumente.latenz, argumente.streuung),
+                        goes=goes)
+    server = [server_starten(goe, '127.0.0.1', 0) for goe in goes] + [server_starten(sb, '127.0.0.1', 0)]
+    adressen = [f'127.0.0.1:{laufender_server.server_address[1]}' for laufender_server in server]
+    konf_lauf = konf | {'wartezeit': argumente.wartezeit, 'simulieren': False, 'logging_nrg': False,
+                        'logging_events': False,
+                        'mehrfachladen': {'verteilung': argumente.verteilung, 'sb_adressen': adressen[-1:],
+                                          'goe': [{'name': goe.name.replace('-', ''), 'adresse': adresse,
+                                                   'prioritaet': nummer, 'akku_kwh': 41}
+                                                  for nummer, (goe, adresse) in enumerate(zip(goes, adressen))]}}
+    sbgoelib.mehrfachladen_pruefen(konf_lauf)
+    try:
+        with open(os.devnull, 'w') as nichts, contextlib.redirect_stdout(nichts):
+            return asyncio.run(mehrfachladen(konf_lauf, argumente.zyklen, ausgabe=False))
+    finally:
+        for laufender_server in server:
+            laufender_server.shutdown()
+            laufender_server.server_close()
+
+
+parser = argparse.ArgumentParser(description='Lasttest für das Mehrfachladen mit emulierten Geräten')
+parser.add_argument('--anzahl', type=int, nargs='+', default=[1, 10, 50], help='Anzahl Go-eCharger je Durchlauf')
+parser.add_argument('--zyklen', type=int, default=10, help='Zyklen je Durchlauf')
+parser.add_argument('--wartezeit', type=float, default=1, help='Zyklusperiode in s')
+parser.add_argument('--latenz', type=float, default=0.05, help='Grundlatenz jedes emulierten Geräts in s')
+parser.add_argument('--streuung', type=float, default=0.2, help='Zufällige Zusatzlatenz bis s')
+parser.add_argument('--verteilung', default='gleich', choices=sbgoelib.VERTEILUNGEN, help='Verteilung der Leistung')
+argumente = parser.parse_args()
+
+with open(KONFIGURATION, 'rb') as konfiguration_datei:
+    konf = tomli.load(konfiguration_datei)
+sbgoelib.konfigurationswerte_pruefen(konf)
+
+arbeitsverzeichnis = os.getcwd()
+with tempfile.TemporaryDirectory() as verzeichnis:
+    os.chdir(verzeichnis)
+    os.mkdir('ladekurven')
+    try:
+        for anzahl in argumente.anzahl:
+            ergebnis = durchlauf(konf, anzahl, argumente)
+            print(f'{anzahl} Go-eCharger: {zyklusdauer_text(ergebnis["zyklusdauer"])}')
+            print(f'    Zyklus-Takt: {ergebnis["takt"]}')
+
+        # Ein Go-eCharger ohne Antwort innerhalb der Wartezeit darf die Regelschleife nicht beenden
+        ergebnis = durchlauf(konf, 2, argumente, langsam=1)
+        if len(ergebnis['zyklusdauer']) != argumente.zyklen:
+            raise RuntimeError(f'Mit einem Go-eCharger ohne Antwort liefen nur {len(ergebnis["zyklusdauer"])} '
+                               f'von {argumente.zyklen} Zyklen.')
+        print(f'Ein Go-eCharger ohne Antwort: alle {argumente.zyklen} Zyklen durchlaufen.')
+    finally:
+        os.chdir(arbeitsverzeichnis)
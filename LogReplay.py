@@ -0,0 +1,126 @@
+"""Rechnet die Ladeleistungs-Bestimmung offline über aufgezeichnete Energielogs nach, um Lademodi und Einstellungen vor
+dem Einsatz zu vergleichen.
+Programm CC-BY Musicaloris
+Projekt-Repository: https://github.com/Musicaloris/sb-goe-ueberschussladen/
+
+Aufruf: python LogReplay.py [Verzeichnis] [--tage 2023-06-16 ...] [--modus Überschuss PV ...] [--pruefen]"""
+
+# Python Standard Libraries importieren
+import argparse  # Für die Kommandozeilenparameter
+import contextlib  # Für das Stummschalten der Ausgaben beim Prüfen
+import glob  # Für das Finden der Logdateien
+import io  # Für das Stummschalten der Ausgaben beim Prüfen
+import os  # Für Dateipfade
+import sys  # Für Systemoperationen
+import time  # Für die Laufzeitmessung
+
+# 3rd Party Libraries importieren
+import numpy as np  # Für das Rechnen mit ganzen Datenreihen
+import tomli  # Für das Einlesen der Konfigurationsdatei
+
+# Funktionen-Library dieses Projekts importieren
+from sbgoelib import *
+
+
+def netzbezug_schaetzen(daten: dict, lade_a, verfuegbar_w, gueltig) -> float:
+    """Schätzt den Netzbezug durch das Laden in kWh: die Leistung der Ladestrom-Vorgabe eines Datenpunkts gilt bis
+    zum nächsten, bezogen wird, was sie über der dann verfügbaren Leistung liegt. Lücken über 600 s zählen nicht.
+
+    :param daten: dict-Objekt aus energielog_laden, gebraucht werden 'nrg' und 'zeit'
+    """
+    nrg = daten['nrg']
+    lade_w = np.where((nrg[:, 0:3] != 0).all(axis=1), lade_a * 3 ** 0.5 * nrg[:, 0:3].sum(axis=1) / 3,
+                      lade_a * nrg[:, 0])
+    lade_w = np.where(gueltig & (lade_a >= 6), lade_w, 0)
+    dauer = np.diff(daten['zeit'].astype(np.float64))
+    dauer = np.where(dauer <= 600, dauer, 0)
+    return float(np.sum(np.maximum(lade_w[:-1] - verfuegbar_w[1:], 0) * dauer) / 3600000)
+
+
+parser = argparse.ArgumentParser(description='Ladeleistungs-Bestimmung über aufgezeichnete Energielogs nachrechnen')
+parser.add_argument('verzeichnis', nargs='?', default='logs', help='Verzeichnis der Logdateien, Standard logs')
+parser.add_argument('--tage', nargs='+', help='Tage im Format JJJJ-MM-TT, Standard sind alle Tage im Verzeichnis')
+parser.add_argument('--modus', nargs='+', help='Lademodi (laden_prio), Standard ist der Modus aus config.toml')
+parser.add_argument('--konfiguration', default='config.toml', help='Konfigurationsdatei, Standard config.toml')
+parser.add_argument('--pruefen', action='store_true',
+                    help='Ergebnis mit der skalaren Funktion goe_ladeleistung_bestimmen vergleichen (langsam)')
+argumente = parser.parse_args()
+
+with open(argumente.konfiguration, 'rb') as konfiguration_datei:
+    konf = tomli.load(konfiguration_datei)
+konfigurationswerte_pruefen(konf)
+
+if argumente.tage:
+    tage = argumente.tage
+else:
+    tage = sorted({os.path.basename(name)[:10] for name in glob.glob(f'{argumente.verzeichnis}/*-goe-log.*')
+                   if name.endswith(('.csv', '.bin', '.csv.gz', '.bin.gz'))})
+if not tage:
+    print(f'Keine Energielogs in <{argumente.verzeichnis}> gefunden.')
+    sys.exit(1)
+
+lade_start = time.perf_counter()
+daten = energielog_laden(argumente.verzeichnis, tage)
+print(f'{len(daten["zeit"])} Datenpunkte aus {len(tage)} Tag(en) geladen in {time.perf_counter() - lade_start:.2f} s.')
+print('-' * 35)
+
+for modus in argumente.modus or [konf['laden_prio']]:
+    konf_modus = konf | {'laden_prio': modus}
+    rechen_start = time.perf_counter()
+    verfuegbar_w = ueberschuss_bestimmen_vektor(daten, konf_modus)
+    prognose_w = None
+    if konf_modus['prognose_zeitkonstante_s']:  # Die Prognose ist eine Rekursion und läuft je Datenpunkt
+        prognose_w = np.array(UeberschussPrognose().reihe(daten['zeit'].tolist(), verfuegbar_w.tolist(), konf_modus))
+    ergebnis = goe_ladeleistung_bestimmen_vektor(daten, konf_modus, prognose_w)
+    rechenzeit = time.perf_counter() - rechen_start
+    # Ohne Prognose zum Vergleich, verfügbar ist die Leistung ohne den Einspeisepuffer
+    ohne = goe_ladeleistung_bestimmen_vektor(daten, konf_modus, verfuegbar_w) if prognose_w is not None else ergebnis
+    verfuegbar_w = verfuegbar_w + konf_modus['ladeleistung_puffer_W']
+
+    lade_a = ergebnis['A'][ergebnis['gueltig']]
+    amp_ist = daten['amp'][ergebnis['gueltig']]
+    laden = lade_a >= 6
+    print(f'Modus <{modus}>: {konf["laden_prio_text"].get(modus, "unbekannter Modus")}')
+    print(f'    Rechenzeit: {rechenzeit * 1000:.1f} ms')
+    print(f'    Ungültige Datenpunkte (Division durch 0): {np.count_nonzero(~ergebnis["gueltig"])}')
+    print(f'    Anteil mit Laden (>= 6 A): {np.mean(laden) * 100:.1f} %')
+    print(f'    Ladestrom-Vorgabe im Mittel: {np.mean(lade_a):.1f} A, Ladeleistung im Mittel: '
+          f'{np.mean(ergebnis["W"][ergebnis["gueltig"]]):.0f} W')
+    print(f'    Änderungen der Vorgabe: {np.count_nonzero(np.diff(lade_a))}, '
+          f'Abweichungen vom aufgezeichneten amp: {np.count_nonzero(lade_a != amp_ist)}')
+    print(f'    Netzbezug durch das Laden (geschätzt): '
+          f'{netzbezug_schaetzen(daten, ergebnis["A"], verfuegbar_w, ergebnis["gueltig"]):.2f} kWh')
+    if prognose_w is not None:
+        print(f'    Ohne UeberschussPrognose: {np.count_nonzero(np.diff(ohne["A"][ohne["gueltig"]]))} Änderungen der '
+              f'Vorgabe, Netzbezug {netzbezug_schaetzen(daten, ohne["A"], verfuegbar_w, ohne["gueltig"]):.2f} kWh')
+    print(f'    Laden starten / unterbrechen: {np.count_nonzero(np.diff(laden.astype(np.int8)) == 1)} / '
+          f'{np.count_nonzero(np.diff(laden.astype(np.int8)) == -1)}')
+
+    if argumente.pruefen:  # Gegenprobe mit der Funktion aus der Hauptschleife, Ladekurve wird genauso gepflegt
+        ladekurve = Ladekurve(konf_modus['ladekurve'], konf_modus['ladekurve_glaettung'])
+        prognose = UeberschussPrognose()
+        abweichungen = 0
+        for i in range(len(daten['zeit'])):
+            goe_status = GoEStatus('Go-E', daten['zeit'][i].item(), status_code=200).uebernehmen(
+                {'nrg': daten['nrg'][i].tolist()} | {feld: daten[feld][i].item() for feld in REPLAY_FELDER['goe'][1:]})
+            sb_status = SBStatus('SB', daten['zeit'][i].item(), status_code=200).uebernehmen(
+                {feld: daten[feld][i].item() for feld in REPLAY_FELDER['sb']})
+            if ladekurve_lernen_erlaubt(goe_status):
+                ladekurve.lernen(goe_status.amp, goe_status.nrg[11] * 10)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    skalar = goe_ladeleistung_bestimmen(sb_status, goe_status, ladekurve, konf_modus, prognose)
+            except ZeroDivisionError:
+                skalar = None
+            if ergebnis['gueltig'][i]:
+                vektor = {'A': ergebnis['A'][i], 'W': ergebnis['W'][i]}
+                gleich = skalar is not None and skalar['A'] == vektor['A'] and skalar['W'] == vektor['W']
+            else:
+                gleich = skalar is None
+            if not gleich:
+                abweichungen += 1
+                if abweichungen <= 5:
+                    print(f'    !!!!Abweichung bei Datenpunkt {i}: skalar {skalar}, vektoriell A {ergebnis["A"][i]}, '
+                          f'W {ergebnis["W"][i]}')
+        print(f'    Gegenprobe mit goe_ladeleistung_bestimmen: {abweichungen} Abweichungen.')
+    print()
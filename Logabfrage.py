@@ -0,0 +1,65 @@
+"""Gibt die Zeilen der Energielogs in einem Zeitfenster aus, z.B. "was war am 16.06. zwischen 13:00 und 13:30?". Über
+den Zeitindex neben jeder CSV-Logdatei (.idx) bzw. die feste Satzbreite der Binär-Logs wird direkt an den Anfang des
+Zeitfensters gesprungen, gelesen wird nur dieser Ausschnitt. Komprimierte Logs (.gz) werden bis dorthin entpackt.
+Programm CC-BY Musicaloris
+Projekt-Repository: https://github.com/Musicaloris/sb-goe-ueberschussladen/
+
+Aufruf: python Logabfrage.py [Verzeichnis] --von "2023-06-16 13:00" --bis "2023-06-16 13:30" [--objekt goe]
+            [--felder amp nrg] [--nach zeitstempel]
+        python Logabfrage.py [Verzeichnis] --index-erstellen"""
+
+# Python Standard Libraries importieren
+import argparse  # Für die Kommandozeilenparameter
+import glob  # Für das Finden der Logdateien
+import sys  # Für Systemoperationen
+import time  # Für das Umrechnen der Zeitangaben und die Laufzeitmessung
+
+# Funktionen-Library dieses Projekts importieren
+from sbgoelib import energielog_bereich, log_index_erstellen
+
+
+def zeit_lesen(text: str) -> float:
+    """JJJJ-MM-TT HH:MM[:SS] (Ortszeit) → Unix-Sekunden"""
+    for zeitformat in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return time.mktime(time.strptime(text, zeitformat))
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f'Ungültige Zeitangabe <{text}>, erwartet JJJJ-MM-TT HH:MM[:SS]')
+
+
+parser = argparse.ArgumentParser(description='Zeilen der Energielogs in einem Zeitfenster ausgeben')
+parser.add_argument('verzeichnis', nargs='?', default='logs', help='Verzeichnis der Logdateien, Standard logs')
+parser.add_argument('--von', type=zeit_lesen, help='Beginn, JJJJ-MM-TT HH:MM[:SS]')
+parser.add_argument('--bis', type=zeit_lesen, help='Ende (ausschließlich), JJJJ-MM-TT HH:MM[:SS]')
+parser.add_argument('--objekt', default='goe', help='"goe", "goe-<Name>" oder "sb", Standard goe')
+parser.add_argument('--nach', default='Uhrzeit_F', choices=('Uhrzeit_F', 'zeitstempel'),
+                    help='Schreibzeit (Uhrzeit_F) oder Abrufzeit am Gerät (zeitstempel), Standard Uhrzeit_F')
+parser.add_argument('--felder', nargs='+', help='Nur diese Felder ausgeben, Standard alle')
+parser.add_argument('--index-erstellen', action='store_true',
+                    help='Zeitindex aller CSV-Energielogs im Verzeichnis neu aufbauen')
+argumente = parser.parse_args()
+
+if argumente.index_erstellen:
+    for csv_name in sorted(glob.glob(f'{argumente.verzeichnis}/*-log.csv')
+                           + glob.glob(f'{argumente.verzeichnis}/*-log.csv.gz')):
+        csv_name = csv_name.removesuffix('.gz')  # Komprimierte Logs liest log_index_erstellen transparent
+        if csv_name.endswith('-sys-log.csv'):
+            continue
+        index_start = time.perf_counter()
+        anzahl = log_index_erstellen(csv_name)
+        print(f'<{csv_name}>: {anzahl} Indexeinträge in {time.perf_counter() - index_start:.2f} s.')
+    sys.exit(0)
+
+if argumente.von is None or argumente.bis is None:
+    parser.error('--von und --bis werden benötigt')
+
+abfrage_start = time.perf_counter()
+anzahl = 0
+for zeit, zeile in energielog_bereich(argumente.verzeichnis, argumente.objekt, argumente.von, argumente.bis,
+                                      argumente.nach):
+    if anzahl == 0:
+        print(';'.join(argumente.felder or [feld for feld in zeile if feld]))
+    print(';'.join(str(zeile.get(feld, '')) for feld in argumente.felder or zeile if feld))
+    anzahl += 1
+print(f'{anzahl} Zeilen in {time.perf_counter() - abfrage_start:.3f} s.', file=sys.stderr)
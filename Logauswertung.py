@@ -0,0 +1,84 @@
+"""Wertet die Energie- und Meldungs-Logs (logs/*-goe-log, *-sb-log, *-sys-log) je Tag und Monat aus: geladene Energie,
+deren Herkunft (PV-Überschuss, Batterie, Netz), vermiedene Einspeisung, Zeit je Fahrzeug-Zustand, Änderungen der
+Ladestrom-Vorgabe und Fehler. Die Logs werden Zeile für Zeile gestreamt (per mmap), der Speicherbedarf hängt also nicht
+von der Größe der Logs ab. Die Tage werden parallel auf allen Prozessorkernen ausgewertet.
+Programm CC-BY Musicaloris
+Projekt-Repository: https://github.com/Musicaloris/sb-goe-ueberschussladen/
+
+Aufruf: python Logauswertung.py [Verzeichnis] [--von 2023-06-01] [--bis 2023-06-30] [--objekt goe] [--nur-monate]"""
+
+# Python Standard Libraries importieren
+import argparse  # Für die Kommandozeilenparameter
+import functools  # Für das Festlegen der Parameter je Tag
+import glob  # Für das Finden der Logdateien
+import itertools  # Für das Gruppieren nach Monaten
+import os  # Für Dateipfade
+import sys  # Für Systemoperationen
+from concurrent.futures import ProcessPoolExecutor  # Für das parallele Auswerten der Tage
+
+# 3rd Party Libraries importieren
+import tomli  # Für das Einlesen der Konfigurationsdatei
+
+# Funktionen-Library dieses Projekts importieren
+from sbgoelib import energielog_auswertungen_summieren, energielog_tag_auswerten
+
+CAR_ZUSTAENDE = {'1': 'kein Fzg.', '2': 'lädt', '3': 'wartet', '4': 'beendet'}
+
+
+def zeile_ausgeben(ergebnis: dict):
+    """Gibt das Ergebnis eines Tages oder Monats als Textblock aus."""
+    pv_anteil = ergebnis['pv_kwh'] / ergebnis['geladen_kwh'] * 100 if ergebnis['geladen_kwh'] else 0
+    print(f'{ergebnis["datum"]}' + f' ({ergebnis.get("tage")} Tage)' * ('tage' in ergebnis) + ':')
+    print(f'    Geladen: {ergebnis["geladen_kwh"]:.2f} kWh (laut dws {ergebnis["geladen_dws_kwh"]:.2f} kWh), davon '
+          f'PV {ergebnis["pv_kwh"]:.2f} kWh ({pv_anteil:.0f} %), Batterie {ergebnis["batterie_kwh"]:.2f} kWh, '
+          f'Netz {ergebnis["netz_kwh"]:.2f} kWh')
+    print(f'    Einspeisung vermieden: {ergebnis["einspeisung_vermieden_kwh"]:.2f} kWh, eingespeist: '
+          f'{ergebnis["eingespeist_kwh"]:.2f} kWh, bezogen: {ergebnis["bezogen_kwh"]:.2f} kWh')
+    print('    Fahrzeug-Zustand: ' + ', '.join(f'{CAR_ZUSTAENDE.get(car, car)} {sekunden / 3600:.1f} h'
+                                                for car, sekunden in sorted(ergebnis['car_s'].items())))
+    print(f'    Änderungen Ladestrom-Vorgabe: {ergebnis["amp_aenderungen"]}, Laden erlaubt/unterbrochen: '
+          f'{ergebnis["alw_aenderungen"]}, Go-E-Fehler: {ergebnis["goe_fehler"]}, '
+          f'Fehlermeldungen: {ergebnis["meldungen_fehler"]}')
+
+
+if __name__ == '__main__':  # Die Prozesse des ProcessPoolExecutor importieren dieses Modul ebenfalls
+    parser = argparse.ArgumentParser(description='Energie- und Meldungs-Logs je Tag und Monat auswerten')
+    parser.add_argument('verzeichnis', nargs='?', default='logs', help='Verzeichnis der Logdateien, Standard logs')
+    parser.add_argument('--von', help='Erster Tag im Format JJJJ-MM-TT, Standard ist der älteste Tag')
+    parser.add_argument('--bis', help='Letzter Tag im Format JJJJ-MM-TT, Standard ist der neueste Tag')
+    parser.add_argument('--objekt', default='goe', help='Go-E-Log, "goe" oder "goe-<Name>" beim Mehrfachladen')
+    parser.add_argument('--konfiguration', default='config.toml', help='Konfigurationsdatei für sb_max_w')
+    parser.add_argument('--max-luecke', type=float, default=600,
+                        help='Längere Abstände zwischen zwei Logzeilen in s nicht mitzählen, Standard 600')
+    parser.add_argument('--prozesse', type=int, default=None, help='Anzahl Prozesse, Standard alle Prozessorkerne')
+    parser.add_argument('--nur-monate', action='store_true', help='Nur die Monatssummen ausgeben')
+    argumente = parser.parse_args()
+
+    sb_max_w = 4600
+    if os.path.isfile(argumente.konfiguration):
+        with open(argumente.konfiguration, 'rb') as konfiguration_datei:
+            sb_max_w = tomli.load(konfiguration_datei).get('sb_max_w', sb_max_w)
+
+    tage = sorted({os.path.basename(name)[:10]
+                   for name in glob.glob(f'{argumente.verzeichnis}/*-{argumente.objekt}-log.*')
+                   if name.endswith(('.csv', '.bin', '.csv.gz', '.bin.gz'))
+                   and (argumente.von or '') <= os.path.basename(name)[:10] <= (argumente.bis or '9999')})
+    if not tage:
+        print(f'Keine Energielogs <{argumente.objekt}> in <{argumente.verzeichnis}> gefunden.')
+        sys.exit(1)
+
+    tag_auswerten = functools.partial(energielog_tag_auswerten, argumente.verzeichnis, objekt=argumente.objekt,
+                                      sb_max_w=sb_max_w, max_luecke_s=argumente.max_luecke)
+    with ProcessPoolExecutor(max_workers=argumente.prozesse) as pool:
+        # map liefert die Tage in der richtigen Reihenfolge, ausgewertet werden sie parallel
+        ergebnisse = pool.map(tag_auswerten, tage)
+        for monat, monat_ergebnisse in itertools.groupby(ergebnisse, key=lambda ergebnis: ergebnis['datum'][:7]):
+            if argumente.nur_monate:
+                zeile_ausgeben(energielog_auswertungen_summieren(monat_ergebnisse, monat))
+                continue
+            monat_ergebnisse = list(monat_ergebnisse)  # Höchstens ein Monat an Tagesergebnissen im Speicher
+            for ergebnis in monat_ergebnisse:
+                zeile_ausgeben(ergebnis)
+            print('-' * 35)
+            zeile_ausgeben(energielog_auswertungen_summieren(monat_ergebnisse, f'Monat {monat}'))
+            print()
@@ -0,0 +1,31 @@
+"""Wandelt CSV-Energielogs (JJJJ-MM-TT-goe-log.csv / -sb-log.csv) in das kompakte Binär-Log um.
+Programm CC-BY Musicaloris
+Projekt-Repository: https://github.com/Musicaloris/sb-goe-ueberschussladen/
+
+Aufruf: python Logkonverter.py logs/2023-06-16-goe-log.csv logs/2023-06-16-sb-log.csv [--ziel logs]"""
+
+# Python Standard Libraries importieren
+import argparse  # Für die Kommandozeilenparameter
+import os  # Für Dateigrößen und Pfade
+
+# Funktionen-Library dieses Projekts importieren
+from sbgoelib import csv_log_konvertieren
+
+parser = argparse.ArgumentParser(description='CSV-Energielogs in das Binär-Log umwandeln')
+parser.add_argument('dateien', nargs='+', help='CSV-Logdateien (goe oder sb)')
+parser.add_argument('--ziel', default=None, help='Zielverzeichnis, Standard ist das Verzeichnis der CSV-Datei')
+argumente = parser.parse_args()
+
+summe_alt, summe_neu = 0, 0
+for csv_name in argumente.dateien:
+    ziel = argumente.ziel or os.path.dirname(csv_name) or '.'
+    bin_name, kopf_name = csv_log_konvertieren(csv_name, ziel)
+    groesse_alt = os.path.getsize(csv_name)
+    groesse_neu = os.path.getsize(bin_name) + os.path.getsize(kopf_name)
+    summe_alt += groesse_alt
+    summe_neu += groesse_neu
+    print(f'<{csv_name}> → <{bin_name}> + <{kopf_name}>: {groesse_alt} → {groesse_neu} Bytes '
+          f'(Faktor {groesse_alt / max(groesse_neu, 1):.1f})')
+
+if len(argumente.dateien) > 1:
+    print(f'Gesamt: {summe_alt} → {summe_neu} Bytes (Faktor {summe_alt / max(summe_neu, 1):.1f})')
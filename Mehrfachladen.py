@@ -0,0 +1,273 @@
+"""PV-Überschussladen mit mehreren Go-eChargern hinter einem gemeinsamen Netzzähler und einer oder mehreren
+SonnenBatterien. Alle Geräte werden je Zyklus gleichzeitig mit asyncio abgefragt, die verfügbare Leistung wird nach
+[mehrfachladen] verteilung aus der config.toml auf die aktiven Fahrzeuge aufgeteilt. Jeder Ladepunkt hat seine eigene
+gelernte Ladekurve und sein eigenes Rate-Limit.
+Programm CC-BY Musicaloris
+Projekt-Repository: https://github.com/Musicaloris/sb-goe-ueberschussladen/
+
+Aufruf: python Mehrfachladen.py [--konfiguration config.toml] [--zyklen 0]"""
+
+# Python Standard Libraries importieren
+import argparse  # Für die Kommandozeilenparameter
+import asyncio  # Für das gleichzeitige Abfragen und Steuern aller Geräte
+import collections  # Für die Statistik der Zyklusdauer
+import contextlib  # Für das Stummschalten der Rechenwege je Ladepunkt
+import io  # Für das Stummschalten der Rechenwege je Ladepunkt
+import os  # Für Dateioperationen
+import signal  # Für das saubere Beenden mit Strg+C oder SIGTERM
+import statistics  # Für die Statistik der Zyklusdauer
+import sys  # Für Systemoperationen
+import time  # Für Zeitstempel und Zeitmessung
+
+# 3rd Party Libraries importieren
+import tomli  # Für das Einlesen der Konfigurationsdatei
+
+# Funktionen-Library dieses Projekts importieren
+from sbgoelib import *
+
+
+def ladepunkte_erstellen(konf: dict) -> list:
+    """Erstellt die Ladepunkt-Objekte aus [mehrfachladen] und lädt ihre gelernten Ladekurven.
+
+    :return: Liste der Ladepunkt-Objekte
+    """
+    ladepunkte = []
+    for goe in konf['mehrfachladen']['goe']:
+        ladepunkt = Ladepunkt(goe['name'], goe['adresse'], Ladekurve(konf['ladekurve'], konf['ladekurve_glaettung']),
+                              f'ladekurven/{goe.get("fahrzeug_profil", goe["name"])}.json', goe.get('prioritaet', 1),
+                              goe.get('akku_kwh', 0))
+        try:
+            ladepunkt.ladekurve.laden(ladepunkt.ladekurve_datei)
+        except (ValueError, KeyError, OSError) as kurven_err:  # Defekte Datei: mit der Ladekurve aus config.toml
+            print(f'!!!!Fehler beim Laden der Ladekurve <{ladepunkt.ladekurve_datei}>, nutze config.toml: {kurven_err}')
+        ladepunkte.append(ladepunkt)
+    return ladepunkte
+
+
+async def ladepunkt_steuern(ladepunkt: Ladepunkt, ladeleistung: dict, konf: dict, transport: TransportAsyncio):
+    """Setzt den errechneten Ladestrom an einem aktiven Ladepunkt, wie die Hauptschleife in Hauptprogramm.py."""
+    simuliert = '[simuliert] ' * konf['simulieren']
+    amp_alt = ladepunkt.status.amp
+    if ladeleistung['A'] < 6:  # Der Go-E Charger lädt mit mindestens 6A
+        if ladepunkt.status.alw == 1:
+            if await goe_setzen_async('alw', 0, ladepunkt, konf, transport):
+                log_event(f'{simuliert}{ladepunkt.name}: Laden wurde aufgrund zu kleiner zur Verfügung stehender '
+                          f'Leistung unterbrochen.', konf)
+            else:
+                log_event(f'{ladepunkt.name}: Fehler beim Unterbrechen der Fahrzeugladung!', konf)
+    elif ladepunkt.status.alw == 1:  # Wenn Laden schon erlaubt ist, Ladeleistung setzen
+        if await goe_setzen_async('amx', ladeleistung['A'], ladepunkt, konf, transport):
+            if amp_alt != ladeleistung['A']:
+                log_event(f'{simuliert}{ladepunkt.name}: Ladestrom-Vorgabe ist {ladeleistung["A"]} A '
+                          f'(war {amp_alt} A).', konf)
+        else:
+            log_event(f'{ladepunkt.name}: Fehler beim Setzen der Ladeleistung!', konf)
+    else:  # Wenn Laden noch nicht erlaubt war, Ladeleistung setzen und Laden erlauben
+        if await goe_mehrfach_setzen_async({'amx': ladeleistung['A'], 'alw': 1}, ladepunkt, konf, transport):
+            log_event(f'{simuliert}{ladepunkt.name}: Ladevorgang wurde mit {ladeleistung["A"]} A gestartet / wieder '
+                      f'aufgenommen!', konf)
+        else:
+            log_event(f'{ladepunkt.name}: Ladevorgang konnte nicht gestartet / wieder aufgenommen werden.', konf)
+
+
+async def alle_holen(abfragen: dict, konf: dict, transport: TransportAsyncio) -> dict:
+    """Holt die Daten aller Geräte gleichzeitig mit einer gemeinsamen Frist von konf['wartezeit'] Sekunden, wie
+    daten_holen_parallel.
+
+    :param abfragen: dict-Objekt {objekt_name: (objekt, url)}
+    :return: dict-Objekt {objekt_name: Rückgabe von daten_holen_async}
+    """
+    abruf_start = time.perf_counter()
+    auftraege = {objekt_name: asyncio.ensure_future(daten_holen_async(objekt_name, objekt, url, konf, transport))
+                 for objekt_name, (objekt, url) in abfragen.items()}
+    await asyncio.wait(auftraege.values(), timeout=konf['wartezeit'])
+    ergebnisse = {}
+    for objekt_name, auftrag in auftraege.items():
+        if auftrag.done():
+            ergebnisse[objekt_name] = auftrag.result()
+        else:
+            auftrag.cancel()
+            log_event(f'{objekt_name} hat nicht innerhalb von {konf["wartezeit"]} s geantwortet.', konf)
+            metriken_holen().zaehlen('sbgoe_abruf_fehler_total', geraet=objekt_name)
+            ergebnisse[objekt_name] = type(abfragen[objekt_name][0])(objekt_name, time.time(),
+                                                                     time.perf_counter() - abruf_start)
+    return ergebnisse
+
+
+async def zyklus(ladepunkte: list, sb_status_liste: list, prognose: UeberschussPrognose, konf: dict,
+                 transport: TransportAsyncio, ausgabe: bool):
+    """Ein Regelzyklus: alle Geräte abfragen, Leistung verteilen, alle aktiven Ladepunkte gleichzeitig steuern. Die
+    verfügbare Leistung wird vor dem Verteilen wie in Hauptprogramm.py von der UeberschussPrognose geglättet.
+
+    :return: Bool-Wert True falls der Zyklus vollständig war, False falls SB-Daten gefehlt haben
+    """
+    sb_urls = [f'http://{adresse}/api/v2/status' for adresse in konf['mehrfachladen']['sb_adressen']]  # v2 JSON API
+    abfragen = {f'SB{nummer + 1}': (sb_status_liste[nummer], url) for nummer, url in enumerate(sb_urls)}
+    abfragen |= {ladepunkt.name: (ladepunkt.status, ladepunkt.status_url) for ladepunkt in ladepunkte}
+    ergebnisse = await alle_holen(abfragen, konf, transport)
+    for nummer in range(len(sb_urls)):
+        sb_status_liste[nummer] = ergebnisse[f'SB{nummer + 1}']
+    for ladepunkt in ladepunkte:
+        ladepunkt.status = ergebnisse[ladepunkt.name]  # Ohne status_code ist der Ladepunkt in diesem Zyklus inaktiv
+
+    if not all(sb_status.gueltig for sb_status in sb_status_liste):
+        log_event('SB-Daten ungültig? Abwarten und nochmal versuchen...', konf)
+        return False
+
+    erreichbar = [ladepunkt for ladepunkt in ladepunkte if ladepunkt.status.gueltig]
+    for ladepunkt in erreichbar:
+        if ladekurve_lernen_erlaubt(ladepunkt.status):
+            ladepunkt.ladekurve.lernen(ladepunkt.status.amp, ladepunkt.status.nrg[11] * 10)
+
+    # Nicht erreichbare Ladepunkte werden nicht gesteuert, ihre Leistung steht daher auch nicht zur Verfügung
+    goe_leistung_w = sum(ladepunkt.status.nrg[11] * 10 for ladepunkt in erreichbar)
+    sb_status = sb_status_zusammenfassen(sb_status_liste)
+    lade_soll_w = ueberschuss_bestimmen(sb_status, goe_leistung_w, konf)
+    metriken = metriken_holen()
+    metriken.setzen('sbgoe_ueberschuss_watt', lade_soll_w)
+    lade_soll_w = prognose.aktualisieren(sb_status.zeitstempel, lade_soll_w, konf)
+    metriken.setzen('sbgoe_ueberschuss_prognose_watt', lade_soll_w)
+    with contextlib.redirect_stdout(io.StringIO()):  # Rechenweg je Ladepunkt nicht ausgeben, bei vielen zu lang
+        verteilung = leistung_verteilen(lade_soll_w, erreichbar, konf)
+    for ladepunkt in erreichbar:
+        metriken.setzen('sbgoe_ladestrom_vorgabe_ampere', verteilung[ladepunkt.name]['A'], geraet=ladepunkt.name)
+        metriken.setzen('sbgoe_ladeleistung_watt', ladepunkt.status.nrg[11] * 10, geraet=ladepunkt.name)
+    aktive = [ladepunkt for ladepunkt in erreichbar if ladepunkt.aktiv()]
+    await asyncio.gather(*(ladepunkt_steuern(ladepunkt, verteilung[ladepunkt.name], konf, transport)
+                           for ladepunkt in aktive))
+
+    if ausgabe:
+        print(f'\nStand {time.strftime("%H:%M:%S")}: {lade_soll_w} W verfügbar, {goe_leistung_w} W Ladeleistung aller '
+              f'Go-E, {len(aktive)} von {len(ladepunkte)} Ladepunkten aktiv')
+        for ladepunkt in ladepunkte:
+            if ladepunkt in aktive:
+                print(f'    {ladepunkt.name}: {ladepunkt.status.nrg[11] * 10} W bei {ladepunkt.status.amp} A, '
+                      f'Vorgabe {verteilung[ladepunkt.name]["A"]} A')
+            elif ladepunkt not in erreichbar:
+                print(f'    {ladepunkt.name}: nicht erreichbar')
+
+    if konf['logging_nrg']:
+        for ladepunkt in erreichbar:
+            log_nrg(f'goe-{ladepunkt.name}', ladepunkt.status, konf)
+        for nummer, sb_status_i in enumerate(sb_status_liste):
+            log_nrg('sb' if not nummer else f'sb-{nummer + 1}', sb_status_i, konf)
+    return True
+
+
+async def mehrfachladen(konf: dict, zyklen: int = 0, ausgabe: bool = True) -> dict:
+    """Hauptschleife des Mehrfachladens auf dem festen Zyklusraster konf['wartezeit'].
+
+    :param konf: dict-Objekt mit der geprüften Konfiguration
+    :param zyklen: Nach so vielen Zyklen beenden, 0 = bis Strg+C oder SIGTERM
+    :param ausgabe: Zusammenfassung je Zyklus auf der Konsole ausgeben
+    :return: dict-Objekt mit dem Grund des Beendens, Zyklusdauern in s und der Takt-Statistik
+    """
+    takt = ZyklusTakt(konf['wartezeit'])
+    transport = TransportAsyncio()
+    ladepunkte = ladepunkte_erstellen(konf)
+    sb_status_liste = [SBStatus(f'SB{nummer + 1}', time.time() - konf['wartezeit'])
+                       for nummer in range(len(konf['mehrfachladen']['sb_adressen']))]
+    prognose = UeberschussPrognose()
+    ergebnis = {'grund': 'run', 'zyklusdauer': collections.deque(maxlen=1000)}
+    ladekurven_gespeichert = time.monotonic()
+
+    def beenden(grund: str):
+        ergebnis['grund'] = grund
+        takt.stoppen()
+
+    loop = asyncio.get_running_loop()
+    for signalnummer in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signalnummer, beenden, f'Signal {signal.Signals(signalnummer).name} empfangen')
+        except (NotImplementedError, RuntimeError):  # Windows oder nicht im Haupt-Thread
+            pass
+
+    try:
+        anzahl = 0
+        while ergebnis['grund'] == 'run':
+            start = time.perf_counter()
+            await zyklus(ladepunkte, sb_status_liste, prognose, konf, transport, ausgabe)
+            ergebnis['zyklusdauer'].append(time.perf_counter() - start)
+            if time.monotonic() - ladekurven_gespeichert >= konf['ladekurve_speichern_s']:
+                for ladepunkt in ladepunkte:
+                    ladepunkt.ladekurve.speichern(ladepunkt.ladekurve_datei)
+                ladekurven_gespeichert = time.monotonic()
+            anzahl += 1
+            if zyklen and anzahl >= zyklen:
+                ergebnis['grund'] = f'{zyklen} Zyklen durchlaufen'
+                break
+            # Der Takt schläft in einem Worker-Thread, damit er wie in Hauptprogramm.py per stoppen() geweckt wird
+            if not await loop.run_in_executor(None, takt.warten, False):
+                break
+    finally:
+        for signalnummer in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.remove_signal_handler(signalnummer)
+            except (NotImplementedError, RuntimeError):
+                pass
+        transport.schliessen()
+        for ladepunkt in ladepunkte:
+            ladepunkt.ladekurve.speichern(ladepunkt.ladekurve_datei)
+    ergebnis['takt'] = takt.statistik()
+    return ergebnis
+
+
+def zyklusdauer_text(zyklusdauer) -> str:
+    """Text mit Mittel, 95 %-Wert und Maximum der Zyklusdauern"""
+    if not zyklusdauer:
+        return 'Keine Zyklen gemessen.'
+    sortiert = sorted(zyklusdauer)
+    return (f'Zyklusdauer über {len(sortiert)} Zyklen: Mittel {statistics.fmean(sortiert) * 1000:.1f} ms, '
+            f'95 % {sortiert[min(int(len(sortiert) * 0.95), len(sortiert) - 1)] * 1000:.1f} ms, '
+            f'max. {sortiert[-1] * 1000:.1f} ms.')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='PV-Überschussladen mit mehreren Go-eChargern')
+    parser.add_argument('--konfiguration', default='config.toml', help='Konfigurationsdatei, Standard config.toml')
+    parser.add_argument('--zyklen', type=int, default=0, help='Nach so vielen Zyklen beenden, Standard 0 = unbegrenzt')
+    argumente = parser.parse_args()
+
+    try:
+        with open(argumente.konfiguration, 'rb') as konfiguration_datei:
+            konf = tomli.load(konfiguration_datei)
+    except tomli.TOMLDecodeError as toml_err:
+        print(f'Fehler beim Einlesen der Konfigurationsdatei <{argumente.konfiguration}>. Ist die Datei gemäß '
+              f'TOML-Standard kodiert?')
+        print(f'Fehlermeldung: {toml_err}')
+        sys.exit(1)
+    konfigurationswerte_pruefen(konf)
+    mehrfachladen_pruefen(konf)
+
+    for verzeichnis in ('logs', 'ladekurven'):
+        if verzeichnis == 'ladekurven' or konf['logging_nrg'] or konf['logging_events']:
+            os.makedirs(verzeichnis, exist_ok=True)
+
+    log_rotation = log_rotation_starten(konf) if konf['logging_nrg'] or konf['logging_events'] else None
+    metriken_server = metriken_server_starten(konf)
+
+    print('-' * 35)
+    print('Programm-Konfiguration Mehrfachladen:')
+    print(f'    Lademodus <{konf["laden_prio"]}>: {konf["laden_prio_text"][konf["laden_prio"]]}')
+    print(f'    Verteilung <{konf["mehrfachladen"]["verteilung"]}>: '
+          f'{VERTEILUNGEN[konf["mehrfachladen"]["verteilung"]]}')
+    print(f'    SonnenBatterien: {", ".join(konf["mehrfachladen"]["sb_adressen"])}')
+    for goe in konf['mehrfachladen']['goe']:
+        print(f'    Go-eCharger {goe["name"]}: {goe["adresse"]}, Priorität {goe.get("prioritaet", 1)}')
+    print(f'    Aktualisierungsgeschwindigkeit / Wartezeit: {konf["wartezeit"]} Sekunden')
+    if metriken_server:
+        print(f'    Metriken: <http://{konf["metriken_adresse"]}:{konf["metriken_port"]}/metrics>')
+    if konf['simulieren']:
+        print('    Simulieren ist aktiv, es werden keine Werte auf die Go-eCharger geschrieben!')
+    print('Zum Beenden des Programms Strg + C drücken.')
+    print('-' * 10)
+
+    ergebnis = asyncio.run(mehrfachladen(konf, argumente.zyklen))
+    print('-' * 35)
+    log_event(f'Das Programm wurde regulär beendet. Grund: {ergebnis["grund"]}', konf)
+    log_event(zyklusdauer_text(ergebnis['zyklusdauer']), konf)
+    log_event(f'Zyklus-Takt: {ergebnis["takt"]}', konf)
+    if log_rotation:
+        log_rotation.beenden()
+    if konf['logging_nrg'] or konf['logging_events']:
+        log_schreiber_holen(konf).beenden()  # Alle noch wartenden Logzeilen schreiben
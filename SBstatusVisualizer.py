@@ -1,9 +1,24 @@
+import queue
+import threading
+import time
+import numpy as np
 import requests
 import ttkbootstrap as ttkb
 import tkinter as tk
 from tkinter import ttk
+from sbgoelib import energielog_bereich
 
-refresh_time_ms = 2000
+refresh_time_ms = 500
+request_timeout_s = 2
+backoff_max_s = 30
+result_poll_ms = 50
+log_directory = "logs"  # daily SB logs of Hauptprogramm.py, used to fill the history on start
+history_seconds = 7 * 24 * 3600
+history_resolution_s = 10
+history_redraw_ms = 1000
+history_height = 200
+history_windows = {"1 hour": 3600, "6 hours": 6 * 3600, "1 day": 24 * 3600, "1 week": 7 * 24 * 3600}
+history_fields = ["PV", "Consumption", "Battery_Power", "Grid", "Battery_SOC"]
 window_width = 500
 display_config = {"padding_x": 10,
                   "padding_y": 10,
@@ -42,6 +57,45 @@ bar_mapping = {"PV": "Production_W",
                "Consumption": "Consumption_W",
                "Grid": "GridFeedIn_W"
                }
+history_colors = {name: style["fill"] for name, style in pie_styles.items()} | {"Battery_SOC": "cyan"}
+fetch_results = queue.Queue()  # fetch worker -> Tk main thread
+fetch_wakeup = threading.Event()  # set to fetch immediately, e.g. by the Refresh button
+fetch_settings = {"url": ""}  # written on the Tk main thread, read by the fetch worker (Tk variables are not thread safe)
+drawn_items: dict[str, tuple[list, dict]] = {}  # canvas tag -> last drawn coords and options
+
+####### History, a fixed-size ring buffer instead of growing lists
+class HistoryBuffer:
+    def __init__(self, capacity: int, resolution_s: float, field_count: int):
+        self.data = np.zeros((capacity, field_count + 1))  # column 0 is the unix time
+        self.resolution_s = resolution_s
+        self.next = 0  # write position
+        self.count = 0
+
+    def append(self, timestamp: float, values) -> bool:
+        if self.count and timestamp < self.data[self.next - 1, 0] + self.resolution_s:
+            return False  # keep at most one sample per resolution_s
+        self.data[self.next, 0] = timestamp
+        self.data[self.next, 1:] = values
+        self.next = (self.next + 1) % len(self.data)
+        self.count = min(self.count + 1, len(self.data))
+        return True
+
+    def window(self, since: float) -> np.ndarray:
+        # chronological samples newer than since, only the requested part is copied
+        if self.count < len(self.data):
+            parts = [self.data[:self.count]]
+        else:
+            parts = [self.data[self.next:], self.data[:self.next]]
+        parts = [part[np.searchsorted(part[:, 0], since):] for part in parts]
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+def downsample_min_max(samples: np.ndarray, start: float, end: float, buckets: int):
+    # one min/max pair per pixel column, so drawing cost depends on the canvas width and not on the window length
+    bucket = ((samples[:, 0] - start) * (buckets / (end - start))).astype(np.int64).clip(0, buckets - 1)
+    first = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    return bucket[first], np.minimum.reduceat(samples[:, 1:], first), np.maximum.reduceat(samples[:, 1:], first)
+
+history = HistoryBuffer(history_seconds // history_resolution_s, history_resolution_s, len(history_fields))
 
 ####### GUI functions
 def set_sb_url():
@@ -49,21 +103,108 @@ def set_sb_url():
 
 def close_url_set_dialog():
     api_url.set(f"{protocol.get()}://{sb_base_url.get()}/{sb_api_endpoint.get()}")
+    fetch_settings["url"] = api_url.get()
+    fetch_wakeup.set()
     url_setting.withdraw() 
 
 def refresh_diagram():
     status_text.set("Getting fresh data from API...")
-    root.update_idletasks()
-    state_dict = get_update_data()
-    status_text.set(f"Acquired data with timestamp {state_dict["Timestamp"]}, building graphic...")
-    root.update_idletasks()
-    update_diagram(state_dict)
-    status_text.set(f"This is data with timestamp {state_dict["Timestamp"]}")
-    root.update_idletasks()
-    root.after(refresh_time_ms, refresh_diagram)
-
-def get_update_data() -> dict:
-    return requests.get(api_url.get()).json()  # TODO handle error status codes and connection errors and and and...
+    fetch_wakeup.set()
+
+####### Data fetching, runs in a background thread so a slow or unreachable battery never blocks the window
+def load_history_from_logs():
+    rows = []
+    now = time.time()
+    try:
+        # read only: the controller keeps writing these logs, so no index is created or rewritten here
+        for timestamp, row in energielog_bereich(log_directory, "sb", now - history_seconds, now,
+                                                 index_erstellen=False):
+            try:
+                rows.append((timestamp, [float(row[bar_mapping[name]]) for name in history_fields]))
+            except (KeyError, ValueError):  # incomplete log line
+                pass
+    except Exception as error:  # a damaged log must never stop the live data, continue with what was read
+        print(f"loading history from <{log_directory}> failed: {error!r}")
+        fetch_results.put(("error", f"loading history from <{log_directory}> failed: {error!r}"))
+    fetch_results.put(("history", rows))
+
+def fetch_worker():
+    load_history_from_logs()  # before the first live sample, so the history stays in time order
+    session = requests.Session()  # keeps the connection to the battery open between requests
+    backoff_s = 0
+    next_fetch = time.monotonic()
+    while True:
+        fetch_wakeup.wait(max(next_fetch - time.monotonic(), 0))
+        fetch_wakeup.clear()
+        try:
+            response = session.get(fetch_settings["url"], timeout=request_timeout_s)
+            response.raise_for_status()
+            fetch_results.put(("data", (time.time(), response.json())))
+            backoff_s = 0
+        except (requests.RequestException, ValueError) as error:
+            backoff_s = min(max(backoff_s * 2, refresh_time_ms / 1000), backoff_max_s)
+            fetch_results.put(("error", f"{type(error).__name__} - retrying in {backoff_s:.1f} s"))
+        next_fetch = max(next_fetch + refresh_time_ms / 1000, time.monotonic()) + backoff_s
+
+def poll_results():
+    root.after(result_poll_ms, poll_results)
+    state_dict, error_text = None, None
+    try:
+        while True:  # only the newest result matters
+            kind, payload = fetch_results.get_nowait()
+            if kind == "data":
+                (received, state_dict), error_text = payload, None
+                try:
+                    history.append(received, [state_dict[bar_mapping[name]] for name in history_fields])
+                except (KeyError, TypeError, ValueError):
+                    pass  # reported by update_diagram below
+            elif kind == "history":
+                for timestamp, values in payload:
+                    history.append(timestamp, values)
+            else:
+                error_text = payload
+    except queue.Empty:
+        pass
+    if state_dict is not None:
+        try:
+            update_diagram(state_dict)
+            status_text.set("This is data with timestamp " + str(state_dict.get("Timestamp")))
+        except (KeyError, TypeError) as error:  # e.g. a wrong API endpoint
+            error_text = f"unexpected data, {type(error).__name__}: {error}"
+    if error_text is not None:
+        status_text.set("Fetching data failed: " + error_text)
+
+####### Drawing, canvas items are only touched when their values changed
+def set_canvas_item(tag: str, coords: list, **options):
+    drawn_coords, drawn_options = drawn_items.get(tag, (None, {}))
+    if coords != drawn_coords:
+        energy_diagram.coords(tag, *coords)
+    changed_options = {key: value for key, value in options.items() if drawn_options.get(key) != value}
+    if changed_options:
+        energy_diagram.itemconfigure(tag, changed_options)
+    drawn_items[tag] = (coords, drawn_options | options)
+
+def redraw_history():
+    root.after(history_redraw_ms, redraw_history)
+    window_s = history_windows[history_window.get()]
+    now = time.time()
+    samples = history.window(now - window_s)
+    if len(samples) == 0:
+        return
+    x, minimum, maximum = downsample_min_max(samples, now - window_s, now, window_width)
+    power_columns = [column for column, name in enumerate(history_fields) if name != "Battery_SOC"]
+    power_low = min(minimum[:, power_columns].min(), 0)
+    power_high = max(maximum[:, power_columns].max(), power_low + 1)
+    for column, name in enumerate(history_fields):
+        low, high = (0, 100) if name == "Battery_SOC" else (power_low, power_high)
+        coords = np.empty(len(x) * 4)
+        coords[0::4] = coords[2::4] = x
+        coords[1::4] = history_height - (maximum[:, column] - low) / (high - low) * (history_height - 20) - 10
+        coords[3::4] = history_height - (minimum[:, column] - low) / (high - low) * (history_height - 20) - 10
+        history_diagram.coords(name, coords.tolist())
+    zero_y = history_height - (0 - power_low) / (power_high - power_low) * (history_height - 20) - 10
+    history_diagram.coords("zero_line", 0, zero_y, window_width, zero_y)
+    history_diagram.itemconfigure("scale", text=f"{power_high:.0f} W / {power_low:.0f} W, {len(samples)} samples")
 
 def update_diagram(state: dict):
     energy_distribution = {"source":  {"PV": state[bar_mapping["PV"]]},
@@ -73,17 +214,17 @@ def update_diagram(state: dict):
     energy_distribution["source" if state[bar_mapping["Grid"]]           < 0 else "drain"] |= {"Grid":          abs(state[bar_mapping["Grid"]])}
     for side, value_dict in energy_distribution.items():
         side_direction_factor = 1 if side == "source" else -1
+        side_total = sum(value_dict.values()) or 1  # e.g. no PV and an idle battery at night
         start_value = 180
         for name, value in value_dict.items():
             arc_position[name]["start"] = start_value
-            arc_position[name]["extent"] = value / sum(value_dict.values()) * 180 * side_direction_factor * -1
-            energy_diagram.coords(name, *pie_coordinates[side])
-            energy_diagram.itemconfigure(name, arc_position[name])
+            arc_position[name]["extent"] = round(value / side_total * 180 * side_direction_factor * -1, 1)
+            set_canvas_item(name, pie_coordinates[side], **arc_position[name])
             start_value = arc_position[name]["start"] + arc_position[name]["extent"]
-    chargebar_coords = energy_diagram.coords("USOC_charge")
+    chargebar_coords = list(USOC_bar_position)
     chargebar_coords[2] = display_config["padding_x"] + (pie_coordinates["source"][2] - pie_coordinates["source"][0]) * state[bar_mapping["Battery_SOC"]] / 100
-    energy_diagram.coords("USOC_charge", *chargebar_coords)
-    energy_diagram.itemconfigure("text", text="   |   ".join(f"{side}: {value_dict}" for side, value_dict in energy_distribution.items()))
+    set_canvas_item("USOC_charge", chargebar_coords)
+    set_canvas_item("text", text_position, text="   |   ".join(f"{side}: {value_dict}" for side, value_dict in energy_distribution.items()))
 
 ####### GUI config
 # root = tk.Tk(title="SonnenBatterie Status Visualizer")
@@ -104,6 +245,11 @@ ttk.Button(root, text="URL setting", command=set_sb_url).grid(row=0, column=2, s
 energy_diagram = tk.Canvas(root, width=window_width, height=canvas_height)
 energy_diagram.grid(row=1, columnspan=3)
 ttk.Label(root, textvariable=status_text, state="disabled").grid(row=2, columnspan=3)
+history_window = tk.StringVar(value="1 day")
+ttk.Label(root, text="History").grid(row=3, column=0, sticky="w")
+ttk.Combobox(root, textvariable=history_window, values=list(history_windows), width=10, state="readonly").grid(row=3, column=2, sticky="e")
+history_diagram = tk.Canvas(root, width=window_width, height=history_height)
+history_diagram.grid(row=4, columnspan=3)
 
 for name, style in pie_styles.items():
     energy_diagram.create_arc(*pie_coordinates["source"], **style, tags=name)
@@ -112,6 +258,10 @@ energy_diagram.create_rectangle(*USOC_bar_position, tags="USOC_base", **bar_styl
 energy_diagram.create_arc(*pie_coordinates["source"], extent=180, outline="black", width=3)
 energy_diagram.create_arc(*pie_coordinates["drain"], extent=-180, outline="black", width=3)
 energy_diagram.create_text(*text_position, text="", anchor="center", tags="text", font=("",8))
+history_diagram.create_line(0, 0, 0, 0, fill="grey", dash=(2, 2), tags="zero_line")
+for name in history_fields:
+    history_diagram.create_line(0, 0, 0, 0, fill=history_colors[name], tags=name)
+history_diagram.create_text(5, 5, text="", anchor="nw", tags="scale", font=("",8))
 
 
 ### GUI layout URL setting dialog
@@ -128,6 +278,8 @@ ttk.Label(url_setting, text="Set API URL").grid(row=0, column=4)
 ttk.Combobox(url_setting, textvariable=sb_api_endpoint, values=api_values, width=15).grid(row=1, column=4)
 close_url_set_dialog()
 
-refresh_diagram()
+threading.Thread(target=fetch_worker, name="fetch_worker", daemon=True).start()
+poll_results()
+redraw_history()
 
 root.mainloop()
@@ -0,0 +1,233 @@
+"""Lokaler Statusverteiler: fragt SonnenBatterie und Go-eCharger je einmal im festen Takt ab, hält die neuesten Daten
+im Speicher und verteilt sie an alle Programme, die sie brauchen. Hauptprogramm.py, SBstatusVisualizer und weitere
+Abnehmer teilen sich so eine Abfrage je Gerät, statt jedes Gerät selbst abzufragen (Rate-Limiting des Go-eChargers).
+Programm CC-BY Musicaloris
+Projekt-Repository: https://github.com/Musicaloris/sb-goe-ueberschussladen/
+
+Schnittstellen, alle per HTTP auf <verteiler.adresse>:<verteiler.port>:
+    /api/v2/status      Zwischengespeicherte Daten der SB, wie bei der SB selbst
+    /status             Zwischengespeicherte Daten des Go-eChargers, wie beim Go-eCharger selbst
+    /mqtt?payload=...   Wird an den Go-eCharger weitergereicht, seine Antwort ersetzt die zwischengespeicherten Daten
+    /events             Server-Sent Events: "event: sb" bzw. "event: goe" mit den JSON-Daten bei jeder neuen Abfrage
+In der config.toml dann goe_adresse und sb_adresse auf "<verteiler.adresse>:<verteiler.port>" setzen, im
+SBstatusVisualizer als Base URL ebenso.
+
+Aufruf: python Statusverteiler.py [--konfiguration config.toml]"""
+
+# Python Standard Libraries importieren
+import argparse  # Für die Kommandozeilenparameter
+import http.server  # Für die HTTP-Schnittstellen
+import json  # Für das Prüfen und Verdichten der Gerätedaten
+import os  # Für Dateioperationen
+import signal  # Für das saubere Beenden mit Strg+C oder SIGTERM
+import sys  # Für Systemoperationen
+import threading  # Für die Abfrage-Threads und das Benachrichtigen der Abnehmer
+import time  # Für das Alter der Daten
+from urllib.parse import urlsplit  # Für das Zerlegen der Anfragen
+
+# 3rd Party Libraries importieren
+import tomli  # Für das Einlesen der Konfigurationsdatei
+
+# Funktionen-Library dieses Projekts importieren
+from sbgoelib import (ZyklusTakt, konfigurationswerte_pruefen, log_event, log_schreiber_holen, schutzschalter_holen,
+                      transport_holen, verteiler_pruefen)
+
+PFADE = {'/api/v2/status': 'SB', '/status': 'Go-E'}  # Pfad wie beim Gerät → Gerät
+EREIGNISSE = {'SB': b'sb', 'Go-E': b'goe'}  # Gerät → Name des Server-Sent Events
+KEEPALIVE_S = 15  # Ohne neue Daten bekommen die /events-Abnehmer so oft einen Kommentar, damit Verbindungsabbrüche
+                  # auffallen
+
+
+class Momentaufnahmen:
+    """Neueste Daten je Gerät. Jede neue Momentaufnahme bekommt eine fortlaufende Versionsnummer, wartende Abnehmer
+    werden über die Condition geweckt."""
+
+    def __init__(self):
+        self.bedingung = threading.Condition()
+        self.daten = {}  # Gerät → (Version, Zeitpunkt time.monotonic(), JSON als bytes)
+        self.version = 0
+
+    def setzen(self, geraet: str, inhalt: dict):
+        """Speichert neue Daten eines Geräts und weckt alle wartenden Abnehmer."""
+        daten = json.dumps(inhalt, separators=(',', ':'), ensure_ascii=False).encode()  # Einzeilig für die Events
+        with self.bedingung:
+            self.version += 1
+            self.daten[geraet] = (self.version, time.monotonic(), daten)
+            self.bedingung.notify_all()
+
+    def holen(self, geraet: str):
+        """:return: (Version, Zeitpunkt, JSON als bytes) oder None, falls das Gerät noch nie geantwortet hat"""
+        with self.bedingung:
+            return self.daten.get(geraet)
+
+    def warten(self, version: int, timeout: float) -> list:
+        """Wartet höchstens timeout Sekunden auf Momentaufnahmen, die neuer als version sind.
+
+        :return: Liste [(Gerät, (Version, Zeitpunkt, JSON als bytes))], leer falls nichts Neues kam
+        """
+        with self.bedingung:
+            self.bedingung.wait_for(lambda: self.version > version, timeout)
+            return sorted(((geraet, eintrag) for geraet, eintrag in self.daten.items() if eintrag[0] > version),
+                          key=lambda neu: neu[1][0])
+
+
+def geraet_abfragen(geraet: str, url: str, momentaufnahmen: Momentaufnahmen, takt: ZyklusTakt, konf: dict):
+    """Fragt ein Gerät im Takt ab, bis der Takt gestoppt wird. Jedes Gerät hat einen eigenen Thread, ein langsames
+    Gerät verzögert also die Daten des anderen nicht. Nach Fehlern in Folge pausiert der Schutzschalter die Abfragen."""
+    transport = transport_holen(konf)
+    schutzschalter = schutzschalter_holen(geraet)
+    while True:
+        if schutzschalter.abruf_erlaubt():
+            try:
+                antwort = transport.get(url, timeout=konf['verteiler']['intervall_s'],
+                                        verbindung_timeout=konf['verbindung_timeout_s'])
+                daten = antwort.json() if antwort.status_code == 200 else None
+            except Exception as abfrage_err:
+                schutzschalter.fehler(konf)
+                log_event(f'{geraet} Verbindungsfehler, Details: {abfrage_err}', konf)
+            else:
+                if antwort.status_code == 200:
+                    schutzschalter.erfolg(daten)
+                    momentaufnahmen.setzen(geraet, daten)
+                else:
+                    schutzschalter.fehler(konf)
+                    log_event(f'{geraet} HTTP Fehler Status {antwort.status_code}', konf)
+        if not takt.warten():
+            break
+
+
+def verteiler_server_starten(momentaufnahmen: Momentaufnahmen, konf: dict):
+    """Startet die HTTP-Schnittstellen in einem Hintergrund-Thread, je Anfrage ein eigener Thread.
+
+    :return: ThreadingHTTPServer-Objekt
+    """
+    verteiler = konf['verteiler']
+    goe_mqtt_url = 'http://' + verteiler['goe_adresse'] + '/mqtt?'
+
+    class VerteilerHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive wie bei den Geräten, Hauptprogramm.py hält die Verbindung offen
+        disable_nagle_algorithm = True  # Kopf und Daten werden getrennt geschrieben, ohne TCP_NODELAY je 40 ms Verzug
+
+        def antworten(self, status_code: int, daten: bytes, kopfzeilen: dict = None):
+            self.send_response(status_code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(daten)))
+            for name, wert in (kopfzeilen or {}).items():
+                self.send_header(name, wert)
+            self.end_headers()
+            self.wfile.write(daten)
+
+        def do_GET(self):
+            pfad = urlsplit(self.path)
+            if pfad.path in PFADE:
+                eintrag = momentaufnahmen.holen(PFADE[pfad.path])
+                alter = time.monotonic() - eintrag[1] if eintrag else None
+                if eintrag is None or alter > verteiler['max_alter_s']:
+                    self.send_error(503, f'Keine aktuellen Daten von {PFADE[pfad.path]}')
+                    return
+                self.antworten(200, eintrag[2], {'Age': str(int(alter)), 'Cache-Control': 'no-cache'})
+            elif pfad.path == '/mqtt':
+                self.mqtt_weiterreichen(pfad.query)
+            elif pfad.path == '/events':
+                self.ereignisse_senden()
+            else:
+                self.send_error(404)
+
+        def mqtt_weiterreichen(self, abfrage: str):
+            """Reicht den Befehl an den Go-eCharger weiter. Dessen Antwort enthält den vollständigen neuen Status,
+            sie ersetzt daher sofort die Momentaufnahme, statt auf die nächste Abfrage zu warten."""
+            try:
+                antwort = transport_holen(konf).get(goe_mqtt_url + abfrage, timeout=verteiler['intervall_s'],
+                                                    verbindung_timeout=konf['verbindung_timeout_s'])
+            except Exception as mqtt_err:
+                log_event(f'Go-E Verbindungsfehler beim Weiterreichen von /mqtt, Details: {mqtt_err}', konf)
+                self.send_error(504, 'Go-E nicht erreichbar')
+                return
+            if antwort.status_code == 200:
+                try:
+                    momentaufnahmen.setzen('Go-E', antwort.json())
+                except ValueError:
+                    pass  # Der Aufrufer bekommt die Antwort trotzdem unverändert und prüft sie selbst
+            self.antworten(antwort.status_code, antwort.content)
+
+        def ereignisse_senden(self):
+            """Server-Sent Events: zuerst die vorhandenen Momentaufnahmen, danach jede neue, bis der Abnehmer die
+            Verbindung schließt."""
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')  # Der Strom hat keine Länge, endet also mit der Verbindung
+            self.end_headers()
+            self.close_connection = True
+            version = 0
+            try:
+                while True:
+                    neu = momentaufnahmen.warten(version, KEEPALIVE_S)
+                    if not neu:
+                        self.wfile.write(b': keepalive\n\n')
+                    for geraet, (version, _, daten) in neu:
+                        self.wfile.write(b'id: %d\nevent: %s\ndata: %s\n\n' % (version, EREIGNISSE[geraet], daten))
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # Abnehmer hat sich abgemeldet
+
+        def log_message(self, format, *args):
+            pass  # Keine Zeile je Abfrage auf der Konsole
+
+    server = http.server.ThreadingHTTPServer((verteiler['adresse'], verteiler['port']), VerteilerHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='Verteiler', daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gerätedaten einmal abfragen und an alle Programme verteilen')
+    parser.add_argument('--konfiguration', default='config.toml', help='Konfigurationsdatei, Standard config.toml')
+    argumente = parser.parse_args()
+
+    try:
+        with open(argumente.konfiguration, 'rb') as konfiguration_datei:
+            konf = tomli.load(konfiguration_datei)
+    except tomli.TOMLDecodeError as toml_err:
+        print(f'Fehler beim Einlesen der Konfigurationsdatei <{argumente.konfiguration}>: {toml_err}')
+        sys.exit(1)
+    konfigurationswerte_pruefen(konf)
+    verteiler_pruefen(konf)
+    if konf['logging_events']:
+        os.makedirs('logs', exist_ok=True)
+
+    momentaufnahmen = Momentaufnahmen()
+    abfragen = {'Go-E': 'http://' + konf['verteiler']['goe_adresse'] + '/status',
+                'SB': 'http://' + konf['verteiler']['sb_adresse'] + '/api/v2/status'}
+    takte = {geraet: ZyklusTakt(konf['verteiler']['intervall_s']) for geraet in abfragen}
+    threads = [threading.Thread(target=geraet_abfragen, name=f'Abfrage {geraet}',
+                                args=(geraet, url, momentaufnahmen, takte[geraet], konf))
+               for geraet, url in abfragen.items()]
+    server = verteiler_server_starten(momentaufnahmen, konf)
+
+    def beenden(signalnummer=None, rahmen=None):
+        """Signal-Handler für Strg+C (SIGINT) und SIGTERM: stoppt die Abfrage-Threads."""
+        for takt in takte.values():
+            takt.stoppen()
+
+    signal.signal(signal.SIGINT, beenden)
+    signal.signal(signal.SIGTERM, beenden)
+
+    print('Statusverteiler:')
+    for geraet, url in abfragen.items():
+        print(f'    {geraet} wird alle {konf["verteiler"]["intervall_s"]} s abgefragt: <{url}>')
+    print(f'    Verteilt auf <http://{konf["verteiler"]["adresse"]}:{konf["verteiler"]["port"]}>, '
+          f'Server-Sent Events unter /events')
+    print('Zum Beenden des Programms Strg + C drücken.')
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        while thread.is_alive():
+            thread.join(1)  # Mit Timeout, damit die Signal-Handler auch unter Windows zum Zug kommen
+
+    server.shutdown()
+    server.server_close()
+    transport_holen(konf).schliessen()
+    log_event('Der Statusverteiler wurde beendet.', konf)
+    if konf['logging_events']:
+        log_schreiber_holen(konf).beenden()
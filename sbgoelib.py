@@ -34,299 +34,3195 @@ def konfigurationswerte_pruefen(konf: dict):
         raise TypeError('Fehler:  simulieren hat ungültigen Wert!')
     if not isinstance(konf['zoe_modus'], bool):
         raise TypeError('Fehler:  zoe_modus hat ungültigen Wert!')
+    if not isinstance(konf['countdown'], bool):
+        raise TypeError('Fehler:  countdown hat ungültigen Wert!')
+    if not isinstance(konf['ladekurve_glaettung'], (int, float)) or not 0 < konf['ladekurve_glaettung'] <= 1:
+        raise ValueError('Fehler:  ladekurve_glaettung hat ungültigen Wert!')
+    if not isinstance(konf['ladekurve_speichern_s'], (int, float)) or konf['ladekurve_speichern_s'] <= 0:
+        raise ValueError('Fehler:  ladekurve_speichern_s hat ungültigen Wert!')
+    if not isinstance(konf['fahrzeug_profil'], str) or not konf['fahrzeug_profil'] \
+            or not all(zeichen.isalnum() or zeichen in '-_' for zeichen in konf['fahrzeug_profil']):
+        raise ValueError('Fehler:  fahrzeug_profil hat ungültigen Wert!')
+    if not isinstance(konf['metriken_port'], int) or not 0 <= konf['metriken_port'] <= 65535:
+        raise ValueError('Fehler:  metriken_port hat ungültigen Wert!')
+    if not isinstance(konf['metriken_adresse'], str):
+        raise TypeError('Fehler:  metriken_adresse hat ungültigen Wert!')
+    if konf['transport'] not in TRANSPORTE:
+        raise ValueError('Fehler:  transport hat ungültigen Wert!')
+    for log_wert in ('log_warteschlange_max', 'log_flush_zeilen'):
+        if not isinstance(konf[log_wert], int):
+            raise TypeError(f'Fehler:  {log_wert} hat ungültigen Wert!')
+        if konf[log_wert] < 1:
+            raise ValueError(f'Fehler:  {log_wert} hat ungültigen Wert!')
+    if not isinstance(konf['log_nur_aenderungen'], bool):
+        raise TypeError('Fehler:  log_nur_aenderungen hat ungültigen Wert!')
+    for log_wert in ('log_totband', 'log_keyframe_s'):
+        if not isinstance(konf[log_wert], (int, float)):
+            raise TypeError(f'Fehler:  {log_wert} hat ungültigen Wert!')
+        if konf[log_wert] < 0:
+            raise ValueError(f'Fehler:  {log_wert} hat ungültigen Wert!')
+    if konf['log_format'] not in ('csv', 'binaer'):
+        raise ValueError('Fehler:  log_format hat ungültigen Wert!')
+    if not isinstance(konf['log_flush_s'], (int, float)):
+        raise TypeError('Fehler:  log_flush_s hat ungültigen Wert!')
+    if konf['log_flush_s'] <= 0:
+        raise ValueError('Fehler:  log_flush_s hat ungültigen Wert!')
+    if not isinstance(konf['log_komprimieren'], bool):
+        raise TypeError('Fehler:  log_komprimieren hat ungültigen Wert!')
+    for log_wert in ('log_aufbewahren_tage', 'log_max_mb'):
+        if not isinstance(konf[log_wert], (int, float)):
+            raise TypeError(f'Fehler:  {log_wert} hat ungültigen Wert!')
+        if konf[log_wert] < 0:
+            raise ValueError(f'Fehler:  {log_wert} hat ungültigen Wert!')
+    if not isinstance(konf['zustand_datei'], str) or not konf['zustand_datei']:
+        raise ValueError('Fehler:  zustand_datei hat ungültigen Wert!')
+    for zustand_wert in ('zustand_speichern_s', 'zustand_max_alter_s'):
+        if not isinstance(konf[zustand_wert], (int, float)):
+            raise TypeError(f'Fehler:  {zustand_wert} hat ungültigen Wert!')
+        if konf[zustand_wert] <= 0:
+            raise ValueError(f'Fehler:  {zustand_wert} hat ungültigen Wert!')
+    for schutz_wert in ('verbindung_timeout_s', 'schutzschalter_pause_s', 'schutzschalter_pause_max_s'):
+        if not isinstance(konf[schutz_wert], (int, float)):
+            raise TypeError(f'Fehler:  {schutz_wert} hat ungültigen Wert!')
+        if konf[schutz_wert] <= 0:
+            raise ValueError(f'Fehler:  {schutz_wert} hat ungültigen Wert!')
+    if not isinstance(konf['schutzschalter_fehler'], int) or konf['schutzschalter_fehler'] < 1:
+        raise ValueError('Fehler:  schutzschalter_fehler hat ungültigen Wert!')
+    if not isinstance(konf['daten_max_alter_s'], (int, float)) or konf['daten_max_alter_s'] < 0:
+        raise ValueError('Fehler:  daten_max_alter_s hat ungültigen Wert!')
+    for prognose_wert in ('prognose_zeitkonstante_s', 'prognose_horizont_s', 'prognose_totband_w'):
+        if not isinstance(konf[prognose_wert], (int, float)):
+            raise TypeError(f'Fehler:  {prognose_wert} hat ungültigen Wert!')
+        if konf[prognose_wert] < 0:
+            raise ValueError(f'Fehler:  {prognose_wert} hat ungültigen Wert!')
+    for abfrage_wert in ('abfrage_min_s', 'abfrage_max_s', 'abfrage_schwelle_w'):
+        if not isinstance(konf[abfrage_wert], (int, float)):
+            raise TypeError(f'Fehler:  {abfrage_wert} hat ungültigen Wert!')
+    if not 0 < konf['abfrage_min_s'] <= konf['wartezeit'] <= konf['abfrage_max_s']:
+        raise ValueError('Fehler:  abfrage_min_s, wartezeit und abfrage_max_s passen nicht zusammen!')
+    if konf['abfrage_schwelle_w'] < 0:
+        raise ValueError('Fehler:  abfrage_schwelle_w hat ungültigen Wert!')
 
 
-def daten_holen(objekt_name: str, objekt: dict, url: str, konf: dict):
+# Konfigurationswerte, die erst nach einem Neustart wirksam werden (laufender Server, Transport und Log-Threads)
+KONFIGURATION_NUR_NEUSTART = ('transport', 'metriken_port', 'metriken_adresse', 'log_format', 'log_warteschlange_max',
+                              'log_flush_zeilen', 'log_flush_s', 'log_komprimieren', 'log_aufbewahren_tage',
+                              'log_max_mb', 'zustand_datei')
+
+
+class KonfigurationBeobachter:
+    """Lädt die Konfigurationsdatei im laufenden Betrieb neu, sobald sich ihre Änderungszeit ändert oder ein Neuladen
+    angefordert wurde (z.B. über SIGHUP). Die neue Konfiguration ersetzt die alte nur, wenn sie sich fehlerfrei einlesen
+    lässt und konfigurationswerte_pruefen besteht.
+    """
+
+    def __init__(self, dateiname: str):
+        self.dateiname = dateiname
+        self.mtime = self._mtime()
+        self.angefordert = False
+
+    def _mtime(self):
+        import os
+
+        try:
+            return os.stat(self.dateiname).st_mtime_ns
+        except OSError:
+            return None
+
+    def anfordern(self, signalnummer=None, rahmen=None):
+        """Fordert das Neuladen beim nächsten pruefen() an. Dient auch als Signal-Handler für SIGHUP."""
+        self.angefordert = True
+
+    def pruefen(self, konf: dict):
+        """Prüft einmal je Zyklus, ob neu geladen werden muss. Kostet ohne Änderung nur ein os.stat.
+
+        :param konf: dict-Objekt mit der aktuellen Konfiguration
+        :return: dict-Objekt mit der neuen Konfiguration, None falls unverändert oder ungültig
+        """
+        import tomli
+
+        mtime = self._mtime()
+        if mtime == self.mtime and not self.angefordert:
+            return None
+        self.mtime = mtime
+        self.angefordert = False
+
+        try:
+            with open(self.dateiname, 'rb') as konfiguration_datei:
+                konf_neu = tomli.load(konfiguration_datei)
+            konfigurationswerte_pruefen(konf_neu)
+        except (OSError, tomli.TOMLDecodeError, KeyError, TypeError, ValueError) as konf_err:
+            log_event(f'Fehler beim Neuladen der Konfigurationsdatei <{self.dateiname}>, die bisherige Konfiguration '
+                      f'bleibt aktiv: {konf_err!r}', konf)
+            return None
+
+        for schluessel in KONFIGURATION_NUR_NEUSTART:
+            if konf_neu.get(schluessel) != konf.get(schluessel):
+                log_event(f'Konfigurationswert {schluessel} wird erst nach einem Neustart übernommen.', konf)
+                konf_neu[schluessel] = konf[schluessel]
+        geaendert = sorted(schluessel for schluessel in konf_neu.keys() | konf.keys()
+                           if konf_neu.get(schluessel) != konf.get(schluessel))
+        if not geaendert:
+            return None
+        log_event(f'Konfiguration wurde neu geladen, geänderte Werte: {", ".join(geaendert)}', konf_neu)
+        return konf_neu
+
+
+def zustand_speichern(dateiname: str, zustand: dict):
+    """Sichert den Zustand der Hauptschleife atomar als JSON-Datei (erst temporäre Datei, dann umbenennen), damit ein
+    Neustart dort weitermachen kann.
+
+    :param dateiname: Name der Zustandsdatei
+    :param zustand: dict-Objekt mit JSON-fähigen Werten
+    """
+    import json
+    import os
+    import time
+
+    with open(dateiname + '.tmp', 'w') as datei:
+        json.dump({'version': 1, 'zeit': time.time()} | zustand, datei)
+    os.replace(dateiname + '.tmp', dateiname)
+
+
+def zustand_laden(dateiname: str, max_alter_s: float) -> dict:
+    """Lädt einen mit zustand_speichern gesicherten Zustand.
+
+    :param dateiname: Name der Zustandsdatei
+    :param max_alter_s: Ältere Zustände werden verworfen
+    :return: dict-Objekt mit dem Zustand inkl. 'zeit', leeres dict falls es keinen (aktuellen) Zustand gibt
+    """
+    import json
+    import os
+    import time
+
+    if not os.path.isfile(dateiname):
+        return {}
+    with open(dateiname) as datei:
+        zustand = json.load(datei)
+    if zustand.get('version') != 1:
+        raise ValueError(f'Unbekannte Version des Zustands <{dateiname}>')
+    if time.time() - zustand['zeit'] > max_alter_s:
+        return {}
+    return zustand
+
+
+class HttpAntwort:
+    """Schlanke HTTP-Antwort des http.client-Transports mit derselben Schnittstelle wie requests.Response, soweit sie
+    in diesem Projekt genutzt wird (status_code, content und json())."""
+    __slots__ = ('status_code', 'inhalt')
+
+    def __init__(self, status_code: int, inhalt: bytes):
+        self.status_code = status_code
+        self.inhalt = inhalt
+
+    @property
+    def content(self) -> bytes:
+        """Unveränderter Inhalt der Antwort, wie requests.Response.content"""
+        return self.inhalt
+
+    def json(self):
+        import json
+
+        return json.loads(self.inhalt)
+
+
+class TransportHttpClient:
+    """HTTP-Transport auf Basis von http.client aus der Standardbibliothek. Hält je Gerät (Host und Port) eine
+    dauerhafte keep-alive-Verbindung offen, requests muss dafür nicht importiert werden."""
+
+    def __init__(self):
+        import threading
+
+        self.verbindungen = {}  # (host, port) → [Lock, HTTPConnection]
+        self.verbindungen_lock = threading.Lock()
+
+    def get(self, url: str, timeout: float, verbindung_timeout: float = None):
+        """Schickt einen GET-Request über die Verbindung des Geräts und baut sie bei Bedarf (neu) auf.
+
+        :param url: Vollständige URL inkl. http://
+        :param timeout: Timeout in Sekunden für die Antwort (und den Verbindungsaufbau, falls nicht extra angegeben)
+        :param verbindung_timeout: Kürzerer Timeout in Sekunden nur für den Verbindungsaufbau. Ein ausgeschaltetes
+            Gerät fällt so schnell auf, ein langsam antwortendes bekommt trotzdem die volle Zeit.
+        :return: HttpAntwort-Objekt
+        """
+        import http.client
+        import socket
+        import threading
+        from urllib.parse import urlsplit
+
+        url_teile = urlsplit(url)
+        if url_teile.scheme != 'http':
+            raise ValueError(f'Nicht unterstütztes Protokoll in <{url}>, nur http ist möglich')
+        schluessel = (url_teile.hostname, url_teile.port or 80)
+        pfad = url_teile.path or '/'
+        if url_teile.query:
+            pfad += '?' + url_teile.query
+
+        with self.verbindungen_lock:
+            if schluessel not in self.verbindungen:
+                self.verbindungen[schluessel] = [threading.Lock(), None]
+            eintrag = self.verbindungen[schluessel]
+
+        with eintrag[0]:
+            for versuch in range(2):
+                wiederverwendet = eintrag[1] is not None
+                if not wiederverwendet:
+                    eintrag[1] = http.client.HTTPConnection(*schluessel, timeout=timeout)
+                verbindung = eintrag[1]
+                verbindung.timeout = min(timeout, verbindung_timeout or timeout)
+                try:
+                    if verbindung.sock is None:
+                        verbindung.connect()
+                        verbindung.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    verbindung.sock.settimeout(timeout)
+                except Exception:
+                    verbindung.close()
+                    eintrag[1] = None
+                    raise
+                try:
+                    verbindung.request('GET', pfad, headers={'Connection': 'keep-alive'})
+                    antwort = verbindung.getresponse()
+                    return HttpAntwort(antwort.status, antwort.read())
+                except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                    verbindung.close()
+                    eintrag[1] = None
+                    if not wiederverwendet or versuch:  # Nur eine vom Gerät geschlossene keep-alive-Verbindung
+                        raise                           # wird einmal neu aufgebaut
+                except Exception:
+                    verbindung.close()
+                    eintrag[1] = None
+                    raise
+
+    def schliessen(self):
+        """Schließt alle offenen Verbindungen."""
+        with self.verbindungen_lock:
+            for eintrag in self.verbindungen.values():
+                if eintrag[1] is not None:
+                    eintrag[1].close()
+                    eintrag[1] = None
+
+
+class TransportRequests:
+    """HTTP-Transport auf Basis von requests. Eine requests.Session hält die Verbindungen zu den Geräten offen."""
+
+    def __init__(self):
+        import requests
+
+        self.session = requests.Session()
+
+    def get(self, url: str, timeout: float, verbindung_timeout: float = None):
+        """Schickt einen GET-Request über die gemeinsame Session.
+
+        :param url: Vollständige URL inkl. http://
+        :param timeout: Timeout in Sekunden für die Antwort (und den Verbindungsaufbau, falls nicht extra angegeben)
+        :param verbindung_timeout: Kürzerer Timeout in Sekunden nur für den Verbindungsaufbau
+        :return: requests.Response-Objekt
+        """
+        return self.session.get(url, timeout=(min(timeout, verbindung_timeout or timeout), timeout))
+
+    def schliessen(self):
+        """Schließt alle offenen Verbindungen."""
+        self.session.close()
+
+
+TRANSPORTE = {'requests': TransportRequests, 'http.client': TransportHttpClient}
+_transport_aktiv = {}  # Bereits erstellte Transporte je Backend, damit die Verbindungen erhalten bleiben
+
+
+def transport_holen(konf: dict):
+    """Gibt den in konf['transport'] gewählten HTTP-Transport zurück. Er wird beim ersten Aufruf erstellt und danach
+    wiederverwendet, damit die keep-alive-Verbindungen zu den Geräten über alle Zyklen bestehen bleiben.
+
+    :param konf: dict-Objekt mit der aktuellen Konfiguration
+    :return: Transport-Objekt mit den Methoden get(url, timeout) und schliessen()
+    """
+    if konf['transport'] not in _transport_aktiv:
+        _transport_aktiv[konf['transport']] = TRANSPORTE[konf['transport']]()
+    return _transport_aktiv[konf['transport']]
+
+
+class Schutzschalter:
+    """Schutzschalter (Circuit Breaker) für die Abrufe eines Geräts. Nach konf['schutzschalter_fehler'] Fehlern in
+    Folge ist er offen: das Gerät wird nicht mehr jeden Zyklus abgefragt, sondern erst nach einer Pause, die sich mit
+    jedem weiteren Fehler bis konf['schutzschalter_pause_max_s'] verdoppelt. Nach der Pause ist er halboffen und lässt
+    genau einen Probe-Abruf durch, der ihn wieder schließt oder für die nächste Pause öffnet. Außerdem merkt er sich
+    die letzten gültigen Daten des Geräts.
+    """
+
+    def __init__(self, objekt_name: str):
+        import threading
+
+        self.objekt_name = objekt_name
+        self.fehler_folge = 0
+        self.offen_bis = None  # time.monotonic(), ab dem wieder probiert wird, None = geschlossen
+        self.laeuft = False  # Ein Abruf ist unterwegs, ein weiterer würde sich nur hinter ihm anstellen
+        self.letzte_daten = None
+        self.letzte_daten_zeit = 0.0  # time.monotonic() der letzten gültigen Daten
+        self.lock = threading.Lock()
+
+    def abruf_erlaubt(self) -> bool:
+        """Prüft, ob jetzt ein Abruf stattfinden darf, und vermerkt ihn gegebenenfalls als laufend.
+
+        :return: Bool-Wert False, solange der Schalter offen ist oder noch ein Abruf läuft
+        """
+        import time
+
+        with self.lock:
+            if self.laeuft or (self.offen_bis is not None and time.monotonic() < self.offen_bis):
+                return False
+            self.laeuft = True
+            return True
+
+    def erfolg(self, daten):
+        """Vermerkt einen erfolgreichen Abruf mit seinen Daten, der Schalter schließt."""
+        import time
+
+        with self.lock:
+            if self.offen_bis is not None:
+                print(f'    {self.objekt_name} antwortet wieder.')
+            self.fehler_folge = 0
+            self.offen_bis = None
+            self.laeuft = False
+            self.letzte_daten = daten
+            self.letzte_daten_zeit = time.monotonic()
+
+    def fehler(self, konf: dict):
+        """Vermerkt einen fehlgeschlagenen Abruf. Ab konf['schutzschalter_fehler'] Fehlern in Folge öffnet der
+        Schalter für eine exponentiell wachsende Pause mit Zufallsanteil, damit mehrere Programme ein wieder
+        erreichbares Gerät nicht alle im selben Moment abfragen."""
+        import random
+        import time
+
+        with self.lock:
+            self.fehler_folge += 1
+            self.laeuft = False
+            if self.fehler_folge >= konf['schutzschalter_fehler']:
+                pause = min(konf['schutzschalter_pause_s'] * 2 ** (self.fehler_folge - konf['schutzschalter_fehler']),
+                            konf['schutzschalter_pause_max_s'])
+                pause *= random.uniform(0.5, 1)
+                self.offen_bis = time.monotonic() + pause
+                print(f'    {self.objekt_name} antwortet nicht, nächster Versuch in {pause:.0f} s.')
+                metriken_holen().zaehlen('sbgoe_schutzschalter_offen_total', geraet=self.objekt_name)
+
+    def offen(self) -> bool:
+        """:return: Bool-Wert True, solange das Gerät nach Fehlern pausiert wird"""
+        import time
+
+        with self.lock:
+            return self.offen_bis is not None and time.monotonic() < self.offen_bis
+
+    def pausieren(self, sekunden: float):
+        """Öffnet den Schalter für die angegebene Zeit, z.B. während eines Neustarts des Geräts. Die letzten Daten
+        gelten danach nicht mehr."""
+        import time
+
+        with self.lock:
+            self.offen_bis = time.monotonic() + sekunden
+            self.letzte_daten = None
+
+    def letzte_daten_holen(self, max_alter_s: float):
+        """:return: Die letzten gültigen Daten, falls sie höchstens max_alter_s Sekunden alt sind, sonst None"""
+        import time
+
+        with self.lock:
+            if self.letzte_daten is None or time.monotonic() - self.letzte_daten_zeit > max_alter_s:
+                return None
+            return self.letzte_daten
+
+
+_schutzschalter_aktiv = {}  # Schutzschalter je Gerät, über alle Zyklen
+
+
+def schutzschalter_holen(objekt_name: str) -> Schutzschalter:
+    """Gibt den Schutzschalter des Geräts zurück, beim ersten Aufruf wird er erstellt.
+
+    :param objekt_name: Entweder "Go-E" oder "SB"
+    """
+    if objekt_name not in _schutzschalter_aktiv:
+        _schutzschalter_aktiv[objekt_name] = Schutzschalter(objekt_name)
+    return _schutzschalter_aktiv[objekt_name]
+
+
+class GeraeteStatus:
+    """Kompakter Status eines Geräts aus daten_holen. Nur die Felder aus FELDER, die die Regelung braucht, werden beim
+    Einlesen einmal umgewandelt und als Attribute gehalten (z.B. goe_status.amp als int statt '7'). Die kompletten
+    JSON-Daten bleiben in rohdaten nur erhalten, wenn sie geloggt werden (konf['logging_nrg']). neu_abfragen markiert
+    einen Status, in den eine Schreib-Antwort übernommen wurde: daten_holen fragt ihn beim nächsten Mal sicher ab.
+    """
+
+    FELDER = {}  # Feldname der API → Umwandlung, je Gerät in der Unterklasse
+    META = ('objekt', 'status_code', 'zeitstempel', 'abrufdauer')
+    __slots__ = META + ('rohdaten', 'neu_abfragen')
+
+    def __init__(self, objekt: str, zeitstempel: float, abrufdauer: float = 0.0, status_code: int = None):
+        """
+        :param objekt: Name des Geräts, z.B. "Go-E" oder "SB"
+        :param zeitstempel: time.time() des Abrufs
+        :param abrufdauer: Dauer des Abrufs in Sekunden
+        :param status_code: HTTP-Status der Antwort, None solange es keine gültigen Daten gibt
+        """
+        self.objekt = objekt
+        self.status_code = status_code
+        self.zeitstempel = zeitstempel
+        self.abrufdauer = abrufdauer
+        self.rohdaten = None
+        self.neu_abfragen = False
+        for feld in self.FELDER:
+            setattr(self, feld, None)
+
+    @property
+    def gueltig(self) -> bool:
+        """:return: Bool-Wert True, falls das Objekt Daten vom Gerät enthält"""
+        return self.status_code is not None
+
+    def uebernehmen(self, daten: dict, rohdaten_behalten: bool = False):
+        """Übernimmt die Felder aus FELDER umgewandelt aus JSON-Daten des Geräts. Fehlende Felder bleiben unverändert.
+
+        :param daten: dict-Objekt aus den JSON-Daten
+        :param rohdaten_behalten: Die kompletten JSON-Daten für das Logging behalten
+        :return: self
+        """
+        for feld, umwandeln in self.FELDER.items():
+            if feld in daten:
+                setattr(self, feld, umwandeln(daten[feld]))
+        self.rohdaten = daten if rohdaten_behalten else None
+        return self
+
+    @classmethod
+    def aus_dict(cls, daten: dict, rohdaten_behalten: bool = False):
+        """Gegenstück zu als_dict, z.B. für die Zustandsdatei oder eine Zeile aus den Energielogs."""
+        status = cls(daten['objekt'], daten['zeitstempel'], daten.get('abrufdauer', 0.0), daten.get('status_code'))
+        return status.uebernehmen({feld: wert for feld, wert in daten.items() if feld not in cls.META},
+                                  rohdaten_behalten)
+
+    def als_dict(self) -> dict:
+        """:return: dict-Objekt aus Metainformationen und JSON-Daten wie vom Gerät für Logging und Zustandsdatei, ohne
+            rohdaten nur mit den Feldern aus FELDER"""
+        daten = {'objekt': self.objekt}
+        if self.gueltig:
+            daten['status_code'] = self.status_code
+        daten |= {'zeitstempel': self.zeitstempel, 'abrufdauer': self.abrufdauer}
+        if self.rohdaten is not None:
+            return daten | self.rohdaten
+        return daten | {feld: getattr(self, feld) for feld in self.FELDER}
+
+
+class GoEStatus(GeraeteStatus):
+    """Status des Go-eChargers (API v1 /status). Die API liefert fast alle Werte als String, hier sind sie int."""
+
+    FELDER = {'nrg': list, 'amp': int, 'car': int, 'alw': int, 'err': int, 'stp': int, 'cbl': int, 'loe': int,
+              'loa': int, 'rbc': int, 'dws': int, 'dwo': int}
+    __slots__ = tuple(FELDER)
+
+
+class SBStatus(GeraeteStatus):
+    """Status der SonnenBatterie (JSON API v2 /api/v2/status)."""
+
+    FELDER = {'Production_W': int, 'Consumption_W': int, 'GridFeedIn_W': int, 'Pac_total_W': int, 'USOC': int,
+              'BatteryCharging': bool, 'BatteryDischarging': bool}
+    __slots__ = tuple(FELDER)
+
+
+def daten_holen(objekt_name: str, objekt: dict, url: str, konf: dict, timeout: float = None,
+                intervall: float = None):
     """Holt sich die JSON-Daten von der Hardware über das lokale Netzwerk.
 
     :param objekt_name: Entweder "Go-E" oder "SB"
-    :param objekt: dict-Objekt aus den JSON-Daten und Metainformationen, min. 'zeitstempel' muss initialisiert sein
+    :param objekt: Bisheriges GoEStatus- bzw. SBStatus-Objekt, min. zeitstempel muss initialisiert sein. Seine Klasse
+        bestimmt die Klasse der Rückgabe
     :param url: URL, von der die Funktion per GET die JSON-Daten holt. Wird im Programmkopf definiert.
     :param konf: dict-Objekt mit der aktuellen Konfiguration
-    :return: dict-Objekt aus den aktualisierten JSON-Daten falls erfolgreich, False falls nicht erfolgreich
+    :param timeout: Maximale Wartezeit auf die Antwort in Sekunden, Standard ist konf['wartezeit']
+    :param intervall: Mindestabstand zum letzten Abruf in Sekunden (siehe AbfragePlaner), Standard ist konf['wartezeit']
+    :return: Neues Objekt aus den aktualisierten JSON-Daten falls erfolgreich, Objekt ohne status_code falls nicht
+        erfolgreich, das unveränderte objekt falls der letzte Abruf noch zu jung ist. abrufdauer enthält die Dauer des
+        Abrufs in Sekunden.
     """
     import time
-    import requests
 
-    if time.time() >= objekt['zeitstempel'] + konf['wartezeit']:
+    if timeout is None:
+        timeout = konf['wartezeit']
+    if intervall is None:
+        intervall = konf['wartezeit']
+
+    # 10 % Toleranz, damit ein Abruf auf dem festen Zyklusraster nicht an der Dauer des letzten Abrufs scheitert
+    if objekt.neu_abfragen or time.time() >= objekt.zeitstempel + intervall * 0.9:
+        schutzschalter = schutzschalter_holen(objekt_name)
+        if not schutzschalter.abruf_erlaubt():  # Pause nach Fehlern oder der letzte Abruf hängt noch
+            print(f'    {objekt_name} wird in diesem Zyklus nicht abgefragt.')
+            return type(objekt)(objekt_name, time.time())
+        abruf_start = time.perf_counter()
         try:
-            print(f'    Hole aktuelle Daten von {objekt_name}...', end='', flush=True)
-            antwort = requests.get(url, timeout=konf['wartezeit'])
+            with spur_holen().spanne(f'Abruf {objekt_name}'):
+                antwort = transport_holen(konf).get(url, timeout=max(timeout, 0.1),
+                                                    verbindung_timeout=konf['verbindung_timeout_s'])
+                daten = antwort.json() if antwort.status_code == 200 else None
         except Exception as connect_err:
+            schutzschalter.fehler(konf)
             log_event(f'{objekt_name} Verbindungsfehler, Details: {connect_err}', konf)
+            metriken_holen().zaehlen('sbgoe_abruf_fehler_total', geraet=objekt_name)
+            return type(objekt)(objekt_name, time.time(), time.perf_counter() - abruf_start)
         else:
+            abrufdauer = time.perf_counter() - abruf_start
+            metriken_holen().beobachten('sbgoe_abrufdauer_sekunden', abrufdauer, geraet=objekt_name)
             if antwort.status_code == 200:
-                print('OK')
-                return {'objekt': objekt_name, 'status_code': antwort.status_code,
-                        'zeitstempel': time.time()} | antwort.json()
+                print(f'    Aktuelle Daten von {objekt_name} geholt in {abrufdauer:.2f} s.')
+                daten = type(objekt)(objekt_name, time.time(), abrufdauer,
+                                     antwort.status_code).uebernehmen(daten, konf['logging_nrg'])
+                schutzschalter.erfolg(daten)
+                return daten
             else:
+                schutzschalter.fehler(konf)
                 log_event(f'{objekt_name} HTTP Fehler Status {antwort.status_code}', konf)
-                return {'objekt': objekt_name, 'zeitstempel': time.time()}
+                metriken_holen().zaehlen('sbgoe_abruf_fehler_total', geraet=objekt_name)
+                return type(objekt)(objekt_name, time.time(), abrufdauer)
     else:
         return objekt
 
 
-def goe_ladeleistung_bestimmen(sb_status_i: dict, goe_status_i: dict, ladekurve: dict, konf: dict):
+def daten_holen_parallel(abfragen: dict, konf: dict, intervalle: dict = None):
+    """Holt die JSON-Daten mehrerer Geräte gleichzeitig. Alle Abrufe teilen sich eine gemeinsame Frist von
+    konf['wartezeit'] Sekunden, ein Zyklus dauert also so lange wie das langsamste Gerät und nicht wie die Summe, und
+    ein hängendes Gerät nie länger als die Frist.
+
+    Antwortet mindestens ein Gerät, bekommen die übrigen ihre letzten gültigen Daten, sofern diese höchstens
+    konf['daten_max_alter_s'] Sekunden alt sind. Ein kurzer Aussetzer eines Geräts unterbricht das Regeln so nicht.
+
+    :param abfragen: dict-Objekt {objekt_name: (objekt, url)} mit den Parametern für daten_holen je Gerät
+    :param konf: dict-Objekt mit der aktuellen Konfiguration
+    :param intervalle: Optionales dict-Objekt {objekt_name: Abruf-Intervall in s} aus AbfragePlaner.anpassen
+    :return: dict-Objekt {objekt_name: Rückgabe von daten_holen}. Geräte, die innerhalb der Frist nicht geantwortet
+        haben und keine ausreichend jungen Daten haben, bekommen ein Objekt ohne status_code.
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor, wait
+
+    frist = time.monotonic() + konf['wartezeit']
+    abruf_start = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=len(abfragen), thread_name_prefix='daten_holen')
+    auftraege = {objekt_name: pool.submit(daten_holen, objekt_name, objekt, url, konf, frist - time.monotonic(),
+                                          (intervalle or {}).get(objekt_name))
+                 for objekt_name, (objekt, url) in abfragen.items()}
+    wait(auftraege.values(), timeout=max(frist - time.monotonic(), 0))
+    pool.shutdown(wait=False, cancel_futures=True)  # Nicht auf hängende Abrufe warten
+
+    ergebnisse = {}
+    for objekt_name, auftrag in auftraege.items():
+        if auftrag.done() and not auftrag.cancelled():
+            ergebnisse[objekt_name] = auftrag.result()
+        else:
+            log_event(f'{objekt_name} hat nicht innerhalb von {konf["wartezeit"]} s geantwortet.', konf)
+            metriken_holen().zaehlen('sbgoe_abruf_fehler_total', geraet=objekt_name)
+            ergebnisse[objekt_name] = type(abfragen[objekt_name][0])(objekt_name, time.time(),
+                                                                     time.perf_counter() - abruf_start)
+
+    if any(ergebnis.gueltig for ergebnis in ergebnisse.values()):
+        for objekt_name, ergebnis in ergebnisse.items():
+            letzte_daten = None
+            if not ergebnis.gueltig:
+                letzte_daten = schutzschalter_holen(objekt_name).letzte_daten_holen(konf['daten_max_alter_s'])
+            if letzte_daten is not None:
+                log_event(f'{objekt_name} hat keine aktuellen Daten, nutze die vom '
+                          f'{time.strftime("%H:%M:%S", time.localtime(letzte_daten.zeitstempel))}.', konf)
+                metriken_holen().zaehlen('sbgoe_veraltete_daten_total', geraet=objekt_name)
+                ergebnisse[objekt_name] = letzte_daten
+    return ergebnisse
+
+
+LADEKURVE_MAX_A = 32  # Größter Ladestrom, den irgendein Go-eCharger kann
+
+
+class Ladekurve:
+    """Gelernte Ladekurve des Fahrzeugs: geglättete Ladeleistung in W je Ampere-Wert 0..LADEKURVE_MAX_A.
+
+    Die Werte liegen in einem nach Ampere sortierten array. Jeder neue Messpunkt wird exponentiell geglättet
+    eingerechnet. Ampere-Werte ohne Messung werden linear zwischen den bekannten Nachbarn interpoliert. Oberhalb des
+    höchsten bekannten Werts gilt die Kurve als unbekannt. Für die Suche nach dem höchsten Strom zu einer Leistung wird
+    eine monoton steigende Hülle der Kurve gebildet, auf der binär gesucht wird.
+    """
+
+    def __init__(self, startwerte: dict, glaettung: float):
+        """
+        :param startwerte: dict-Objekt {Ampere: Watt}, z.B. aus konf['ladekurve'], Schlüssel dürfen Strings sein
+        :param glaettung: Gewicht eines neuen Messpunkts, 0 < glaettung <= 1 (1 = nur der letzte Messpunkt zählt)
+        """
+        import array
+
+        self.glaettung = glaettung
+        self.watt = array.array('d', [float('nan')] * (LADEKURVE_MAX_A + 1))
+        self.watt[0] = 0.0  # Ohne Strom keine Leistung
+        for datenpunkt_a, datenpunkt_w in startwerte.items():
+            if 0 <= int(datenpunkt_a) <= LADEKURVE_MAX_A:
+                self.watt[int(datenpunkt_a)] = float(datenpunkt_w)
+        self._tabelle = None  # Zwischengespeicherte (interpolierte Kurve, monotone Hülle), neu nach jedem lernen()
+
+    def lernen(self, amp: int, watt: float):
+        """Rechnet einen gemessenen Datenpunkt geglättet in die Kurve ein.
+
+        :param amp: Eingestellter Ladestrom in A
+        :param watt: Gemessene Ladeleistung in W
+        """
+        import math
+
+        if not 0 <= amp <= LADEKURVE_MAX_A:
+            return
+        alt = self.watt[amp]
+        self.watt[amp] = watt if math.isnan(alt) else self.glaettung * watt + (1 - self.glaettung) * alt
+        self._tabelle = None
+
+    def _tabelle_berechnen(self):
+        """Interpolierte Kurve und monoton steigende Hülle (laufendes Maximum) berechnen."""
+        import math
+
+        bekannt = [amp for amp, watt in enumerate(self.watt) if not math.isnan(watt)]
+        kurve = list(self.watt)
+        for links, rechts in zip(bekannt, bekannt[1:]):
+            for amp in range(links + 1, rechts):
+                kurve[amp] = self.watt[links] + (self.watt[rechts] - self.watt[links]) * (amp - links) / (rechts - links)
+        huelle = []
+        laufend = float('nan')
+        for watt in kurve:  # Oberhalb des höchsten bekannten Werts bleibt die Hülle auf dessen Niveau
+            if not math.isnan(watt):
+                laufend = watt if math.isnan(laufend) else max(laufend, watt)
+            huelle.append(laufend)
+        self._tabelle = (kurve, huelle)
+
+    def wert(self, amp: int):
+        """Ladeleistung in W bei amp, interpoliert falls nötig.
+
+        :return: float oder None, falls amp außerhalb des bekannten Bereichs liegt
+        """
+        import math
+
+        if self._tabelle is None:
+            self._tabelle_berechnen()
+        if not 0 <= amp <= LADEKURVE_MAX_A or math.isnan(self._tabelle[0][amp]):
+            return None
+        return self._tabelle[0][amp]
+
+    def max_amp(self, watt: float) -> int:
+        """Höchster Ladestrom, dessen Ladeleistung laut Kurve höchstens watt beträgt (binäre Suche).
+
+        :return: Ampere-Wert, -1 falls selbst 0 A zu viel ist
+        """
+        import bisect
+
+        if self._tabelle is None:
+            self._tabelle_berechnen()
+        return bisect.bisect_right(self._tabelle[1], watt) - 1
+
+    def speichern(self, dateiname: str):
+        """Speichert die Kurve atomar als JSON-Datei (erst temporäre Datei, dann umbenennen)."""
+        import json
+        import math
+        import os
+
+        with open(dateiname + '.tmp', 'w') as datei:
+            json.dump({'version': 1, 'watt': {str(amp): watt for amp, watt in enumerate(self.watt)
+                                              if not math.isnan(watt)}}, datei, indent=1)
+        os.replace(dateiname + '.tmp', dateiname)
+
+    def laden(self, dateiname: str) -> bool:
+        """Lädt eine mit speichern() gesicherte Kurve, die Startwerte werden dabei ersetzt.
+
+        :return: Bool-Wert True falls geladen, False falls es die Datei nicht gibt
+        """
+        import array
+        import json
+        import os
+
+        if not os.path.isfile(dateiname):
+            return False
+        with open(dateiname) as datei:
+            gespeichert = json.load(datei)
+        if gespeichert.get('version') != 1:
+            raise ValueError(f'Unbekannte Version der Ladekurve <{dateiname}>')
+        self.watt = array.array('d', [float('nan')] * (LADEKURVE_MAX_A + 1))
+        for datenpunkt_a, datenpunkt_w in gespeichert['watt'].items():
+            if 0 <= int(datenpunkt_a) <= LADEKURVE_MAX_A:
+                self.watt[int(datenpunkt_a)] = float(datenpunkt_w)
+        self._tabelle = None
+        return True
+
+
+def ladekurve_lernen_erlaubt(goe_status_i: GoEStatus) -> bool:
+    """Nur solange das Fahrzeug tatsächlich lädt, passen eingestellter Strom und gemessene Leistung zusammen. Ohne
+    Fahrzeug, bei gesperrtem oder beendetem Laden sind beide entkoppelt und dürfen die Ladekurve nicht verändern.
+    """
+    return goe_status_i.car == 2 and goe_status_i.alw == 1 and goe_status_i.nrg[11] > 0
+
+
+def goe_ladeleistung_bestimmen(sb_status_i: SBStatus, goe_status_i: GoEStatus, ladekurve: Ladekurve, konf: dict,
+                               prognose=None):
     """Errechnet die aktuell maximal mögliche Ladeleistung anhand der gegebenen Bedingungen und der Ladekurve.
 
-    :param sb_status_i: dict-Objekt aus den JSON-Daten und Metainformationen der SonnenBatterie
-    :param goe_status_i: dict-Objekt aus den JSON-Daten und Metainformationen des Go-eChargers
-    :param ladekurve: dict-Objekt mit der aktuellen Ladekurve
+    :param sb_status_i: SBStatus-Objekt aus den JSON-Daten und Metainformationen der SonnenBatterie
+    :param goe_status_i: GoEStatus-Objekt aus den JSON-Daten und Metainformationen des Go-eChargers
+    :param ladekurve: Ladekurve-Objekt mit der aktuellen Ladekurve
     :param konf: dict-Objekt mit der aktuellen Konfiguration
+    :param prognose: UeberschussPrognose-Objekt, das die verfügbare Leistung glättet, oder None
     :return: dict-Objekt mit der errechneten Leistung in A und W
     """
-    import math
-
-    goe_leistung_w = goe_status_i['nrg'][11] * 10  # Go-E gibt die Leistung in Vielfachen von 10W aus
-    lade_soll_w = 0  # Initialisieren
-    goe_u = math.fsum(goe_status_i['nrg'][0:3]) / 3  # Durchschnitt über die Spannungen der drei Einzelphasen
+    import time
 
     print(f'Ladeleistung wird bestimmt im Modus {konf["laden_prio"]}: {konf["laden_prio_text"][konf["laden_prio"]]}.\n')
 
+    start = time.perf_counter()
+    lade_soll_w = ueberschuss_bestimmen(sb_status_i, goe_status_i.nrg[11] * 10, konf)
+    metriken = metriken_holen()
+    metriken.setzen('sbgoe_ueberschuss_watt', lade_soll_w)
+    if prognose is not None:
+        prognose_w = prognose.aktualisieren(sb_status_i.zeitstempel, lade_soll_w, konf)
+        if prognose_w != lade_soll_w:
+            print(f'Verfügbar: {lade_soll_w} W  ==>  Prognose: {prognose_w} W')
+        lade_soll_w = prognose_w
+        metriken.setzen('sbgoe_ueberschuss_prognose_watt', lade_soll_w)
+    ladeleistung = ladestrom_bestimmen(lade_soll_w, goe_status_i, ladekurve, konf)
+    metriken.beobachten('sbgoe_berechnung_sekunden', time.perf_counter() - start)
+    return ladeleistung
+
+
+def ueberschuss_bestimmen(sb_status_i: SBStatus, goe_leistung_w: float, konf: dict):
+    """Errechnet die im Lademodus konf['laden_prio'] für das Fahrzeug-Laden verfügbare Leistung in W.
+
+    :param sb_status_i: SBStatus-Objekt aus den JSON-Daten und Metainformationen der SonnenBatterie
+    :param goe_leistung_w: Aktuelle Ladeleistung aller Go-eCharger in W, sie steht zusätzlich zur Verfügung
+    :param konf: dict-Objekt mit der aktuellen Konfiguration
+    :return: Leistung in W, 99999 im Lademodus frei
+    """
+    lade_soll_w = 0  # Initialisieren
+
     if konf['laden_prio'] == 'Überschuss':  # Getestet
-        battery_status = sb_status_i['BatteryCharging'], sb_status_i['BatteryDischarging']
+        battery_status = sb_status_i.BatteryCharging, sb_status_i.BatteryDischarging
         if battery_status == (True, False):  # SonnenBatterie lädt, SB-Ladestrom muss beschützt werden
-            lade_soll_w = (sb_status_i["GridFeedIn_W"]  # Einspeiseleistung
+            lade_soll_w = (sb_status_i.GridFeedIn_W  # Einspeiseleistung
                            + goe_leistung_w  # Ladeleistung go-E addieren, weil sie zur Verfügung steht
-                           + sb_status_i['Pac_total_W']  # Ladeleistung SB, negativ beim Aufladen, daher +
+                           + sb_status_i.Pac_total_W  # Ladeleistung SB, negativ beim Aufladen, daher +
                            - konf['ladeleistung_puffer_W']  # Einspeisepuffer
                            )
         elif battery_status == (False, True):  # SonnenBatterie entlädt, in diesem Modus nicht erwünscht!
-            lade_soll_w = (sb_status_i["GridFeedIn_W"]  # Einspeiseleistung
+            lade_soll_w = (sb_status_i.GridFeedIn_W  # Einspeiseleistung
                            + goe_leistung_w  # Ladeleistung go-E addieren, weil sie zur Verfügung steht
-                           - sb_status_i['Pac_total_W']  # Entladeleistung SB, positiv beim Entladen, daher -
+                           - sb_status_i.Pac_total_W  # Entladeleistung SB, positiv beim Entladen, daher -
                            - konf['ladeleistung_puffer_W']  # Einspeisepuffer
                            )
         elif battery_status == (False, False):  # SonnenBatterie idle
-            lade_soll_w = (sb_status_i["GridFeedIn_W"]  # Einspeiseleistung
+            lade_soll_w = (sb_status_i.GridFeedIn_W  # Einspeiseleistung
                            + goe_leistung_w  # Ladeleistung go-E addieren, weil sie zur Verfügung steht
                            - konf['ladeleistung_puffer_W']  # Einspeisepuffer
                            )
     elif konf['laden_prio'] == 'PV':  # Getestet
-        lade_soll_w = (sb_status_i["Production_W"]  # Einspeiseleistung
-                       - sb_status_i["Consumption_W"]  # Verbrauch
+        lade_soll_w = (sb_status_i.Production_W  # Einspeiseleistung
+                       - sb_status_i.Consumption_W  # Verbrauch
                        + goe_leistung_w  # Ladeleistung go-E addieren, weil sie zur Verfügung steht
                        - konf['ladeleistung_puffer_W']  # Einspeisepuffer
                        )
-    elif konf['laden_prio'] == 'PV+':  # Ungetestet
-        if sb_status_i['USOC'] > konf['min_batterie_soc']:
-            lade_soll_w = (sb_status_i['Production_W']  # PV-Leistung
-                           - sb_status_i['Consumption_W']  # Haus-Verbrauch inkl. go-E Ladeleistung
+    elif konf['laden_prio'] == 'PV+SB':  # Ungetestet
+        if sb_status_i.USOC > konf['min_batterie_soc']:
+            lade_soll_w = (sb_status_i.Production_W  # PV-Leistung
+                           - sb_status_i.Consumption_W  # Haus-Verbrauch inkl. go-E Ladeleistung
                            + goe_leistung_w  # Ladeleistung go-E addieren, weil sie zur Verfügung steht
                            + konf['sb_max_w']  # Maximale Entladeleistung SB
                            - konf['ladeleistung_puffer_W']  # Einspeisepuffer
                            )
         else:
-            lade_soll_w = (sb_status_i['Production_W']  # PV-Leistung
-                           - sb_status_i['Consumption_W']  # Haus-Verbrauch inkl. go-E Ladeleistung
+            lade_soll_w = (sb_status_i.Production_W  # PV-Leistung
+                           - sb_status_i.Consumption_W  # Haus-Verbrauch inkl. go-E Ladeleistung
                            + goe_leistung_w  # Ladeleistung go-E addieren, weil sie zur Verfügung steht
                            - konf['ladeleistung_puffer_W']  # Einspeisepuffer
                            )
     elif konf['laden_prio'] == 'frei':  # Ungetestet
         lade_soll_w = 99999  # Symbolischer Wert
 
+    return lade_soll_w
+
+
+class UeberschussPrognose:
+    """Kurzfrist-Prognose der verfügbaren Leistung aus ueberschuss_bestimmen, damit die Ladestrom-Vorgabe bei
+    durchziehenden Wolken nicht jeden Zyklus hin und her springt und jedes Mal an den Go-eCharger geschrieben wird.
+
+    Die verfügbare Leistung wird mit der Zeitkonstante konf['prognose_zeitkonstante_s'] exponentiell geglättet (EWMA).
+    Aus dem Ringpuffer der letzten Datenpunkte kommt die Steigung (lineare Regression über eine Zeitkonstante), mit
+    der ein Abfall konf['prognose_horizont_s'] Sekunden vorausgerechnet wird. Ein Anstieg wird nicht vorweggenommen,
+    zu früh mehr Leistung kostet Netzbezug, zu spät nur etwas Einspeisung. Liegt der aktuelle Wert schon um mehr als
+    das Totband unter der Prognose, zählt er sofort. Die Hysterese ist asymmetrisch: fällt die Prognose unter die
+    zuletzt ausgegebene Leistung, folgt die Ausgabe sofort, damit kein Netzbezug entsteht. Ein Anstieg wird erst
+    ausgegeben, wenn er konf['prognose_totband_w'] übersteigt, sonst bleibt es bei der alten.
+    """
+
+    def __init__(self, punkte: int = 32):
+        import collections
+
+        self.verlauf = collections.deque(maxlen=punkte)  # (Zeit in s, verfügbare Leistung in W) je Datenpunkt
+        self.mittel_w = None  # Geglättete verfügbare Leistung
+        self.vorgabe_w = None  # Zuletzt ausgegebene Leistung
+
+    def aktualisieren(self, zeit: float, lade_soll_w: float, konf: dict) -> float:
+        """Nimmt einen neuen Datenpunkt auf und gibt die Leistung zurück, mit der weitergerechnet wird.
+
+        :param zeit: Zeitpunkt des Datenpunkts in s, z.B. der 'zeitstempel' der SB-Daten
+        :param lade_soll_w: Verfügbare Leistung in W aus ueberschuss_bestimmen
+        :param konf: dict-Objekt mit der aktuellen Konfiguration
+        :return: Leistung in W. Bei prognose_zeitkonstante_s = 0 und im Lademodus frei unverändert lade_soll_w
+        """
+        import math
+
+        zeitkonstante = konf['prognose_zeitkonstante_s']
+        if not zeitkonstante or lade_soll_w == 99999:
+            return lade_soll_w
+        if self.verlauf and zeit <= self.verlauf[-1][0]:  # Dieselben Daten noch einmal, z.B. letzte gültige Daten
+            return self.vorgabe_w
+
+        if self.mittel_w is None:
+            self.mittel_w = lade_soll_w
+        else:  # Gewicht des neuen Werts je nach Abstand zum letzten Datenpunkt, Zyklen dürfen ausfallen
+            gewicht = 1 - math.exp((self.verlauf[-1][0] - zeit) / zeitkonstante)
+            self.mittel_w += gewicht * (lade_soll_w - self.mittel_w)
+        self.verlauf.append((zeit, lade_soll_w))
+
+        punkte = [(punkt_zeit, punkt_w) for punkt_zeit, punkt_w in self.verlauf if zeit - punkt_zeit <= zeitkonstante]
+        steigung = 0
+        if len(punkte) >= 3:
+            zeit_mittel = math.fsum(punkt[0] for punkt in punkte) / len(punkte)
+            w_mittel = math.fsum(punkt[1] for punkt in punkte) / len(punkte)
+            nenner = math.fsum((punkt[0] - zeit_mittel) ** 2 for punkt in punkte)
+            if nenner:
+                steigung = math.fsum((punkt[0] - zeit_mittel) * (punkt[1] - w_mittel) for punkt in punkte) / nenner
+
+        prognose_w = self.mittel_w + min(steigung, 0) * konf['prognose_horizont_s']
+        if lade_soll_w < prognose_w - konf['prognose_totband_w']:  # Deutlicher Einbruch, nicht erst abwarten
+            prognose_w = lade_soll_w
+        if self.vorgabe_w is None or prognose_w < self.vorgabe_w \
+                or prognose_w - self.vorgabe_w > konf['prognose_totband_w']:
+            self.vorgabe_w = round(prognose_w)
+        return self.vorgabe_w
+
+    def reihe(self, zeiten, lade_soll_w, konf: dict) -> list:
+        """aktualisieren für eine ganze Reihe von Datenpunkten, z.B. für LogReplay.py
+
+        :param zeiten: Zeitpunkte in s
+        :param lade_soll_w: Verfügbare Leistung in W je Zeitpunkt, z.B. aus ueberschuss_bestimmen_vektor
+        :return: Liste der Leistungen wie von aktualisieren
+        """
+        return [self.aktualisieren(zeit, leistung, konf) for zeit, leistung in zip(zeiten, lade_soll_w)]
+
+
+def ladestrom_bestimmen(lade_soll_w: float, goe_status_i: GoEStatus, ladekurve: Ladekurve, konf: dict):
+    """Rechnet eine verfügbare Leistung in den Ladestrom eines Go-eChargers um, gedeckelt durch Anschlusswert,
+    Lastverteilung, Sprungbegrenzung und Ladekurve.
+
+    :param lade_soll_w: Verfügbare Leistung in W aus ueberschuss_bestimmen
+    :param goe_status_i: GoEStatus-Objekt aus den JSON-Daten und Metainformationen des Go-eChargers
+    :param ladekurve: Ladekurve-Objekt des Fahrzeugs an diesem Go-eCharger
+    :param konf: dict-Objekt mit der aktuellen Konfiguration
+    :return: dict-Objekt mit der errechneten Leistung in A und W
+    """
+    import math
+
+    goe_u = math.fsum(goe_status_i.nrg[0:3]) / 3  # Durchschnitt über die Spannungen der drei Einzelphasen
+
     # Umrechnung Watt → Ampere inkl. aktuelle Leistungsfaktoren, falls es sie gibt
-    if 0 not in goe_status_i['nrg'][0:3]:  # Charger an Drehstrom (3~) angeschlossen, Drehstrom-Ampere-berechnen
+    if 0 not in goe_status_i.nrg[0:3]:  # Charger an Drehstrom (3~) angeschlossen, Drehstrom-Ampere-berechnen
         lade_soll_amp = lade_soll_w / (3 ** 0.5 * goe_u)
         print(f'Formel A Soll: {lade_soll_amp}', end='')
     else:  # Charger an Wechselstrom (1~) angeschlossen, Wechselstrom-Ampere berechnen.
-        lade_soll_amp = lade_soll_w / goe_status_i['nrg'][0]  # Ungetestet
+        lade_soll_amp = lade_soll_w / goe_status_i.nrg[0]  # Ungetestet
 
     lade_soll_amp = math.floor(lade_soll_amp)  # Abrunden und in int konvertieren
 
     if lade_soll_w == 99999:
         lade_soll_amp = 32  # Maximaler Wert, den irgendein go-Echarger kann, wird im Folgenden dann gedeckelt
 
-    lade_soll_amp = min(lade_soll_amp, int(goe_status_i['cbl']))  # Auf Anschlusswert deckeln
+    lade_soll_amp = min(lade_soll_amp, goe_status_i.cbl)  # Auf Anschlusswert deckeln
 
-    if goe_status_i['loe'] == '1':  # Falls Lastverteilung aktiv. Ungetestet
-        lade_soll_amp = min(lade_soll_amp, int(goe_status_i['loa']))  # Auf max. Stromwert aus Lastverteilung deckeln
+    if goe_status_i.loe == 1:  # Falls Lastverteilung aktiv. Ungetestet
+        lade_soll_amp = min(lade_soll_amp, goe_status_i.loa)  # Auf max. Stromwert aus Lastverteilung deckeln
 
     lade_soll_amp = max(lade_soll_amp, konf['zoe_modus'] * 6)  # Falls Zoe-Modus aktiv: auf min 6A heben
 
     # Maximale Veränderungsgeschwindigkeit auf sprung_max_a deckeln, wenn simulieren == False
-    if abs(lade_soll_amp - int(goe_status_i['amp'])) > konf['sprung_max_a'] and not konf['simulieren']:
-        if lade_soll_amp > int(goe_status_i['amp']):
-            lade_soll_amp = int(goe_status_i['amp']) + konf['sprung_max_a']
-        elif lade_soll_amp < int(goe_status_i['amp']):
-            lade_soll_amp = int(goe_status_i['amp']) - konf['sprung_max_a']
+    if abs(lade_soll_amp - goe_status_i.amp) > konf['sprung_max_a'] and not konf['simulieren']:
+        if lade_soll_amp > goe_status_i.amp:
+            lade_soll_amp = goe_status_i.amp + konf['sprung_max_a']
+        elif lade_soll_amp < goe_status_i.amp:
+            lade_soll_amp = goe_status_i.amp - konf['sprung_max_a']
     print(f'  ==>  Sprung A Soll: {lade_soll_amp}', end='')
     # Prüfung anhand vergangener Datenpunkte, ob der neue Ladestrom eine zu hohe Ladeleistung generiert
-    while lade_soll_amp in ladekurve and ladekurve[lade_soll_amp] > lade_soll_w:
-        lade_soll_amp -= 1
-    if lade_soll_amp in ladekurve:
-        lade_soll_w = ladekurve[lade_soll_amp]
+    lade_soll_amp = min(lade_soll_amp, ladekurve.max_amp(lade_soll_w))
+    if ladekurve.wert(lade_soll_amp) is not None:
+        lade_soll_w = round(ladekurve.wert(lade_soll_amp))
 
     print(f'  ==>  Ladekurve A Soll: {lade_soll_amp}')
 
     return {'A': lade_soll_amp, 'W': lade_soll_w}
 
 
-def goe_setzen(parameter: str, steuerwert: int, goe_status_i: dict, konf: dict):
-    """Steuert den übergebenen Parameter am Go-eCharger auf den gegebenen Wert an und überprüft, ob die Änderung
-    angenommen wurde.
+def ladestrom_in_watt(amp: int, goe_status_i: GoEStatus) -> float:
+    """Umkehrung der Umrechnung Watt → Ampere aus ladestrom_bestimmen: rechnerische Leistung bei amp in W."""
+    import math
 
-    :param parameter: Parameter / Wert-Name, der gesetzt werden soll
-    :param steuerwert: Steuerwert, auf den der Parameter gesetzt werden soll
-    :param goe_status_i: aktuelles dict-Objekt des Go-eChargers
+    if 0 not in goe_status_i.nrg[0:3]:  # Drehstrom (3~)
+        return amp * 3 ** 0.5 * math.fsum(goe_status_i.nrg[0:3]) / 3
+    return amp * goe_status_i.nrg[0]  # Wechselstrom (1~)
+
+
+class Ladepunkt:
+    """Ein Go-eCharger im Mehrfachladen mit eigenem Status, eigener Ladekurve und eigenem Rate-Limit."""
+
+    def __init__(self, name: str, adresse: str, ladekurve: Ladekurve, ladekurve_datei: str, prioritaet: int = 1,
+                 akku_kwh: float = 0):
+        """
+        :param name: Name des Ladepunkts für Meldungen und Logs
+        :param adresse: Lokale IP oder DNS-Name des Go-eChargers, optional mit :Port
+        :param ladekurve: Ladekurve-Objekt des Fahrzeugs an diesem Ladepunkt
+        :param ladekurve_datei: JSON-Datei, in der die gelernte Ladekurve gesichert wird
+        :param prioritaet: Kleinere Zahl wird bei der Verteilung 'prioritaet' zuerst bedient
+        :param akku_kwh: Nutzbare Akku-Kapazität des Fahrzeugs für die Verteilung 'soc'
+        """
+        import time
+
+        self.name = name
+        self.adresse = adresse
+        self.status_url = 'http://' + adresse + '/status'  # Nutzt v1 API
+        self.mqtt_url = 'http://' + adresse + '/mqtt?payload='  # Nutzt V1 API
+        self.ladekurve = ladekurve
+        self.ladekurve_datei = ladekurve_datei
+        self.prioritaet = prioritaet
+        self.akku_kwh = akku_kwh
+        self.status = GoEStatus(name, time.time() - 3600)  # Standard-Objektzustand
+        self.gesperrt_bis = 0.0  # Nach HTTP 429 wird bis zu diesem time.monotonic()-Wert nichts gesetzt
+
+    def aktiv(self) -> bool:
+        """Ist ein Fahrzeug angeschlossen, das laden möchte? (car 2 = lädt, car 3 = wartet auf Fahrzeug)"""
+        return self.status.gueltig and self.status.car in (2, 3)
+
+    def ladestand(self) -> float:
+        """Geschätzter Ladestand 0..1 aus der in dieser Sitzung geladenen Energie (dws) und akku_kwh. Die API v1 des
+        Go-eChargers kennt den Ladestand des Fahrzeugs nicht."""
+        if not self.akku_kwh:
+            return 0.0
+        return min((self.status.dws or 0) / 3600000 / self.akku_kwh, 1.0)
+
+
+VERTEILUNGEN = {'prioritaet': 'Ladepunkte werden nach Priorität nacheinander voll bedient',
+                'gleich': 'Alle aktiven Fahrzeuge bekommen den gleichen Anteil',
+                'soc': 'Fahrzeuge mit niedrigerem (geschätztem) Ladestand bekommen einen größeren Anteil'}
+
+
+def _ladepunkt_bedienen(lade_soll_w: float, ladepunkt: Ladepunkt, konf: dict):
+    """Ladestrom eines Ladepunkts für eine Leistung und die Leistung, die er davon tatsächlich verbraucht."""
+    ergebnis = ladestrom_bestimmen(lade_soll_w, ladepunkt.status, ladepunkt.ladekurve, konf)
+    if ergebnis['A'] < 6:  # Der Go-eCharger lädt erst ab 6 A, darunter wird das Laden unterbrochen
+        return ergebnis, 0
+    verbrauch = ladepunkt.ladekurve.wert(ergebnis['A'])
+    if verbrauch is None:
+        verbrauch = ladestrom_in_watt(ergebnis['A'], ladepunkt.status)
+    return ergebnis, verbrauch
+
+
+def leistung_verteilen(lade_soll_w: float, ladepunkte: list, konf: dict) -> dict:
+    """Verteilt die verfügbare Leistung aus ueberschuss_bestimmen auf die aktiven Ladepunkte nach
+    konf['mehrfachladen']['verteilung']. Jeder Ladepunkt rechnet seinen Anteil mit seiner eigenen Ladekurve in
+    Ampere um. Was ein Ladepunkt nicht abnehmen kann (Anschlusswert, Ladekurve), geht an die übrigen.
+
+    :param lade_soll_w: Verfügbare Leistung aller Ladepunkte zusammen in W
+    :param ladepunkte: Liste der Ladepunkt-Objekte
     :param konf: dict-Objekt mit der aktuellen Konfiguration
-    :return: Bool-Wert True falls erfolgreich, False falls nicht erfolgreich
+    :return: dict-Objekt {Name des Ladepunkts: dict-Objekt mit A und W wie bei goe_ladeleistung_bestimmen}
     """
-    import requests
+    verteilung = konf['mehrfachladen']['verteilung']
+    ergebnisse = {ladepunkt.name: {'A': 0, 'W': 0} for ladepunkt in ladepunkte}
+    aktive = sorted((ladepunkt for ladepunkt in ladepunkte if ladepunkt.aktiv()), key=lambda lp: lp.prioritaet)
 
-    goe_mqtt_url = 'http://' + konf['goe_adresse'] + '/mqtt?payload='  # Nutzt V1 API
+    if lade_soll_w == 99999:  # Lademodus frei: jeder Ladepunkt bekommt, was er kann
+        for ladepunkt in aktive:
+            ergebnisse[ladepunkt.name] = ladestrom_bestimmen(lade_soll_w, ladepunkt.status, ladepunkt.ladekurve, konf)
+        return ergebnisse
 
-    if konf['simulieren']:  # Im Simulationsmodus nichts tun
-        return True
+    if verteilung == 'prioritaet':
+        rest = lade_soll_w
+        for ladepunkt in aktive:
+            ergebnisse[ladepunkt.name], verbrauch = _ladepunkt_bedienen(rest, ladepunkt, konf)
+            rest -= verbrauch
+        return ergebnisse
 
-    if parameter == 'amx':  # Sonderfall amx wird gesetzt, aber der Return-Wert, der sich ändert, ist amp
-        parameter_kontrolle = 'amp'
+    # gleich und soc: gewichtete Anteile. Reicht ein Anteil nicht für 6 A, fällt der Ladepunkt mit der niedrigsten
+    # Priorität heraus und die übrigen teilen neu. Nimmt ein Ladepunkt weniger als seinen Anteil ab, wird er fest
+    # zugeteilt und der Rest unter den übrigen verteilt.
+    if verteilung == 'soc':
+        gewichte = {ladepunkt.name: 1.0 - ladepunkt.ladestand() + 0.01 for ladepunkt in aktive}
     else:
-        parameter_kontrolle = parameter
+        gewichte = {ladepunkt.name: 1.0 for ladepunkt in aktive}
+    offen = list(aktive)
+    rest = lade_soll_w
+    while offen:
+        summe = sum(gewichte[ladepunkt.name] for ladepunkt in offen)
+        runde = {ladepunkt.name: _ladepunkt_bedienen(rest * gewichte[ladepunkt.name] / summe, ladepunkt, konf)
+                 for ladepunkt in offen}
+        zu_wenig = [ladepunkt for ladepunkt in offen if runde[ladepunkt.name][1] == 0]
+        if zu_wenig and len(offen) > 1 and not konf['zoe_modus']:
+            ergebnisse[zu_wenig[-1].name] = runde[zu_wenig[-1].name][0]
+            offen.remove(zu_wenig[-1])
+            continue
+        gesaettigt = [ladepunkt for ladepunkt in offen
+                      if 0 < runde[ladepunkt.name][1] < rest * gewichte[ladepunkt.name] / summe * 0.95]
+        if not gesaettigt or len(gesaettigt) == len(offen):
+            for ladepunkt in offen:
+                ergebnisse[ladepunkt.name] = runde[ladepunkt.name][0]
+            break
+        for ladepunkt in gesaettigt:
+            ergebnisse[ladepunkt.name] = runde[ladepunkt.name][0]
+            rest -= runde[ladepunkt.name][1]
+            offen.remove(ladepunkt)
+    return ergebnisse
 
-    # Muss der Wert überhaupt gesetzt werden?
-    if not parameter_kontrolle == 'rst' and not goe_status_i[parameter_kontrolle] == str(steuerwert):
-        try:
-            goe_return = requests.get(f'{goe_mqtt_url}{parameter}={steuerwert}', timeout=konf['wartezeit'])
-        except Exception as connect_err:
-            log_event(f'Fehler {connect_err} beim Setzen der Daten am Go-eCharger', konf)
-            return False
-    else:
-        if parameter_kontrolle == 'amp':
-            pass  # Wenn Ladeleistung nicht gesetzt werden muss, muss das auch nicht ausgegeben werden
-        else:
-            log_event(f'Go-E Parameter {parameter_kontrolle} ist bereits {steuerwert} und wurde daher nicht gesetzt.',
-                      konf)
-        return True
 
-    if goe_return.status_code == 200:  # War das Setzen erfolgreich (schnittstellenseitig)?
-        goe_status_i = goe_return.json()
-        if str(steuerwert) == goe_status_i[parameter_kontrolle]:  # War das Setzen erfolgreich (wertseitig)?
-            return True
+def sb_status_zusammenfassen(sb_status_liste: list) -> dict:
+    """Fasst die Status mehrerer SonnenBatterien hinter einem gemeinsamen Netzzähler für ueberschuss_bestimmen
+    zusammen. Erzeugung, Verbrauch und Batterieleistung werden addiert, Netzbezug und Einspeisung kommen vom
+    gemeinsamen Zähler und damit von der ersten SB, der Ladestand ist der Mittelwert.
+
+    :param sb_status_liste: Liste der SBStatus-Objekte aus daten_holen, die erste SB liefert die Zählerwerte
+    :return: SBStatus-Objekt, die JSON-Daten der einzelnen SBs (rohdaten) gehören nicht dazu
+    """
+    import copy
+
+    if len(sb_status_liste) == 1:
+        return sb_status_liste[0]
+    zusammen = copy.copy(sb_status_liste[0])
+    zusammen.rohdaten = None
+    for feld in ('Production_W', 'Consumption_W', 'Pac_total_W'):
+        setattr(zusammen, feld, sum(getattr(sb_status, feld) for sb_status in sb_status_liste))
+    zusammen.USOC = round(sum(sb_status.USOC for sb_status in sb_status_liste) / len(sb_status_liste))
+    zusammen.BatteryCharging = zusammen.Pac_total_W < 0
+    zusammen.BatteryDischarging = zusammen.Pac_total_W > 0
+    return zusammen
+
+
+class TransportAsyncio:
+    """HTTP-Transport für asyncio auf Basis von asyncio.open_connection aus der Standardbibliothek. Hält wie
+    TransportHttpClient je Gerät eine keep-alive-Verbindung offen, damit viele Geräte in einem Thread gleichzeitig
+    abgefragt werden können."""
+
+    def __init__(self):
+        self.verbindungen = {}  # (host, port) → [asyncio.Lock, (StreamReader, StreamWriter) oder None]
+
+    async def _lesen(self, reader):
+        """Liest eine HTTP/1.1-Antwort: Content-Length, chunked oder bis zum Verbindungsende.
+
+        :return: Tupel aus HttpAntwort-Objekt und Bool-Wert, ob das Gerät die Verbindung danach schließt
+        """
+        status_zeile = await reader.readline()
+        if not status_zeile:
+            raise ConnectionResetError('Verbindung vom Gerät geschlossen')
+        status_code = int(status_zeile.split()[1])
+        kopf = {}
+        while True:
+            zeile = await reader.readline()
+            if zeile in (b'\r\n', b'\n', b''):
+                break
+            name, _, wert = zeile.decode('latin-1').partition(':')
+            kopf[name.strip().lower()] = wert.strip()
+        if 'content-length' in kopf:
+            inhalt = await reader.readexactly(int(kopf['content-length']))
+        elif kopf.get('transfer-encoding', '').lower() == 'chunked':
+            teile = []
+            while True:
+                groesse = int((await reader.readline()).split(b';')[0], 16)
+                if not groesse:
+                    await reader.readline()
+                    break
+                teile.append(await reader.readexactly(groesse))
+                await reader.readline()
+            inhalt = b''.join(teile)
         else:
-            log_event(f'Fehler beim Setzen von {parameter} am Go-E, {steuerwert} wurde gesetzt aber Wert ist '
-                      f'{goe_status_i[parameter_kontrolle]}!', konf)
-            return False
-    else:
-        log_event(f'Go-E MQTT HTTP Fehler Status {goe_return.status_code}', konf)
-        return False
+            inhalt = await reader.read()
+            kopf['connection'] = 'close'
+        return HttpAntwort(status_code, inhalt), kopf.get('connection', '').lower() == 'close'
 
+    async def get(self, url: str, timeout: float):
+        """Schickt einen GET-Request über die Verbindung des Geräts und baut sie bei Bedarf (neu) auf.
 
-def log_nrg(objekt: str, objekt_status: dict, konf: dict):
-    """Erstellt bzw. aktualisiert eine Logdatei mit dem heutigen Datum als Dateinamen im relativen Verzeichnis logs.
+        :param url: Vollständige URL inkl. http://
+        :param timeout: Timeout in Sekunden für Verbindungsaufbau und Antwort
+        :return: HttpAntwort-Objekt
+        """
+        import asyncio
+        import socket
+        from urllib.parse import urlsplit
 
-    :param objekt: Kann "goe" oder "sb" sein. Wird ausschließlich für die Logdatei als Suffix gebrauch
-    :param objekt_status: dict-Objekt mit den Daten, die geloggt werden sollen.
-    :param konf: dict-Objekt mit der aktuellen Konfiguration
-    :return: Bool-Wert True falls erfolgreich, False falls nicht erfolgreich
-    """
-    import time
-    import os
+        url_teile = urlsplit(url)
+        if url_teile.scheme != 'http':
+            raise ValueError(f'Nicht unterstütztes Protokoll in <{url}>, nur http ist möglich')
+        schluessel = (url_teile.hostname, url_teile.port or 80)
+        pfad = url_teile.path or '/'
+        if url_teile.query:
+            pfad += '?' + url_teile.query
+        anfrage = (f'GET {pfad} HTTP/1.1\r\nHost: {url_teile.netloc}\r\nConnection: keep-alive\r\n\r\n').encode()
 
-    if konf['logging_nrg']:
-        log_name = f'logs/{time.strftime("%Y-%m-%d")}-{objekt}-log.csv'
+        eintrag = self.verbindungen.setdefault(schluessel, [asyncio.Lock(), None])
+        async with eintrag[0]:
+            for versuch in range(2):
+                wiederverwendet = eintrag[1] is not None
+                try:
+                    if not wiederverwendet:
+                        eintrag[1] = await asyncio.wait_for(asyncio.open_connection(*schluessel), timeout)
+                        eintrag[1][1].get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    reader, writer = eintrag[1]
+                    writer.write(anfrage)
+                    antwort, schliessen = await asyncio.wait_for(self._lesen(reader), timeout)
+                except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+                    self._trennen(eintrag)
+                    if not wiederverwendet or versuch:  # Nur eine vom Gerät geschlossene keep-alive-Verbindung
+                        raise                           # wird einmal neu aufgebaut
+                except BaseException:  # Auch bei Timeout und Abbruch, die Verbindung ist danach in unklarem Zustand
+                    self._trennen(eintrag)
+                    raise
+                else:
+                    if schliessen:
+                        self._trennen(eintrag)
+                    return antwort
 
-        if not os.path.isfile(log_name):
-            try:
-                with open(log_name, 'x') as log:
-                    log_event(f'Erstelle neue Logdatei <{log_name}>', konf)
-                    log.write('Uhrzeit_F;')
-                    for parameter in objekt_status:
-                        log.write(f'{parameter};')
-                    log.write('\n')
-            except FileExistsError:
-                print(f'    Aktualisiere bestehende Logdatei <{log_name}>')
-            except FileNotFoundError:  # Der Ordner wurde während der Laufzeit gelöscht
-                print('!!!!Der Unterordner <logs> existiert nicht im Arbeitsverzeichnis, bitte erstellen!')
-                raise
-            except Exception as logfile_err:
-                print(f'!!!!Fehler beim Arbeiten mit <{log_name}>:')
-                print(logfile_err)
-                raise
+    @staticmethod
+    def _trennen(eintrag: list):
+        if eintrag[1] is not None:
+            eintrag[1][1].close()
+            eintrag[1] = None
 
-        try:
-            with open(log_name, 'a') as log:
-                log.write(f'{time.strftime("%H:%M:%S")};')
-                for wert in objekt_status.values():
-                    log.write(f'{wert};')
-                log.write('\n')
-        except Exception as logwrite_err:
-            print(f'!!!!Fehler beim Arbeiten mit <{log_name}>:')
-            print(logwrite_err)
-            raise
+    def schliessen(self):
+        """Schließt alle offenen Verbindungen."""
+        for eintrag in self.verbindungen.values():
+            self._trennen(eintrag)
 
 
-def log_event(meldung: str, konf: dict):
-    """Programm-Meldungen loggen (bekommt einen String, loggt ihn mit Zeitstempel und gibt ihn per print aus)
+async def daten_holen_async(objekt_name: str, objekt: dict, url: str, konf: dict, transport: TransportAsyncio,
+                            timeout: float = None):
+    """Wie daten_holen, aber für asyncio mit einem TransportAsyncio. Gibt keine Erfolgsmeldung auf der Konsole aus,
+    damit viele Geräte die Ausgabe nicht überfluten.
 
-    :param meldung: Text der Meldung
-    :param konf: dict-Objekt mit der aktuellen Konfiguration
+    :return: GoEStatus- bzw. SBStatus-Objekt wie bei daten_holen
     """
     import time
-    import os
-
-    print(f'    {meldung}')
-    if konf['logging_events']:
-        log_name = f'logs/{time.strftime("%Y-%m-%d")}-sys-log.csv'
 
-        # Aktuelle Konfiguration in Logdatei-Kopf schreiben beim Start, falls nötig Datei erstellen
-        if not os.path.isfile(log_name):
-            try:
-                log = open(log_name, 'x')
-                log.write(f'Logdatei {log_name}, erstellt vom SB-GoE-Überschussladen von Musicaloris.\n')
-                log.close()
-                print(f'    Neue Logdatei <{log_name}> erstellt.')
-            except FileExistsError:
-                print(f'    Aktualisiere bestehende Logdatei <{log_name}>')
-                with open(log_name, 'a') as log:
-                    log.write('\n' + ('-' * 35) + '\n')
-            except Exception as logfile_err:
-                print(f'!!!!Fehler beim Arbeiten mit <{log_name}>:')
-                print(logfile_err)
-                raise
-            finally:
-                with open(log_name, 'a') as log:
-                    log.write(f'Programmstart um {time.strftime("%H:%M:%S")}. Aktuelle Konfiguration:\n')
-                    for config_wert in konf:
-                        log.write(f'{config_wert} = {konf[config_wert]}\n')
-                    log.write('\nMeldungen:\n')
+    if timeout is None:
+        timeout = konf['wartezeit']
 
+    if objekt.neu_abfragen or time.time() >= objekt.zeitstempel + konf['wartezeit'] * 0.9:
+        abruf_start = time.perf_counter()
         try:
-            with open(log_name, 'a') as log:
-                log.write(f'{time.strftime("%H:%M:%S")}: {meldung}\n')
-        except Exception as logwrite_err:
-            print(f'!!!!Fehler beim Arbeiten mit Logdatei <{log_name}>:')
-            print(logwrite_err)
-            raise
+            antwort = await transport.get(url, timeout=max(timeout, 0.1))
+        except Exception as connect_err:
+            log_event(f'{objekt_name} Verbindungsfehler, Details: {connect_err!r}', konf)
+            metriken_holen().zaehlen('sbgoe_abruf_fehler_total', geraet=objekt_name)
+            return type(objekt)(objekt_name, time.time(), time.perf_counter() - abruf_start)
+        abrufdauer = time.perf_counter() - abruf_start
+        metriken_holen().beobachten('sbgoe_abrufdauer_sekunden', abrufdauer, geraet=objekt_name)
+        if antwort.status_code == 200:
+            return type(objekt)(objekt_name, time.time(), abrufdauer,
+                                antwort.status_code).uebernehmen(antwort.json(), konf['logging_nrg'])
+        log_event(f'{objekt_name} HTTP Fehler Status {antwort.status_code}', konf)
+        metriken_holen().zaehlen('sbgoe_abruf_fehler_total', geraet=objekt_name)
+        return type(objekt)(objekt_name, time.time(), abrufdauer)
+    return objekt
 
 
-def abwarten(fehler: bool, konf: dict, zyklus_timestamp: float):
-    """Warten bis zum nächsten Zyklus
+async def goe_setzen_async(parameter: str, steuerwert: int, ladepunkt: Ladepunkt, konf: dict,
+                           transport: TransportAsyncio):
+    """Kurzform von goe_mehrfach_setzen_async für einen einzelnen Parameter.
 
-    :param fehler: Wird die Funktion regulär (False) oder aus einem Fehler (True) heraus aufgerufen?
-    :param konf: dict-Objekt mit der aktuellen
-    :param zyklus_timestamp: Zeitstempel des aktuellen Zyklus'
+    :return: Bool-Wert True falls erfolgreich oder nicht nötig, False falls nicht erfolgreich
+    """
+    return await goe_mehrfach_setzen_async({parameter: steuerwert}, ladepunkt, konf, transport)
+
+
+async def goe_mehrfach_setzen_async(aenderungen: dict, ladepunkt: Ladepunkt, konf: dict, transport: TransportAsyncio):
+    """Wie goe_mehrfach_setzen, aber für asyncio und einen Ladepunkt. Antwortet der Go-eCharger mit HTTP 429
+    (Rate-Limit), wird an diesem Ladepunkt für konf['wartezeit'] Sekunden nichts mehr gesetzt.
+
+    :return: Bool-Wert True falls erfolgreich oder nicht nötig, False falls nicht erfolgreich
     """
     import time
 
-    print('-' * 10)
-    print('Zum Beenden des Programms Strg + C drücken.')
+    if konf['simulieren']:  # Im Simulationsmodus nichts tun
+        return True
 
-    if fehler:
-        print('Nächster Versuch in ', end='', flush=True)
-    else:
-        print('Nächstes Update in ', end='', flush=True)
-
-    countdown = konf['wartezeit']
-    countdown_zuletzt = int(konf['wartezeit'] - (time.time() - zyklus_timestamp))
-    print(f'{countdown_zuletzt}... ', end='', flush=True)
-    while time.time() < zyklus_timestamp + konf['wartezeit'] and countdown > 0:
-        time.sleep(0.1)
-        countdown = int(konf['wartezeit'] - (time.time() - zyklus_timestamp))
-        if countdown < countdown_zuletzt:
-            print(f'{countdown}... ', end='', flush=True)
-            countdown_zuletzt = countdown
+    metriken = metriken_holen()
+    for parameter, steuerwert in aenderungen.items():
+        parameter_kontrolle = 'amp' if parameter == 'amx' else parameter
+        if str(getattr(ladepunkt.status, parameter_kontrolle, None)) == str(steuerwert):  # Muss gesetzt werden?
+            continue
+        if time.monotonic() < ladepunkt.gesperrt_bis:
+            return False
+
+        setzen_start = time.perf_counter()
+        try:
+            goe_return = await transport.get(f'{ladepunkt.mqtt_url}{parameter}={steuerwert}',
+                                             timeout=konf['wartezeit'])
+        except Exception as connect_err:
+            log_event(f'{ladepunkt.name}: Fehler {connect_err!r} beim Setzen der Daten am Go-eCharger', konf)
+            metriken.zaehlen('sbgoe_setzen_fehler_total', parameter=parameter, geraet=ladepunkt.name)
+            return False
+        metriken.beobachten('sbgoe_setzen_sekunden', time.perf_counter() - setzen_start, parameter=parameter,
+                            geraet=ladepunkt.name)
+
+        if goe_return.status_code == 429:
+            ladepunkt.gesperrt_bis = time.monotonic() + konf['wartezeit']
+            log_event(f'{ladepunkt.name}: Rate-Limit des Go-eChargers, {parameter} wird später gesetzt.', konf)
+            metriken.zaehlen('sbgoe_setzen_fehler_total', parameter=parameter, geraet=ladepunkt.name)
+            return False
+        if goe_return.status_code != 200:
+            log_event(f'{ladepunkt.name}: Go-E MQTT HTTP Fehler Status {goe_return.status_code}', konf)
+            metriken.zaehlen('sbgoe_setzen_fehler_total', parameter=parameter, geraet=ladepunkt.name)
+            return False
+        neuer_status = goe_return.json()
+        ladepunkt.status.uebernehmen(neuer_status, konf['logging_nrg'])
+        ladepunkt.status.status_code, ladepunkt.status.neu_abfragen = goe_return.status_code, True
+        if str(steuerwert) != str(neuer_status.get(parameter_kontrolle)):
+            log_event(f'{ladepunkt.name}: Fehler beim Setzen von {parameter} am Go-E, {steuerwert} wurde gesetzt aber '
+                      f'Wert ist {neuer_status.get(parameter_kontrolle)}!', konf)
+            metriken.zaehlen('sbgoe_setzen_fehler_total', parameter=parameter, geraet=ladepunkt.name)
+            return False
+    return True
+
+
+def mehrfachladen_pruefen(konf: dict):
+    """Prüft den Abschnitt [mehrfachladen] der config.toml für Mehrfachladen.py.
+
+    :param konf: Objekt aus dem TOML-Import
+    """
+    mehrfach = konf['mehrfachladen']
+    if mehrfach['verteilung'] not in VERTEILUNGEN:
+        raise ValueError('Fehler:  mehrfachladen.verteilung hat ungültigen Wert!')
+    if not isinstance(mehrfach['sb_adressen'], list) or not mehrfach['sb_adressen']:
+        raise ValueError('Fehler:  mehrfachladen.sb_adressen hat ungültigen Wert!')
+    if not isinstance(mehrfach['goe'], list) or not mehrfach['goe']:
+        raise ValueError('Fehler:  mehrfachladen.goe hat ungültigen Wert!')
+    namen, profile = set(), set()
+    for goe in mehrfach['goe']:
+        if not isinstance(goe.get('name'), str) or not goe['name'] or goe['name'] in namen \
+                or not all(zeichen.isalnum() or zeichen in '-_' for zeichen in goe['name']):
+            raise ValueError('Fehler:  mehrfachladen.goe.name fehlt, ist doppelt oder hat ungültige Zeichen!')
+        namen.add(goe['name'])
+        if not isinstance(goe.get('adresse'), str):
+            raise ValueError(f'Fehler:  mehrfachladen.goe.adresse von {goe["name"]} hat ungültigen Wert!')
+        if not isinstance(goe.get('prioritaet', 1), int):
+            raise TypeError(f'Fehler:  mehrfachladen.goe.prioritaet von {goe["name"]} hat ungültigen Wert!')
+        if not isinstance(goe.get('akku_kwh', 0), (int, float)) or goe.get('akku_kwh', 0) < 0:
+            raise ValueError(f'Fehler:  mehrfachladen.goe.akku_kwh von {goe["name"]} hat ungültigen Wert!')
+        profil = goe.get('fahrzeug_profil', goe['name'])  # Jeder Ladepunkt lernt seine eigene Ladekurve
+        if not isinstance(profil, str) or not profil or profil in profile \
+                or not all(zeichen.isalnum() or zeichen in '-_' for zeichen in profil):
+            raise ValueError(f'Fehler:  mehrfachladen.goe.fahrzeug_profil von {goe["name"]} ist ungültig oder doppelt!')
+        profile.add(profil)
+
+
+def verteiler_pruefen(konf: dict):
+    """Prüft den Abschnitt [verteiler] der config.toml für Statusverteiler.py.
+
+    :param konf: Objekt aus dem TOML-Import
+    """
+    verteiler = konf['verteiler']
+    for schluessel in ('goe_adresse', 'sb_adresse', 'adresse'):
+        if not isinstance(verteiler[schluessel], str) or not verteiler[schluessel]:
+            raise ValueError(f'Fehler:  verteiler.{schluessel} hat ungültigen Wert!')
+    if not isinstance(verteiler['port'], int) or not 0 < verteiler['port'] < 65536:
+        raise ValueError('Fehler:  verteiler.port hat ungültigen Wert!')
+    if not isinstance(verteiler['intervall_s'], (int, float)) or verteiler['intervall_s'] <= 0:
+        raise ValueError('Fehler:  verteiler.intervall_s hat ungültigen Wert!')
+    if not isinstance(verteiler['max_alter_s'], (int, float)) or verteiler['max_alter_s'] < verteiler['intervall_s']:
+        raise ValueError('Fehler:  verteiler.max_alter_s hat ungültigen Wert!')
+
+
+def goe_setzen(parameter: str, steuerwert: int, goe_status_i: GoEStatus, konf: dict):
+    """Steuert den übergebenen Parameter am Go-eCharger auf den gegebenen Wert an und überprüft, ob die Änderung
+    angenommen wurde. Kurzform von goe_mehrfach_setzen für einen einzelnen Parameter.
+
+    :param parameter: Parameter / Wert-Name, der gesetzt werden soll
+    :param steuerwert: Steuerwert, auf den der Parameter gesetzt werden soll
+    :param goe_status_i: aktuelles GoEStatus-Objekt des Go-eChargers, wird mit dem zurückgemeldeten Status aktualisiert
+    :param konf: dict-Objekt mit der aktuellen Konfiguration
+    :return: Bool-Wert True falls erfolgreich, False falls nicht erfolgreich
+    """
+    return goe_mehrfach_setzen({parameter: steuerwert}, goe_status_i, konf)
+
+
+def goe_mehrfach_setzen(aenderungen: dict, goe_status_i: GoEStatus, konf: dict):
+    """Setzt mehrere Parameter am Go-eCharger in der gegebenen Reihenfolge mit so wenigen Anfragen wie möglich und
+    überprüft jede Änderung.
+
+    Die V1 API nimmt je /mqtt-Anfrage nur einen Parameter an, antwortet aber mit dem kompletten Status. Parameter, die
+    laut dem jeweils neuesten Status schon den Sollwert haben, werden daher gar nicht erst gesendet, und der
+    zurückgemeldete Status wird in goe_status_i übernommen (Write-Through). Damit rechnen nachfolgende Prüfungen und
+    das Logging mit dem Zustand nach dem Setzen statt mit dem vom Zyklusbeginn. Der 'zeitstempel' des letzten Abrufs
+    bleibt dabei stehen und neu_abfragen wird gesetzt, damit daten_holen im nächsten Zyklus unabhängig vom
+    Abruf-Intervall neu abfragt: die nrg-Werte der /mqtt-Antwort stammen von vor der Reaktion des Fahrzeugs.
+    Beim ersten Fehler wird abgebrochen, goe_status_i enthält dann den Stand nach der letzten erfolgreichen Änderung.
+
+    :param aenderungen: dict-Objekt {Parameter: Steuerwert}, z. B. {'amx': 10, 'alw': 1}
+    :param goe_status_i: aktuelles GoEStatus-Objekt des Go-eChargers, wird mit dem zurückgemeldeten Status aktualisiert
+    :param konf: dict-Objekt mit der aktuellen Konfiguration
+    :return: Bool-Wert True falls alle Änderungen erfolgreich oder nicht nötig waren, False falls nicht erfolgreich
+    """
+    import time
+
+    goe_mqtt_url = 'http://' + konf['goe_adresse'] + '/mqtt?payload='  # Nutzt V1 API
+
+    if konf['simulieren']:  # Im Simulationsmodus nichts tun
+        return True
+    if schutzschalter_holen('Go-E').offen():  # Keine Anfragen in die Pause nach Fehlern schicken
+        log_event(f'Go-E antwortet nicht, {", ".join(aenderungen)} wurde nicht gesetzt.', konf)
+        return False
+
+    for parameter, steuerwert in aenderungen.items():
+        if parameter == 'amx':  # Sonderfall amx wird gesetzt, aber der Return-Wert, der sich ändert, ist amp
+            parameter_kontrolle = 'amp'
+        else:
+            parameter_kontrolle = parameter
+
+        # Muss der Wert überhaupt gesetzt werden?
+        if (not parameter_kontrolle == 'rst'
+                and str(getattr(goe_status_i, parameter_kontrolle, None)) == str(steuerwert)):
+            if not parameter_kontrolle == 'amp':  # Nicht gesetzte Ladeleistung muss nicht ausgegeben werden
+                log_event(f'Go-E Parameter {parameter_kontrolle} ist bereits {steuerwert} und wurde daher nicht '
+                          f'gesetzt.', konf)
+            continue
+
+        setzen_start = time.perf_counter()
+        try:
+            with spur_holen().spanne(f'Setzen {parameter}', steuerwert=steuerwert):
+                goe_return = transport_holen(konf).get(f'{goe_mqtt_url}{parameter}={steuerwert}',
+                                                      timeout=konf['wartezeit'],
+                                                      verbindung_timeout=konf['verbindung_timeout_s'])
+        except Exception as connect_err:
+            log_event(f'Fehler {connect_err} beim Setzen der Daten am Go-eCharger', konf)
+            metriken_holen().zaehlen('sbgoe_setzen_fehler_total', parameter=parameter)
+            return False
+        metriken_holen().beobachten('sbgoe_setzen_sekunden', time.perf_counter() - setzen_start, parameter=parameter)
+
+        if not goe_return.status_code == 200:  # War das Setzen erfolgreich (schnittstellenseitig)?
+            log_event(f'Go-E MQTT HTTP Fehler Status {goe_return.status_code}', konf)
+            metriken_holen().zaehlen('sbgoe_setzen_fehler_total', parameter=parameter)
+            return False
+        neuer_status = goe_return.json()
+        goe_status_i.uebernehmen(neuer_status, konf['logging_nrg'])
+        goe_status_i.status_code, goe_status_i.neu_abfragen = goe_return.status_code, True
+        if not parameter_kontrolle == 'rst' and not str(steuerwert) == str(neuer_status.get(parameter_kontrolle)):
+            log_event(f'Fehler beim Setzen von {parameter} am Go-E, {steuerwert} wurde gesetzt aber Wert ist '
+                      f'{neuer_status.get(parameter_kontrolle)}!', konf)  # War das Setzen erfolgreich (wertseitig)?
+            metriken_holen().zaehlen('sbgoe_setzen_fehler_total', parameter=parameter)
+            return False
+    return True
+
+
+class LogSchreiber:
+    """Schreibt Logzeilen gesammelt in einem Hintergrund-Thread, damit die Hauptschleife nie auf die SD-Karte wartet.
+
+    Die Zeilen landen in einer begrenzten Warteschlange und werden geschrieben, sobald flush_zeilen Zeilen gesammelt
+    sind oder flush_s Sekunden vergangen sind. Der Dateiname wird beim Einreihen bestimmt, um Mitternacht beginnt
+    damit automatisch eine neue Datei. Ist die Warteschlange voll oder schlägt das Schreiben fehl (z.B. SD-Karte voll),
+    werden Zeilen verworfen und gezählt, statt das Programm zu beenden.
+    """
+    _ENDE = object()  # Markierung in der Warteschlange zum Beenden des Threads
+
+    def __init__(self, max_zeilen: int, flush_zeilen: int, flush_s: float):
+        import queue
+        import threading
+
+        self.warteschlange = queue.Queue(maxsize=max_zeilen)
+        self.flush_zeilen = flush_zeilen
+        self.flush_s = flush_s
+        self.verworfen = 0  # Anzahl der Zeilen, die nicht geschrieben werden konnten
+        self.letzter_fehler = None
+        self.beendet = False
+        self.thread = threading.Thread(target=self._arbeiten, name='LogSchreiber', daemon=True)
+        self.thread.start()
+
+    def schreiben(self, dateiname: str, zeile: str, kopf: str = '', index: tuple = None) -> bool:
+        """Reiht eine Zeile zum Schreiben ein, ohne zu blockieren.
+
+        :param dateiname: Pfad der Logdatei
+        :param zeile: Zu schreibende Zeile inkl. Zeilenumbruch, oder bytes für Binär-Logs
+        :param kopf: Text (bzw. bytes), der vor die erste Zeile geschrieben wird, falls die Datei neu angelegt wird
+        :param index: Tuple (Unix-Zeit von Uhrzeit_F, zeitstempel) für CSV-Energielogs, dann wird der Zeitindex der
+            Datei (siehe log_index_erstellen) mit der ersten Zeile jedes Schreibvorgangs fortgeschrieben
+        :return: Bool-Wert True falls eingereiht, False falls die Warteschlange voll ist
+        """
+        import queue
+
+        try:
+            self.warteschlange.put_nowait((dateiname, kopf, zeile, index))
+        except queue.Full:
+            self.verworfen += 1
+            metriken_holen().zaehlen('sbgoe_log_verworfen_total')
+            if self.verworfen % 100 == 1:
+                print(f'!!!!Log-Warteschlange ist voll, bisher {self.verworfen} Zeilen verworfen!')
+            return False
+        return True
+
+    def _arbeiten(self):
+        """Hauptschleife des Hintergrund-Threads: sammeln, nach Größe oder Zeit schreiben, beim Beenden alles."""
+        import queue
+        import time
+
+        puffer = {}  # dateiname → [kopf, [zeilen], Index der ersten Zeile]
+        anzahl = 0
+        letzter_flush = time.monotonic()
+        laeuft = True
+        while laeuft:
+            try:
+                eintrag = self.warteschlange.get(timeout=max(letzter_flush + self.flush_s - time.monotonic(), 0.01))
+            except queue.Empty:
+                eintrag = None
+            if eintrag is self._ENDE:
+                laeuft = False
+            elif eintrag is not None:
+                dateiname, kopf, zeile, index = eintrag
+                puffer.setdefault(dateiname, [kopf, [], index])[1].append(zeile)
+                anzahl += 1
+            if not laeuft or anzahl >= self.flush_zeilen or time.monotonic() >= letzter_flush + self.flush_s:
+                if puffer:
+                    self._flushen(puffer)
+                puffer = {}
+                anzahl = 0
+                letzter_flush = time.monotonic()
+
+    def _flushen(self, puffer: dict):
+        """Schreibt die gesammelten Zeilen je Datei mit einem einzigen open/write."""
+        import os
+        import time
+
+        for dateiname, (kopf, zeilen, index) in puffer.items():
+            schreib_start = time.perf_counter()
+            try:
+                neu = not os.path.isfile(dateiname)
+                binaer = isinstance(zeilen[0], bytes)  # Binär-Logs werden als bytes eingereiht
+                with spur_holen().spanne('Log schreiben', datei=dateiname, zeilen=len(zeilen)), \
+                        open(dateiname, 'ab' if binaer else 'a') as log:
+                    if neu:
+                        print(f'    Neue Logdatei <{dateiname}> erstellt.')
+                        if kopf:
+                            log.write(kopf)
+                    log.flush()
+                    position = os.fstat(log.fileno()).st_size  # Byte-Position der ersten neuen Zeile
+                    log.write((b'' if binaer else '').join(zeilen))
+                if index:
+                    self._index_fortschreiben(dateiname, neu, index, position)
+                self.letzter_fehler = None
+                metriken_holen().beobachten('sbgoe_log_schreiben_sekunden', time.perf_counter() - schreib_start)
+            except Exception as logwrite_err:
+                self.verworfen += len(zeilen)
+                metriken_holen().zaehlen('sbgoe_log_verworfen_total', len(zeilen))
+                if str(logwrite_err) != self.letzter_fehler:  # Gleichen Fehler nicht jedes Mal ausgeben
+                    print(f'!!!!Fehler beim Arbeiten mit <{dateiname}>, {len(zeilen)} Zeilen verworfen:')
+                    print(logwrite_err)
+                    if isinstance(logwrite_err, FileNotFoundError):
+                        print('!!!!Der Unterordner <logs> existiert nicht im Arbeitsverzeichnis, bitte erstellen!')
+                    self.letzter_fehler = str(logwrite_err)
+
+    def _index_fortschreiben(self, dateiname: str, neu: bool, index: tuple, position: int):
+        """Hängt einen Eintrag an den Zeitindex an. Fehlt der Index einer bestehenden Datei, wird er neu aufgebaut."""
+        import os
+        import struct
+
+        try:
+            if not neu and not os.path.isfile(log_index_name(dateiname)):
+                log_index_erstellen(dateiname)  # Enthält auch die gerade geschriebenen Zeilen
+                return
+            with open(log_index_name(dateiname), 'wb' if neu else 'ab') as index_datei:
+                index_datei.write(struct.pack(LOG_INDEX_FORMAT, index[0], index[1], position))
+        except Exception as index_err:  # Ohne Index gehen nur Abfragen langsamer, die Logzeilen sind geschrieben
+            print(f'!!!!Fehler beim Fortschreiben des Zeitindex von <{dateiname}>: {index_err}')
+
+    def beenden(self, timeout: float = 10):
+        """Schreibt alle noch wartenden Zeilen und beendet den Hintergrund-Thread. Mehrfacher Aufruf ist unschädlich.
+        Danach startet log_schreiber_holen einen neuen LogSchreiber, damit spätere Zeilen nicht verloren gehen.
+
+        :param timeout: Maximale Wartezeit in Sekunden
+        """
+        import queue
+        global _log_schreiber
+
+        if self.beendet:
+            return
+        self.beendet = True
+        if _log_schreiber is self:
+            _log_schreiber = None
+        try:
+            self.warteschlange.put(self._ENDE, timeout=timeout)
+        except queue.Full:
+            print('!!!!Log-Warteschlange konnte beim Beenden nicht geleert werden.')
+            return
+        self.thread.join(timeout)
+        if self.verworfen:
+            print(f'!!!!Insgesamt wurden {self.verworfen} Logzeilen verworfen.')
+
+
+_log_schreiber = None  # Bereits gestarteter LogSchreiber, höchstens einer je Prozess
+
+
+def log_schreiber_holen(konf: dict):
+    """Gibt den LogSchreiber des Prozesses zurück und startet ihn beim ersten Aufruf. Beim Programmende werden alle
+    wartenden Zeilen automatisch geschrieben.
+
+    :param konf: dict-Objekt mit der aktuellen Konfiguration
+    :return: LogSchreiber-Objekt
+    """
+    import atexit
+    global _log_schreiber
+
+    if _log_schreiber is None:
+        _log_schreiber = LogSchreiber(konf['log_warteschlange_max'], konf['log_flush_zeilen'], konf['log_flush_s'])
+        atexit.register(_log_schreiber.beenden)
+    return _log_schreiber
+
+
+LOG_GZIP_ENDUNG = '.gz'  # Komprimierte Logdateien heißen wie die unkomprimierten plus diese Endung
+LOG_GZIP_STUFE = 6  # Stufe 9 macht die Logs kaum kleiner, braucht auf dem Pi aber ein Vielfaches an Rechenzeit
+LOG_ROTATION_PRUEFEN_S = 3600  # Abstand der Durchgänge der LogRotation in Sekunden
+LOG_ROTATION_RUHE_S = 600  # Dateien, die vor weniger Sekunden geändert wurden, werden noch nicht komprimiert
+
+
+def log_datei_name(name: str):
+    """Name, unter dem eine Logdatei tatsächlich liegt: unkomprimiert oder komprimiert (name + LOG_GZIP_ENDUNG).
+
+    :param name: Name der unkomprimierten Logdatei
+    :return: Vorhandener Dateiname, None falls es die Logdatei nicht gibt
+    """
+    import os
+
+    for kandidat in (name, name + LOG_GZIP_ENDUNG):
+        if os.path.isfile(kandidat):
+            return kandidat
+    return None
+
+
+def log_datei_oeffnen(name: str, modus: str = 'r', **optionen):
+    """Öffnet eine Logdatei zum Lesen wie open(), eine komprimierte Logdatei transparent über gzip.
+
+    :param name: Name der unkomprimierten Logdatei, ein Name mit LOG_GZIP_ENDUNG geht auch
+    :param modus: "r" für Text oder "rb" für bytes
+    :param optionen: Weitere Parameter für open() bzw. gzip.open(), z.B. newline=''
+    :return: Dateiobjekt
+    """
+    import gzip
+
+    gefunden = log_datei_name(name)
+    if gefunden is None:
+        raise FileNotFoundError(f'Logdatei <{name}> gibt es weder unkomprimiert noch komprimiert')
+    if gefunden.endswith(LOG_GZIP_ENDUNG):
+        return gzip.open(gefunden, 'rb' if 'b' in modus else 'rt', **optionen)
+    return open(gefunden, modus, **optionen)
+
+
+def log_abbild(name: str):
+    """Kontextmanager zum schnellen Lesen einer Logdatei: unkomprimiert per mmap, komprimiert als gzip-Datenstrom, der
+    beim Lesen entpackt wird. Beide können readline, seek und tell, eine leere Datei ergibt ein leeres BytesIO-Objekt.
+
+    :param name: Name der unkomprimierten Logdatei
+    :return: Kontextmanager mit einem mmap-, GzipFile- oder BytesIO-Objekt
+    """
+    import contextlib
+    import io
+    import mmap
+    import os
+
+    @contextlib.contextmanager
+    def abbilden():
+        with log_datei_oeffnen(name, 'rb') as datei:
+            if not isinstance(datei, io.BufferedReader):  # Komprimiert
+                yield datei
+            elif not os.fstat(datei.fileno()).st_size:
+                yield io.BytesIO()
+            else:
+                with mmap.mmap(datei.fileno(), 0, access=mmap.ACCESS_READ) as abbild:
+                    yield abbild
+    return abbilden()
+
+
+def log_komprimieren(name: str):
+    """Komprimiert eine Logdatei zu name + LOG_GZIP_ENDUNG und löscht danach das Original. Die Änderungszeit bleibt
+    erhalten, damit z.B. der Zeitindex einer CSV-Datei gültig bleibt (siehe log_index_lesen). Gibt es schon eine
+    komprimierte Datei, wird angehängt: hintereinander geschriebene gzip-Member ergeben wieder eine gzip-Datei.
+
+    Geschrieben wird in eine .tmp-Datei, die erst nach fsync die komprimierte Datei ersetzt. Ein Stromausfall
+    hinterlässt so nie eine unvollständige komprimierte Datei, deren Original schon gelöscht ist.
+
+    :param name: Name der unkomprimierten Logdatei
+    :return: Tuple aus der Größe vorher und nachher in Bytes
+    """
+    import gzip
+    import os
+    import shutil
+
+    ziel = name + LOG_GZIP_ENDUNG
+    groesse = os.path.getsize(name)
+    with open(ziel + '.tmp', 'wb') as tmp:
+        if os.path.isfile(ziel):
+            with open(ziel, 'rb') as vorhanden:
+                shutil.copyfileobj(vorhanden, tmp, 1 << 20)
+        with open(name, 'rb') as quelle, \
+                gzip.GzipFile(fileobj=tmp, mode='wb', compresslevel=LOG_GZIP_STUFE) as komprimiert:
+            shutil.copyfileobj(quelle, komprimiert, 1 << 20)
+        tmp.flush()
+        os.fsync(tmp.fileno())
+    shutil.copystat(name, ziel + '.tmp')
+    os.replace(ziel + '.tmp', ziel)
+    verzeichnis = os.open(os.path.dirname(ziel) or '.', os.O_RDONLY)
+    try:
+        os.fsync(verzeichnis)  # Auch die Umbenennung muss sicher sein, bevor das Original gelöscht wird
+    finally:
+        os.close(verzeichnis)
+    os.remove(name)
+    return groesse, os.path.getsize(ziel)
+
+
+def log_rotieren(verzeichnis: str, komprimieren: bool, aufbewahren_tage: float, max_mb: float, konf: dict) -> dict:
+    """Ein Durchgang der Log-Rotation über alle Tages-Logs (Dateinamen beginnen mit JJJJ-MM-TT-) im Verzeichnis:
+    Logs abgeschlossener Tage komprimieren, dann Tage löschen, die älter als aufbewahren_tage sind, und zuletzt die
+    ältesten Tage löschen, solange alle Logs zusammen größer als max_mb sind. Der laufende Tag bleibt unangetastet.
+
+    :param verzeichnis: Verzeichnis der Logdateien
+    :param komprimieren: Bool-Wert, ob abgeschlossene Tages-Logs komprimiert werden
+    :param aufbewahren_tage: Maximales Alter in Tagen, 0 = unbegrenzt
+    :param max_mb: Maximale Gesamtgröße in MB, 0 = unbegrenzt
+    :param konf: dict-Objekt mit der aktuellen Konfiguration (für log_event)
+    :return: dict-Objekt mit den Anzahlen 'komprimiert' und 'geloescht' (Dateien)
+    """
+    import os
+    import re
+    import time
+
+    heute = time.strftime('%Y-%m-%d')
+    tage = {}  # JJJJ-MM-TT → [Dateinamen]
+    for datei in os.listdir(verzeichnis):
+        pfad = os.path.join(verzeichnis, datei)
+        if datei.endswith(LOG_GZIP_ENDUNG + '.tmp'):  # Rest eines abgebrochenen Durchgangs
+            os.remove(pfad)
+        elif re.match(r'\d{4}-\d{2}-\d{2}-', datei) and os.path.isfile(pfad):
+            tage.setdefault(datei[:10], []).append(pfad)
+    ergebnis = {'komprimiert': 0, 'geloescht': 0}
+
+    if komprimieren:
+        vorher = nachher = 0
+        for tag, dateien in tage.items():
+            for nummer, pfad in enumerate(dateien):
+                if tag >= heute or pfad.endswith((LOG_GZIP_ENDUNG, '.idx')) \
+                        or os.path.getmtime(pfad) > time.time() - LOG_ROTATION_RUHE_S:
+                    continue  # Der Zeitindex bleibt unkomprimiert, er wird als Ganzes gelesen und ist klein
+                groesse = log_komprimieren(pfad)
+                vorher, nachher = vorher + groesse[0], nachher + groesse[1]
+                dateien[nummer] = pfad + LOG_GZIP_ENDUNG
+                ergebnis['komprimiert'] += 1
+        if ergebnis['komprimiert']:
+            log_event(f'Log-Rotation: {ergebnis["komprimiert"]} Logdateien komprimiert, {vorher / 1e6:.1f} MB → '
+                      f'{nachher / 1e6:.1f} MB.', konf)
+
+    alte_tage = sorted(tag for tag in tage if tag < heute)
+    grenze = time.strftime('%Y-%m-%d', time.localtime(time.time() - aufbewahren_tage * 86400))
+    gesamt = sum(os.path.getsize(pfad) for dateien in tage.values() for pfad in dateien)
+    for tag in alte_tage:
+        if not (aufbewahren_tage and tag < grenze) and not (max_mb and gesamt > max_mb * 1e6):
+            break  # Tage sind sortiert, alle weiteren sind jünger
+        for pfad in tage[tag]:
+            gesamt -= os.path.getsize(pfad)
+            os.remove(pfad)
+            ergebnis['geloescht'] += 1
+        log_event(f'Log-Rotation: Logs vom {tag} gelöscht ({len(tage[tag])} Dateien).', konf)
+    return ergebnis
+
+
+class LogRotation:
+    """Komprimiert und löscht Logs in einem Hintergrund-Thread (siehe log_rotieren), einmal beim Start und dann alle
+    LOG_ROTATION_PRUEFEN_S Sekunden. Das Komprimieren großer Logs dauert auf dem Pi einige Sekunden, die Hauptschleife
+    wartet darauf nicht.
+    """
+
+    def __init__(self, konf: dict, verzeichnis: str = 'logs'):
+        import threading
+
+        self.konf = konf
+        self.verzeichnis = verzeichnis
+        self.stopp = threading.Event()
+        self.thread = threading.Thread(target=self._arbeiten, name='LogRotation', daemon=True)
+        self.thread.start()
+
+    def _arbeiten(self):
+        while True:
+            try:
+                log_rotieren(self.verzeichnis, self.konf['log_komprimieren'], self.konf['log_aufbewahren_tage'],
+                             self.konf['log_max_mb'], self.konf)
+            except Exception as rotation_err:  # Nächster Durchgang versucht es erneut, Logs schreiben geht weiter
+                print(f'!!!!Fehler bei der Log-Rotation im Verzeichnis <{self.verzeichnis}>: {rotation_err}')
+            if self.stopp.wait(LOG_ROTATION_PRUEFEN_S):
+                return
+
+    def beenden(self, timeout: float = 10):
+        """Beendet den Hintergrund-Thread, ein laufendes Komprimieren wird noch abgeschlossen.
+
+        :param timeout: Maximale Wartezeit in Sekunden
+        """
+        self.stopp.set()
+        self.thread.join(timeout)
+
+
+def log_rotation_starten(konf: dict, verzeichnis: str = 'logs'):
+    """Startet die LogRotation, falls konf['log_komprimieren'], konf['log_aufbewahren_tage'] oder konf['log_max_mb']
+    gesetzt ist.
+
+    :param konf: dict-Objekt mit der aktuellen Konfiguration
+    :param verzeichnis: Verzeichnis der Logdateien
+    :return: LogRotation-Objekt oder None, falls deaktiviert
+    """
+    if not (konf['log_komprimieren'] or konf['log_aufbewahren_tage'] or konf['log_max_mb']):
+        return None
+    return LogRotation(konf, verzeichnis)
+
+
+# Messwerte, deren Änderung beim Logging mit log_nur_aenderungen einen neuen Eintrag auslöst
+LOG_AENDERUNG_FELDER = {'goe': ('nrg', 'amp', 'car', 'alw', 'err', 'stp'),
+                        'sb': ('Production_W', 'Consumption_W', 'GridFeedIn_W', 'Pac_total_W', 'USOC',
+                               'BatteryCharging', 'BatteryDischarging')}
+_log_zuletzt = {}  # objekt → (Schreibzeit, zeitstempel, Messwerte) des zuletzt geschriebenen Eintrags
+
+
+def _log_wert_veraendert(alt, neu, totband: float) -> bool:
+    """Vergleicht zwei Messwerte: Zahlen (auch als String) mit Totband, Listen elementweise, alles andere auf Gleichheit.
+    """
+    if isinstance(neu, list) and isinstance(alt, list):
+        return len(alt) != len(neu) or any(_log_wert_veraendert(a, n, totband) for a, n in zip(alt, neu))
+    try:
+        return abs(float(neu) - float(alt)) > totband
+    except (TypeError, ValueError):
+        return neu != alt
+
+
+def log_aenderung_pruefen(objekt: str, objekt_status: dict, konf: dict) -> bool:
+    """Entscheidet beim Logging nur mit Änderungen, ob ein Eintrag geschrieben werden soll. Das ist der Fall, wenn
+
+    - der zeitstempel des Geräts neu ist (also nicht das zwischengespeicherte Objekt aus daten_holen) und sich ein
+      Messwert aus LOG_AENDERUNG_FELDER um mehr als konf['log_totband'] geändert hat, oder
+    - seit dem letzten Eintrag konf['log_keyframe_s'] Sekunden vergangen sind (Stützpunkt für die Zeitachse).
+
+    :param objekt: "goe" oder "sb"
+    :param objekt_status: dict-Objekt aus GeraeteStatus.als_dict, das geloggt werden soll
+    :param konf: dict-Objekt mit der aktuellen Konfiguration
+    :return: Bool-Wert True falls geschrieben werden soll
+    """
+    import time
+
+    jetzt = time.time()
+    messwerte = [objekt_status.get(feld) for feld in LOG_AENDERUNG_FELDER.get(objekt.partition('-')[0], ())]
+    if objekt in _log_zuletzt:
+        zeit_alt, zeitstempel_alt, messwerte_alt = _log_zuletzt[objekt]
+        if jetzt - zeit_alt < konf['log_keyframe_s']:
+            if objekt_status.get('zeitstempel') == zeitstempel_alt:
+                return False
+            if not any(_log_wert_veraendert(alt, neu, konf['log_totband'])
+                       for alt, neu in zip(messwerte_alt, messwerte)):
+                return False
+    _log_zuletzt[objekt] = (jetzt, objekt_status.get('zeitstempel'), messwerte)
+    return True
+
+
+def log_nrg(objekt: str, objekt_status: GeraeteStatus, konf: dict):
+    """Erstellt bzw. aktualisiert eine Logdatei mit dem heutigen Datum als Dateinamen im relativen Verzeichnis logs.
+    Geschrieben wird im Hintergrund durch den LogSchreiber. Mit konf['log_format'] == 'binaer' wird statt der CSV-Datei
+    das kompakte Binär-Log geschrieben, siehe binaerlog_schreiben. Mit konf['log_nur_aenderungen'] werden nur neue
+    Messwerte geschrieben, siehe log_aenderung_pruefen.
+
+    :param objekt: Kann "goe" oder "sb" sein, für weitere Go-eCharger auch "goe-<Name>". Wird für die Logdatei als
+        Suffix gebraucht, der Teil vor dem ersten - bestimmt die Felder im Binär-Log
+    :param objekt_status: GoEStatus- bzw. SBStatus-Objekt, geloggt werden seine JSON-Daten (siehe als_dict)
+    :param konf: dict-Objekt mit der aktuellen Konfiguration
+    :return: Bool-Wert True falls erfolgreich eingereiht, False falls nicht erfolgreich
+    """
+    import time
+
+    if konf['logging_nrg']:
+        objekt_status = objekt_status.als_dict()
+        if konf['log_nur_aenderungen'] and not log_aenderung_pruefen(objekt, objekt_status, konf):
+            return True  # Nichts Neues, nichts zu schreiben
+        if konf['log_format'] == 'binaer':
+            return binaerlog_schreiben(objekt, objekt_status, konf)
+        jetzt = time.localtime()
+        log_name = f'logs/{time.strftime("%Y-%m-%d", jetzt)}-{objekt}-log.csv'
+        kopf = 'Uhrzeit_F;' + ''.join(f'{parameter};' for parameter in objekt_status) + '\n'
+        zeile = f'{time.strftime("%H:%M:%S", jetzt)};' + ''.join(f'{wert};' for wert in objekt_status.values()) + '\n'
+        index = (int(time.mktime(jetzt)), _kommazahl(objekt_status.get('zeitstempel')))
+        return log_schreiber_holen(konf).schreiben(log_name, zeile, kopf, index)
+    return False
+
+
+_log_event_kopf = (None, '')  # (Name der sys-log-Datei, Kopf mit der Konfiguration) für log_event
+
+
+def log_event(meldung: str, konf: dict):
+    """Programm-Meldungen loggen (bekommt einen String, loggt ihn mit Zeitstempel und gibt ihn per print aus).
+    Geschrieben wird im Hintergrund durch den LogSchreiber.
+
+    :param meldung: Text der Meldung
+    :param konf: dict-Objekt mit der aktuellen Konfiguration
+    """
+    import time
+    global _log_event_kopf
+
+    print(f'    {meldung}')
+    if konf['logging_events']:
+        log_name = f'logs/{time.strftime("%Y-%m-%d")}-sys-log.csv'
+
+        # Aktuelle Konfiguration in den Kopf einer neu erstellten Logdatei schreiben. Der Kopf wird nur einmal je
+        # Logdatei zusammengesetzt, nicht bei jeder Meldung
+        if _log_event_kopf[0] != log_name:
+            _log_event_kopf = (log_name,
+                               f'Logdatei {log_name}, erstellt vom SB-GoE-Überschussladen von Musicaloris.\n'
+                               f'Programmstart um {time.strftime("%H:%M:%S")}. Aktuelle Konfiguration:\n'
+                               + ''.join(f'{config_wert} = {konf[config_wert]}\n' for config_wert in konf)
+                               + '\nMeldungen:\n')
+        log_schreiber_holen(konf).schreiben(log_name, f'{time.strftime("%H:%M:%S")}: {meldung}\n',
+                                            _log_event_kopf[1])
+
+
+def _ganzzahl(wert) -> int:
+    """Wandelt einen Wert aus JSON oder CSV (z.B. '6', 6, 'None') in int, fehlende Werte werden 0."""
+    if wert is None or wert in ('', 'None'):
+        return 0
+    return int(float(wert))
+
+
+def _kommazahl(wert) -> float:
+    """Wandelt einen Wert aus JSON oder CSV in float, fehlende Werte werden NaN."""
+    if wert is None or wert in ('', 'None'):
+        return float('nan')
+    return float(wert)
+
+
+def _wahrheitswert(wert) -> bool:
+    """Wandelt einen Wert aus JSON (True) oder CSV ('True') in bool."""
+    return wert if isinstance(wert, bool) else str(wert) == 'True'
+
+
+def _nrg_liste(wert) -> list:
+    """Wandelt das nrg-Zahlenfeld aus JSON (Liste) oder CSV ('[223, 225, ...]') in eine Liste mit 16 int."""
+    import json
+
+    if isinstance(wert, str):
+        wert = json.loads(wert) if wert.startswith('[') else []
+    return (list(wert) + [0] * 16)[:16]
+
+
+def _sb_zeit_kodieren(wert) -> int:
+    """SB-Timestamp '2023-06-16 14:49:25' (UTC) → Unix-Sekunden"""
+    import calendar
+    import time
+
+    if not wert or wert == 'None':
+        return 0
+    return calendar.timegm(time.strptime(wert, '%Y-%m-%d %H:%M:%S'))
+
+
+def _sb_zeit_dekodieren(wert: int) -> str:
+    """Unix-Sekunden → SB-Timestamp '2023-06-16 14:49:25' (UTC)"""
+    import time
+
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(wert))
+
+
+# Satzaufbau der Binär-Logs: (Feldname, struct-Code, kodieren, dekodieren). Alle anderen Felder gelten als statisch und
+# stehen nur bei Änderungen im Kopf. zeitpunkt ist die Schreibzeit in Unix-Sekunden (entspricht Uhrzeit_F der CSV).
+BINAERLOG_FELDER = {
+    'goe': (('zeitpunkt', 'I', int, int),
+            ('zeitstempel', 'd', _kommazahl, float),
+            ('abrufdauer', 'f', _kommazahl, float),
+            ('nrg', '16h', _nrg_liste, list),
+            ('amp', 'B', _ganzzahl, str),
+            ('car', 'B', _ganzzahl, str),
+            ('alw', 'B', _ganzzahl, str),
+            ('err', 'B', _ganzzahl, str),
+            ('stp', 'B', _ganzzahl, str),
+            ('tmp', 'b', _ganzzahl, str),
+            ('tme', 'I', _ganzzahl, lambda wert: f'{wert:010d}'),
+            ('rbt', 'I', _ganzzahl, str),
+            ('dws', 'I', _ganzzahl, str),
+            ('eto', 'I', _ganzzahl, str)),
+    'sb': (('zeitpunkt', 'I', int, int),
+           ('zeitstempel', 'd', _kommazahl, float),
+           ('abrufdauer', 'f', _kommazahl, float),
+           ('Production_W', 'i', _ganzzahl, int),
+           ('Consumption_W', 'i', _ganzzahl, int),
+           ('Consumption_Avg', 'i', _ganzzahl, int),
+           ('GridFeedIn_W', 'i', _ganzzahl, int),
+           ('Pac_total_W', 'i', _ganzzahl, int),
+           ('RemainingCapacity_Wh', 'i', _ganzzahl, int),
+           ('Apparent_output', 'i', _ganzzahl, int),
+           ('Sac1', 'i', _ganzzahl, int),
+           ('USOC', 'B', _ganzzahl, int),
+           ('RSOC', 'B', _ganzzahl, int),
+           ('Uac', 'H', _ganzzahl, int),
+           ('Ubat', 'H', _ganzzahl, int),
+           ('Fac', 'f', _kommazahl, float),
+           ('Timestamp', 'I', _sb_zeit_kodieren, _sb_zeit_dekodieren),
+           ('BatteryCharging', '?', _wahrheitswert, bool),
+           ('BatteryDischarging', '?', _wahrheitswert, bool),
+           ('FlowConsumptionBattery', '?', _wahrheitswert, bool),
+           ('FlowConsumptionGrid', '?', _wahrheitswert, bool),
+           ('FlowConsumptionProduction', '?', _wahrheitswert, bool),
+           ('FlowGridBattery', '?', _wahrheitswert, bool),
+           ('FlowProductionBattery', '?', _wahrheitswert, bool),
+           ('FlowProductionGrid', '?', _wahrheitswert, bool)),
+}
+BINAERLOG_VERSION = 1
+_binaerlog_statisch = {}  # Kopfdatei → zuletzt geschriebene statische Felder
+_binaerlog_letzter_fehler = None  # Gleichen Kodierfehler nicht bei jedem Datensatz ausgeben
+
+
+def binaerlog_satzformat(objekt: str) -> str:
+    """Gibt das struct-Format eines Datensatzes im Binär-Log zurück (little-endian, ohne Füllbytes).
+
+    :param objekt: "goe" oder "sb"
+    :return: Formatstring für das struct-Modul
+    """
+    return '<' + ''.join(feld[1] for feld in BINAERLOG_FELDER[objekt.partition('-')[0]])
+
+
+def binaerlog_kodieren(objekt: str, objekt_status: dict, zeitpunkt: int):
+    """Trennt einen Gerätestatus in einen Datensatz fester Breite und die statischen Felder.
+
+    :param objekt: "goe" oder "sb"
+    :param objekt_status: dict-Objekt aus GeraeteStatus.als_dict oder eine Zeile aus einer CSV-Logdatei
+    :param zeitpunkt: Schreibzeit in Unix-Sekunden
+    :return: Tuple aus dem Datensatz als bytes und einem dict-Objekt mit den statischen Feldern
+    """
+    import struct
+
+    werte = []
+    for name, _, kodieren, _ in BINAERLOG_FELDER[objekt.partition('-')[0]][1:]:
+        wert = kodieren(objekt_status.get(name))
+        if isinstance(wert, list):
+            werte.extend(wert)
+        else:
+            werte.append(wert)
+    dynamisch = {feld[0] for feld in BINAERLOG_FELDER[objekt.partition('-')[0]]} | {'Uhrzeit_F'}
+    statisch = {name: wert for name, wert in objekt_status.items() if name not in dynamisch}
+    return struct.pack(binaerlog_satzformat(objekt), zeitpunkt, *werte), statisch
+
+
+def binaerlog_namen(objekt: str, datum: str, verzeichnis: str = 'logs'):
+    """Dateinamen des Binär-Logs eines Tages.
+
+    :param objekt: "goe" oder "sb"
+    :param datum: Datum im Format JJJJ-MM-TT
+    :param verzeichnis: Verzeichnis der Logdateien
+    :return: Tuple aus dem Namen der Datensatz-Datei (.bin) und dem der Kopfdatei (.jsonl)
+    """
+    return f'{verzeichnis}/{datum}-{objekt}-log.bin', f'{verzeichnis}/{datum}-{objekt}-kopf.jsonl'
+
+
+def binaerlog_formatkopf(objekt: str) -> str:
+    """Erste Zeile der Kopfdatei: beschreibt den Satzaufbau, damit die Datei ohne diesen Code gelesen werden kann."""
+    import json
+
+    return json.dumps({'version': BINAERLOG_VERSION, 'objekt': objekt, 'satzformat': binaerlog_satzformat(objekt),
+                       'felder': [feld[0] for feld in BINAERLOG_FELDER[objekt.partition('-')[0]]]}) + '\n'
+
+
+def binaerlog_statisch_zeile(statisch_alt: dict, statisch: dict, zeitpunkt: int) -> str:
+    """Kopfzeile mit den statischen Feldern, die sich gegenüber statisch_alt geändert haben, leer falls keine. Felder,
+    die der Gerätestatus nicht mehr enthält, stehen unter 'entfernt'.
+
+    :param statisch_alt: Zuletzt geschriebene statische Felder
+    :param statisch: Aktuelle statische Felder
+    :param zeitpunkt: Ab diesem zeitpunkt (Unix-Sekunden) gelten die Werte
+    :return: JSON-Zeile inkl. Zeilenumbruch oder ''
+    """
+    import json
+
+    aenderungen = {name: wert for name, wert in statisch.items()
+                   if name not in statisch_alt or statisch_alt[name] != wert}
+    entfernt = [name for name in statisch_alt if name not in statisch]
+    if not aenderungen and not entfernt:
+        return ''
+    eintrag = {'ab_zeitpunkt': zeitpunkt, 'statisch': aenderungen}
+    if entfernt:
+        eintrag['entfernt'] = entfernt
+    return json.dumps(eintrag, default=str) + '\n'
+
+
+def binaerlog_schreiben(objekt: str, objekt_status: dict, konf: dict) -> bool:
+    """Schreibt einen Gerätestatus ins kompakte Binär-Log im Verzeichnis logs. Je Tag und Gerät gibt es zwei Dateien:
+
+    - JJJJ-MM-TT-<objekt>-log.bin: Datensätze fester Breite (siehe BINAERLOG_FELDER) ohne Kopf, lassen sich direkt
+      als Array einlesen bzw. per mmap abbilden (binaerlog_array)
+    - JJJJ-MM-TT-<objekt>-kopf.jsonl: Satzaufbau und alle übrigen, statischen Felder, ab dem zweiten Eintrag nur noch
+      die geänderten bzw. weggefallenen Felder mit dem Zeitpunkt, ab dem das gilt
+
+    Passt ein Wert nicht in sein Feld (z.B. ein negativer Wert in einem vorzeichenlosen Feld), wird der Datensatz wie
+    eine Zeile bei voller Warteschlange verworfen und gezählt.
+
+    :param objekt: "goe" oder "sb"
+    :param objekt_status: dict-Objekt aus GeraeteStatus.als_dict, das geloggt werden soll
+    :param konf: dict-Objekt mit der aktuellen Konfiguration
+    :return: Bool-Wert True falls erfolgreich eingereiht, False falls nicht erfolgreich
+    """
+    import struct
+    import time
+    global _binaerlog_letzter_fehler
+
+    zeitpunkt = int(time.time())
+    bin_name, kopf_name = binaerlog_namen(objekt, time.strftime('%Y-%m-%d', time.localtime(zeitpunkt)))
+    schreiber = log_schreiber_holen(konf)
+    try:
+        satz, statisch = binaerlog_kodieren(objekt, objekt_status, zeitpunkt)
+    except (struct.error, OverflowError, ValueError) as kodier_err:
+        schreiber.verworfen += 1
+        metriken_holen().zaehlen('sbgoe_log_verworfen_total')
+        if str(kodier_err) != _binaerlog_letzter_fehler:
+            print(f'!!!!Datensatz für <{bin_name}> lässt sich nicht kodieren und wird verworfen: {kodier_err}')
+            _binaerlog_letzter_fehler = str(kodier_err)
+        return False
+
+    statisch_zeile = binaerlog_statisch_zeile(_binaerlog_statisch.get(kopf_name, {}), statisch, zeitpunkt)
+    if statisch_zeile:
+        if not schreiber.schreiben(kopf_name, statisch_zeile, binaerlog_formatkopf(objekt)):
+            return False  # Statische Felder beim nächsten Mal erneut versuchen
+        _binaerlog_statisch[kopf_name] = statisch
+    return schreiber.schreiben(bin_name, satz)
+
+
+def _binaerlog_kopf_lesen(kopf_name: str):
+    """Liest die Kopfdatei eines Binär-Logs.
+
+    :return: Tuple aus dem Formatkopf (dict) und der Liste der Einträge mit statischen Feldern
+    """
+    import json
+
+    with log_datei_oeffnen(kopf_name) as kopf:
+        formatkopf = json.loads(kopf.readline())
+        if formatkopf['version'] != BINAERLOG_VERSION:
+            raise ValueError(f'Unbekannte Version {formatkopf["version"]} des Binär-Logs <{kopf_name}>')
+        return formatkopf, [json.loads(zeile) for zeile in kopf if zeile.strip()]
+
+
+def binaerlog_array(bin_name: str):
+    """Bildet die Datensätze eines Binär-Logs per mmap als NumPy-Array ab, ohne sie zu kopieren. Ein komprimiertes
+    Binär-Log wird dazu im Speicher entpackt. Benötigt NumPy.
+
+    :param bin_name: Name der .bin-Datei
+    :return: numpy.memmap bzw. numpy.ndarray mit strukturiertem dtype, Feldnamen wie in BINAERLOG_FELDER
+    """
+    import os
+    import numpy as np
+
+    objekt = os.path.basename(bin_name)[11:-len('-log.bin')].partition('-')[0]  # JJJJ-MM-TT-<objekt>-log.bin
+    dtype_codes = {'I': '<u4', 'i': '<i4', 'H': '<u2', 'h': '<i2', 'B': 'u1', 'b': 'i1', 'd': '<f8', 'f': '<f4',
+                   '?': '?'}
+    dtype = np.dtype([(name, dtype_codes[code[-1]], (int(code[:-1]),)) if len(code) > 1
+                      else (name, dtype_codes[code]) for name, code, _, _ in BINAERLOG_FELDER[objekt]])
+    if log_datei_name(bin_name).endswith(LOG_GZIP_ENDUNG):
+        with log_datei_oeffnen(bin_name, 'rb') as bin_datei:
+            inhalt = bin_datei.read()
+        return np.frombuffer(inhalt, dtype=dtype, count=len(inhalt) // dtype.itemsize)
+    anzahl = os.path.getsize(bin_name) // dtype.itemsize  # Unvollständigen letzten Satz ignorieren
+    if not anzahl:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(bin_name, dtype=dtype, mode='r', shape=(anzahl,))
+
+
+def binaerlog_lesen(bin_name: str, ab_zeitpunkt: int = None):
+    """Liest ein Binär-Log zeilenweise als dict-Objekte im Aufbau der bisherigen CSV-Logs (inkl. Uhrzeit_F und der
+    statischen Felder). Die .bin-Datei wird per mmap gelesen und nicht komplett in den Speicher geladen, eine
+    komprimierte .bin-Datei wird entpackt.
+
+    :param bin_name: Name der .bin-Datei, die Kopfdatei wird daneben gesucht
+    :param ab_zeitpunkt: Erst ab diesem zeitpunkt (Unix-Sekunden) lesen, der Einstieg wird per binärer Suche über die
+        Datensätze fester Breite gefunden
+    :return: Generator mit einem dict-Objekt je Datensatz
+    """
+    import mmap
+    import struct
+    import time
+
+    kopf_name = bin_name[:-len('log.bin')] + 'kopf.jsonl'
+    formatkopf, statisch_eintraege = _binaerlog_kopf_lesen(kopf_name)
+    felder = BINAERLOG_FELDER[formatkopf['objekt'].partition('-')[0]]
+    satzformat = struct.Struct(formatkopf['satzformat'])
+
+    with log_abbild(bin_name) as abbild:
+        if not isinstance(abbild, mmap.mmap):  # Komprimiert: für die binäre Suche entpackt im Speicher
+            abbild = abbild.read()
+        statisch = {}
+        naechster = 0
+        anzahl = len(abbild) // satzformat.size
+        start, ende = 0, anzahl
+        while ab_zeitpunkt is not None and start < ende:  # zeitpunkt ist das erste Feld jedes Datensatzes
+            mitte = (start + ende) // 2
+            if struct.unpack_from('<I', abbild, mitte * satzformat.size)[0] < ab_zeitpunkt:
+                start = mitte + 1
+            else:
+                ende = mitte
+        for werte in satzformat.iter_unpack(memoryview(abbild)[start * satzformat.size:anzahl * satzformat.size]):
+            while naechster < len(statisch_eintraege) and statisch_eintraege[naechster]['ab_zeitpunkt'] <= werte[0]:
+                statisch |= statisch_eintraege[naechster]['statisch']
+                for name in statisch_eintraege[naechster].get('entfernt', ()):
+                    statisch.pop(name, None)
+                naechster += 1
+            zeile = {'Uhrzeit_F': time.strftime('%H:%M:%S', time.localtime(werte[0]))} | statisch
+            position = 0
+            for name, code, _, dekodieren in felder:
+                if code == '16h':
+                    zeile[name] = list(werte[position:position + 16])
+                    position += 16
+                else:
+                    zeile[name] = dekodieren(werte[position])
+                    position += 1
+            yield zeile
+
+
+def csv_log_konvertieren(csv_name: str, verzeichnis: str):
+    """Wandelt eine bestehende CSV-Logdatei (JJJJ-MM-TT-goe-log.csv bzw. -sb-log.csv) in das Binär-Log um.
+
+    :param csv_name: Pfad der CSV-Logdatei
+    :param verzeichnis: Zielverzeichnis für .bin- und Kopfdatei
+    :return: Tuple aus den Namen der erstellten .bin- und Kopfdatei
+    """
+    import csv
+    import os
+    import time
+
+    datei = os.path.basename(csv_name)
+    datum, objekt = datei[:10], datei[11:].split('-')[0]
+    if objekt not in BINAERLOG_FELDER:
+        raise ValueError(f'<{csv_name}> ist keine goe- oder sb-Logdatei')
+    bin_name, kopf_name = binaerlog_namen(objekt, datum, verzeichnis)
+
+    statisch_alt = {}
+    with log_datei_oeffnen(csv_name, newline='') as csv_datei, open(bin_name, 'wb') as bin_datei, \
+            open(kopf_name, 'w') as kopf_datei:
+        kopf_datei.write(binaerlog_formatkopf(objekt))
+        leser = csv.reader(csv_datei, delimiter=';')
+        spalten = next(leser)
+        for werte in leser:
+            if not werte:
+                continue
+            zeile = dict(zip(spalten, werte))
+            zeile.pop('', None)  # Leere Spalte durch das abschließende ; jeder Zeile
+            zeitpunkt = int(time.mktime(time.strptime(f'{datum} {zeile["Uhrzeit_F"]}', '%Y-%m-%d %H:%M:%S')))
+            satz, statisch = binaerlog_kodieren(objekt, zeile, zeitpunkt)
+            kopf_datei.write(binaerlog_statisch_zeile(statisch_alt, statisch, zeitpunkt))
+            statisch_alt = statisch
+            bin_datei.write(satz)
+    return bin_name, kopf_name
+
+
+# Felder, die goe_ladeleistung_bestimmen braucht und die energielog_laden daher je Gerät als Array lädt
+REPLAY_FELDER = {'goe': ('nrg', 'amp', 'car', 'alw', 'cbl', 'loe', 'loa'),
+                 'sb': ('BatteryCharging', 'BatteryDischarging', 'GridFeedIn_W', 'Pac_total_W', 'Production_W',
+                        'Consumption_W', 'USOC')}
+
+
+def _energielog_spalten(verzeichnis: str, datum: str, objekt: str) -> dict:
+    """Lädt die in REPLAY_FELDER genannten Spalten eines Tages-Energielogs als NumPy-Arrays, aus dem Binär-Log falls
+    vorhanden, sonst aus der CSV-Datei. Dazu kommt 'zeit' als Schreibzeit in Unix-Sekunden.
+    """
+    import csv
+    import os
+    import time
+    import numpy as np
+
+    bin_name, kopf_name = binaerlog_namen(objekt, datum, verzeichnis)
+    if log_datei_name(bin_name):
+        saetze = binaerlog_array(bin_name)
+        spalten = {'zeit': saetze['zeitpunkt'].astype(np.int64)}
+        _, statisch_eintraege = _binaerlog_kopf_lesen(kopf_name)
+        ab = np.array([eintrag['ab_zeitpunkt'] for eintrag in statisch_eintraege], dtype=np.int64)
+        for feld in REPLAY_FELDER[objekt]:
+            if feld in saetze.dtype.names:
+                spalten[feld] = np.asarray(saetze[feld])
+            else:  # Statisches Feld: für jeden Satz den zuletzt im Kopf geänderten Wert nehmen
+                werte, wert = [], '0'
+                for eintrag in statisch_eintraege:
+                    wert = '0' if feld in eintrag.get('entfernt', ()) else eintrag['statisch'].get(feld, wert)
+                    werte.append(_ganzzahl(wert))
+                position = np.searchsorted(ab, spalten['zeit'], side='right') - 1
+                spalten[feld] = np.where(position >= 0, np.array(werte + [0])[position], 0)
+        return spalten
+
+    with log_datei_oeffnen(f'{verzeichnis}/{datum}-{objekt}-log.csv', newline='') as csv_datei:
+        leser = csv.reader(csv_datei, delimiter=';')
+        kopf = next(leser)
+        positionen = [kopf.index(feld) for feld in ('Uhrzeit_F',) + REPLAY_FELDER[objekt]]
+        zeilen = [[zeile[position] for position in positionen] for zeile in leser
+                  if len(zeile) > max(positionen) and _uhrzeit_gueltig(zeile[0])]
+    tag = time.mktime(time.strptime(datum, '%Y-%m-%d'))
+    spalten = {'zeit': np.array([tag + int(z[0][0:2]) * 3600 + int(z[0][3:5]) * 60 + int(z[0][6:8])
+                                 for z in zeilen], dtype=np.int64)}
+    for nummer, feld in enumerate(REPLAY_FELDER[objekt], start=1):
+        werte = [zeile[nummer] for zeile in zeilen]
+        if feld == 'nrg':
+            spalten[feld] = np.array([wert.strip('[]').split(',') for wert in werte], dtype=np.int64)
+        elif feld.startswith('Battery'):
+            spalten[feld] = np.array([wert == 'True' for wert in werte])
+        else:
+            spalten[feld] = np.array([_ganzzahl(wert) for wert in werte], dtype=np.int64)
+    return spalten
+
+
+def energielog_laden(verzeichnis: str, datum_liste: list) -> dict:
+    """Lädt die Go-E- und SB-Energielogs mehrerer Tage für die Offline-Auswertung mit
+    goe_ladeleistung_bestimmen_vektor. Go-E- und SB-Zeilen werden über ihre Schreibzeit (Uhrzeit_F) zusammengeführt,
+    Zeilen ohne Gegenstück fallen weg. Benötigt NumPy.
+
+    :param verzeichnis: Verzeichnis der Logdateien
+    :param datum_liste: Liste der Tage im Format JJJJ-MM-TT
+    :return: dict-Objekt mit einem NumPy-Array je Feld aus REPLAY_FELDER und 'zeit' (Unix-Sekunden)
+    """
+    import numpy as np
+
+    tage = []
+    for datum in datum_liste:
+        goe = _energielog_spalten(verzeichnis, datum, 'goe')
+        sb = _energielog_spalten(verzeichnis, datum, 'sb')
+        sb_position = np.clip(np.searchsorted(sb['zeit'], goe['zeit'], side='right') - 1, 0, None)
+        passt = (len(sb['zeit']) > 0) & (sb['zeit'][sb_position] == goe['zeit'])
+        tage.append({feld: werte[passt] for feld, werte in goe.items()}
+                    | {feld: werte[sb_position[passt]] for feld, werte in sb.items() if feld != 'zeit'})
+    return {feld: np.concatenate([tag[feld] for tag in tage]) for feld in tage[0]}
+
+
+def csv_log_zeilen(csv_name: str):
+    """Liest eine CSV-Logdatei zeilenweise per mmap (bzw. komprimiert als Datenstrom) als dict-Objekte (Werte als
+    Strings wie in der Datei), ohne sie komplett in den Speicher zu laden.
+
+    :param csv_name: Pfad der CSV-Logdatei
+    :return: Generator mit einem dict-Objekt je Zeile
+    """
+    with log_abbild(csv_name) as abbild:
+        spalten = abbild.readline().decode('utf-8', 'replace').rstrip('\r\n').split(';')
+        for zeile in iter(abbild.readline, b''):
+            werte = zeile.decode('utf-8', 'replace').rstrip('\r\n').split(';')
+            if len(werte) >= len(spalten) > 1:  # Kürzere Zeilen sind abgeschnitten, siehe _uhrzeit_gueltig
+                yield dict(zip(spalten, werte))
+
+
+# Zeitindex der CSV-Energielogs: Datensätze (Unix-Zeit von Uhrzeit_F, zeitstempel, Byte-Position der Zeile)
+LOG_INDEX_FORMAT = '<IdQ'
+LOG_INDEX_ABSTAND_S = 30  # Beim Neuaufbau ein Eintrag je so viele Sekunden, im Betrieb einer je Schreibvorgang
+
+
+def log_index_name(csv_name: str) -> str:
+    """Name der Indexdatei neben einer CSV-Logdatei (JJJJ-MM-TT-goe-log.csv → JJJJ-MM-TT-goe-log.idx)"""
+    return csv_name[:-len('.csv')] + '.idx'
+
+
+def _uhrzeit_gueltig(uhrzeit: str) -> bool:
+    """Prüft eine Uhrzeit_F auf das vollständige Format HH:MM:SS. Die letzte Zeile einer CSV-Logdatei kann nach einem
+    Stromausfall beim Schreiben abgeschnitten sein (z.B. "19:1"), solche Zeilen werden übersprungen."""
+    return (len(uhrzeit) >= 8 and uhrzeit[2] == uhrzeit[5] == ':' and uhrzeit[0:2].isdigit()
+            and uhrzeit[3:5].isdigit() and uhrzeit[6:8].isdigit())
+
+
+def _uhrzeit_unix(datum: str, uhrzeit: str) -> int:
+    """Datum JJJJ-MM-TT und Uhrzeit_F HH:MM:SS (Ortszeit) → Unix-Sekunden, auch an Tagen mit Zeitumstellung"""
+    import time
+
+    return int(time.mktime((int(datum[0:4]), int(datum[5:7]), int(datum[8:10]),
+                            int(uhrzeit[0:2]), int(uhrzeit[3:5]), int(uhrzeit[6:8]), 0, 0, -1)))
+
+
+def log_index_erstellen(csv_name: str) -> int:
+    """Baut den Zeitindex einer bestehenden CSV-Logdatei neu auf, ein Eintrag je LOG_INDEX_ABSTAND_S Sekunden Logzeit.
+    Im Betrieb schreibt der LogSchreiber den Index selbst fort. Bei einer komprimierten CSV-Logdatei zeigen die
+    Byte-Positionen in die entpackten Daten, der Index liegt unkomprimiert daneben.
+
+    :param csv_name: Pfad der CSV-Logdatei (JJJJ-MM-TT-<objekt>-log.csv)
+    :return: Anzahl der Indexeinträge
+    """
+    import os
+    import struct
+
+    datum = os.path.basename(csv_name)[:10]
+    eintraege = bytearray()
+    with log_abbild(csv_name) as abbild:
+        spalten = abbild.readline().decode('utf-8', 'replace').split(';')
+        zeitstempel_spalte = spalten.index('zeitstempel') if 'zeitstempel' in spalten else None
+        naechster = -1
+        position = abbild.tell()
+        for zeile in iter(abbild.readline, b''):
+            if _uhrzeit_gueltig(zeile[:8].decode('ascii', 'replace')):
+                sekunde = int(zeile[0:2]) * 3600 + int(zeile[3:5]) * 60 + int(zeile[6:8])
+                if sekunde >= naechster:
+                    werte = zeile.decode('utf-8', 'replace').split(';')
+                    zeitstempel = float('nan')
+                    if zeitstempel_spalte is not None and len(werte) > zeitstempel_spalte:
+                        zeitstempel = _kommazahl(werte[zeitstempel_spalte])
+                    eintraege += struct.pack(LOG_INDEX_FORMAT, _uhrzeit_unix(datum, werte[0]), zeitstempel,
+                                             position)
+                    naechster = sekunde + LOG_INDEX_ABSTAND_S
+            position += len(zeile)
+    with open(log_index_name(csv_name) + '.tmp', 'wb') as index_datei:
+        index_datei.write(eintraege)
+    os.replace(log_index_name(csv_name) + '.tmp', log_index_name(csv_name))
+    return len(eintraege) // struct.calcsize(LOG_INDEX_FORMAT)
+
+
+def log_index_lesen(csv_name: str, erstellen: bool = True) -> list:
+    """Liest den Zeitindex einer CSV-Logdatei, fehlt er oder ist er älter als die Datei, wird er neu aufgebaut.
+
+    :param erstellen: Bei False wird nie geschrieben (z.B. für reine Leser neben dem laufenden Hauptprogramm), dann
+        wird ein veralteter Index so genutzt, wie er ist, und ohne Index eine leere Liste zurückgegeben. Ein veralteter
+        Index deckt nur den Anfang der Datei ab, seine Positionen bleiben aber gültig.
+    :return: Liste mit Tuples (Unix-Zeit von Uhrzeit_F, zeitstempel, Byte-Position)
+    """
+    import os
+    import struct
+
+    index_name = log_index_name(csv_name)
+    # Die Änderungszeit einer komprimierten CSV-Logdatei ist die der unkomprimierten (siehe log_komprimieren)
+    veraltet = not os.path.isfile(index_name) \
+        or os.path.getmtime(index_name) < os.path.getmtime(log_datei_name(csv_name)) - 60
+    if veraltet and erstellen:
+        log_index_erstellen(csv_name)  # Kein Index oder einer, den der LogSchreiber nicht fortgeschrieben hat
+    elif not os.path.isfile(index_name):
+        return []
+    with open(index_name, 'rb') as index_datei:
+        inhalt = index_datei.read()
+    satz = struct.calcsize(LOG_INDEX_FORMAT)
+    return list(struct.iter_unpack(LOG_INDEX_FORMAT, inhalt[:len(inhalt) // satz * satz]))
+
+
+def energielog_bereich(verzeichnis: str, objekt: str, von: float, bis: float, nach: str = 'Uhrzeit_F',
+                       index_erstellen: bool = True):
+    """Liest nur die Zeilen der Energielogs im Zeitfenster von <= Zeit < bis, auch über mehrere Tage. Binär-Logs werden
+    per binärer Suche über die Datensätze angesprungen, CSV-Logs über ihren Zeitindex (siehe log_index_erstellen).
+
+    :param verzeichnis: Verzeichnis der Logdateien
+    :param objekt: "goe", "goe-<Name>" oder "sb"
+    :param von: Beginn des Zeitfensters in Unix-Sekunden
+    :param bis: Ende des Zeitfensters in Unix-Sekunden (ausschließlich)
+    :param nach: Zeit, nach der gefiltert wird: "Uhrzeit_F" (Schreibzeit) oder "zeitstempel" (Abrufzeit am Gerät)
+    :param index_erstellen: Bei False wird kein Zeitindex angelegt oder neu geschrieben, siehe log_index_lesen
+    :return: Generator mit Tuples aus der Zeit und der Zeile als dict-Objekt
+    """
+    import bisect
+    import datetime
+    import os
+
+    if nach not in ('Uhrzeit_F', 'zeitstempel'):
+        raise ValueError(f'Fehler:  nach hat ungültigen Wert {nach}!')
+    tag = datetime.date.fromtimestamp(von - 60 * (nach == 'zeitstempel'))
+    while tag <= datetime.date.fromtimestamp(bis):
+        datum = tag.isoformat()
+        tag += datetime.timedelta(days=1)
+        bin_name, _ = binaerlog_namen(objekt, datum, verzeichnis)
+        csv_name = f'{verzeichnis}/{datum}-{objekt}-log.csv'
+
+        if log_datei_name(bin_name):
+            # zeitstempel liegt vor der Schreibzeit, daher etwas früher einsteigen und danach filtern
+            for zeile in binaerlog_lesen(bin_name, int(von) - 60 * (nach == 'zeitstempel')):
+                zeit = zeile['zeitpunkt'] if nach == 'Uhrzeit_F' else zeile['zeitstempel']
+                if zeit >= bis:
+                    break
+                if zeit >= von:
+                    yield zeit, zeile
+            continue
+        if not log_datei_name(csv_name) or not os.path.getsize(log_datei_name(csv_name)):
+            continue
+
+        eintraege = log_index_lesen(csv_name, index_erstellen)
+        if nach == 'Uhrzeit_F':
+            schluessel = [eintrag[0] for eintrag in eintraege]
+        else:  # Einträge ohne zeitstempel bekommen die Schreibzeit, die nie früher ist
+            schluessel = [eintrag[1] if eintrag[1] == eintrag[1] else eintrag[0] for eintrag in eintraege]
+        nummer = bisect.bisect_right(schluessel, von) - 1 - (nach == 'zeitstempel')
+        with log_abbild(csv_name) as abbild:  # Komprimiert springt seek durch Entpacken, immer noch ohne Parsen
+            spalten = abbild.readline().decode('utf-8', 'replace').rstrip('\r\n').split(';')
+            if nummer >= 0:
+                abbild.seek(eintraege[nummer][2])
+            for zeile in iter(abbild.readline, b''):
+                werte = zeile.decode('utf-8', 'replace').rstrip('\r\n').split(';')
+                if len(werte) < max(len(spalten), 2) or not _uhrzeit_gueltig(werte[0]):
+                    continue
+                zeile = dict(zip(spalten, werte))
+                zeit = _uhrzeit_unix(datum, werte[0]) if nach == 'Uhrzeit_F' else _kommazahl(zeile.get('zeitstempel'))
+                if zeit >= bis:
+                    break
+                if zeit >= von:
+                    yield zeit, zeile
+
+
+def energielog_zeilen(verzeichnis: str, datum: str, objekt: str):
+    """Liest ein Tages-Energielog zeilenweise, aus dem Binär-Log falls vorhanden, sonst aus der CSV-Datei. Gibt es
+    keins von beiden, ist der Generator leer.
+
+    :param verzeichnis: Verzeichnis der Logdateien
+    :param datum: Tag im Format JJJJ-MM-TT
+    :param objekt: "goe", "goe-<Name>" oder "sb"
+    :return: Generator mit Tuples aus der Schreibzeit in Sekunden seit Mitternacht (Uhrzeit_F) und der Zeile
+    """
+    import os
+
+    bin_name, _ = binaerlog_namen(objekt, datum, verzeichnis)
+    csv_name = f'{verzeichnis}/{datum}-{objekt}-log.csv'
+    if log_datei_name(bin_name):
+        zeilen = binaerlog_lesen(bin_name)
+    elif log_datei_name(csv_name):
+        zeilen = csv_log_zeilen(csv_name)
+    else:
+        return
+    for zeile in zeilen:
+        uhrzeit = zeile['Uhrzeit_F']
+        if not _uhrzeit_gueltig(uhrzeit):
+            continue
+        yield int(uhrzeit[0:2]) * 3600 + int(uhrzeit[3:5]) * 60 + int(uhrzeit[6:8]), zeile
+
+
+def meldungen_fehler_zaehlen(verzeichnis: str, datum: str) -> int:
+    """Zählt die Meldungen mit "Fehler" im Meldungs-Log eines Tages (-sys-log.csv, ältere Versionen -sys-log.txt).
+    Die Konfiguration im Dateikopf wird übersprungen, gelesen wird per mmap (bzw. komprimiert als Datenstrom)
+    unabhängig von der Zeichenkodierung.
+
+    :return: Anzahl der Fehlermeldungen, 0 falls es kein Meldungs-Log gibt
+    """
+    for endung in ('csv', 'txt'):
+        log_name = f'{verzeichnis}/{datum}-sys-log.{endung}'
+        if log_datei_name(log_name):
+            with log_abbild(log_name) as abbild:
+                # Meldungen beginnen mit "HH:MM:SS: ", Zeilen aus dem Konfigurationskopf nicht
+                return sum(1 for zeile in iter(abbild.readline, b'')
+                           if zeile[2:3] == b':' and zeile[8:10] == b': ' and b'Fehler' in zeile)
+    return 0
+
+
+# Summen je Tag aus energielog_tag_auswerten, alle Energien in kWh
+ENERGIELOG_AUSWERTUNG = ('geladen_kwh', 'geladen_dws_kwh', 'pv_kwh', 'batterie_kwh', 'netz_kwh',
+                         'einspeisung_vermieden_kwh', 'eingespeist_kwh', 'bezogen_kwh', 'amp_aenderungen',
+                         'alw_aenderungen', 'goe_fehler', 'meldungen_fehler')
+
+
+def energielog_tag_auswerten(verzeichnis: str, datum: str, objekt: str = 'goe', sb_max_w: float = 4600,
+                             max_luecke_s: float = 600) -> dict:
+    """Wertet die Energielogs eines Tages in einem Durchgang mit konstantem Speicherbedarf aus. Go-E- und SB-Zeilen
+    werden nach ihrer Schreibzeit zusammengeführt, zwischen zwei Zeilen gelten die zuletzt geloggten Werte (passt auch
+    zu log_nur_aenderungen mit log_keyframe_s).
+
+    Die Ladeleistung (nrg[11]) wird dem Netzbezug, dann der Batterie-Entladung und zuletzt der PV zugerechnet; das Auto
+    gilt also als der Verbraucher, der zuerst auf Netz und Batterie zugreift. Als vermiedene Einspeisung zählt der
+    PV-Anteil, den die SonnenBatterie nicht hätte aufnehmen können (voll oder über sb_max_w).
+
+    :param verzeichnis: Verzeichnis der Logdateien
+    :param datum: Tag im Format JJJJ-MM-TT
+    :param objekt: Go-E-Log, "goe" oder "goe-<Name>"
+    :param sb_max_w: Maximale Ladeleistung der SonnenBatterie in W
+    :param max_luecke_s: Längere Abstände zwischen zwei Zeilen (Programm lief nicht) werden nicht mitgezählt
+    :return: dict-Objekt mit 'datum', den Summen aus ENERGIELOG_AUSWERTUNG und 'car_s' (Sekunden je car-Zustand)
+    """
+    import heapq
+
+    ergebnis = {'datum': datum} | dict.fromkeys(ENERGIELOG_AUSWERTUNG, 0) | {'car_s': {}}
+    goe, sb = None, None  # Zuletzt geloggte Werte
+    zeit_alt = 0
+    goe_zeilen = ((zeit, 0, zeile) for zeit, zeile in energielog_zeilen(verzeichnis, datum, objekt))
+    sb_zeilen = ((zeit, 1, zeile) for zeit, zeile in energielog_zeilen(verzeichnis, datum, 'sb'))
+    for zeit, quelle, zeile in heapq.merge(goe_zeilen, sb_zeilen, key=lambda eintrag: eintrag[:2]):
+        dauer = zeit - zeit_alt
+        if goe and 0 < dauer <= max_luecke_s:
+            leistung = goe['leistung']
+            ergebnis['geladen_kwh'] += leistung * dauer
+            ergebnis['car_s'][goe['car']] = ergebnis['car_s'].get(goe['car'], 0) + dauer
+            if sb:
+                netz = min(leistung, sb['bezogen'])
+                batterie = min(leistung - netz, sb['entladen'])
+                pv = leistung - netz - batterie
+                ergebnis['netz_kwh'] += netz * dauer
+                ergebnis['batterie_kwh'] += batterie * dauer
+                ergebnis['pv_kwh'] += pv * dauer
+                ergebnis['einspeisung_vermieden_kwh'] += max(pv - sb['aufnehmbar'], 0) * dauer
+        if sb and 0 < dauer <= max_luecke_s:
+            ergebnis['eingespeist_kwh'] += sb['eingespeist'] * dauer
+            ergebnis['bezogen_kwh'] += sb['bezogen'] * dauer
+        zeit_alt = zeit
+
+        if quelle == 0:
+            goe_neu = {'leistung': _nrg_liste(zeile['nrg'])[11] * 10, 'car': str(zeile['car']),
+                       'amp': _ganzzahl(zeile['amp']), 'alw': _ganzzahl(zeile['alw']), 'err': _ganzzahl(zeile['err']),
+                       'dws': _ganzzahl(zeile['dws'])}
+            if goe:
+                ergebnis['amp_aenderungen'] += goe_neu['amp'] != goe['amp']
+                ergebnis['alw_aenderungen'] += goe_neu['alw'] != goe['alw']
+                ergebnis['goe_fehler'] += bool(goe_neu['err'] and not goe['err'])
+                # dws zählt je Ladevorgang hoch (in 10 Ws) und beginnt beim nächsten Ladevorgang wieder bei 0
+                ergebnis['geladen_dws_kwh'] += goe_neu['dws'] * 10 - goe['dws'] * 10 * (goe_neu['dws'] >= goe['dws'])
+            goe = goe_neu
+        else:
+            einspeisung, batterie = _ganzzahl(zeile['GridFeedIn_W']), _ganzzahl(zeile['Pac_total_W'])
+            sb = {'eingespeist': max(einspeisung, 0), 'bezogen': max(-einspeisung, 0), 'entladen': max(batterie, 0),
+                  'aufnehmbar': 0 if _ganzzahl(zeile['USOC']) >= 100 else max(sb_max_w + min(batterie, 0), 0)}
+
+    for feld in ENERGIELOG_AUSWERTUNG:
+        if feld.endswith('_kwh'):
+            ergebnis[feld] /= 3.6e6  # Ws → kWh
+    ergebnis['meldungen_fehler'] = meldungen_fehler_zaehlen(verzeichnis, datum)
+    return ergebnis
+
+
+def energielog_auswertungen_summieren(ergebnisse, datum: str) -> dict:
+    """Summiert Ergebnisse von energielog_tag_auswerten, z.B. zu einem Monat.
+
+    :param ergebnisse: Iterable mit Ergebnissen von energielog_tag_auswerten
+    :param datum: Bezeichnung der Summe, z.B. der Monat JJJJ-MM
+    :return: dict-Objekt im Aufbau von energielog_tag_auswerten, dazu 'tage'
+    """
+    summe = {'datum': datum, 'tage': 0} | dict.fromkeys(ENERGIELOG_AUSWERTUNG, 0) | {'car_s': {}}
+    for ergebnis in ergebnisse:
+        summe['tage'] += 1
+        for feld in ENERGIELOG_AUSWERTUNG:
+            summe[feld] += ergebnis[feld]
+        for car, sekunden in ergebnis['car_s'].items():
+            summe['car_s'][car] = summe['car_s'].get(car, 0) + sekunden
+    return summe
+
+
+def ueberschuss_bestimmen_vektor(daten: dict, konf: dict):
+    """ueberschuss_bestimmen für alle Datenpunkte aus energielog_laden auf einmal.
+
+    :param daten: dict-Objekt mit NumPy-Arrays aus energielog_laden
+    :param konf: dict-Objekt mit der Konfiguration, deren Ladeverhalten nachgerechnet werden soll
+    :return: NumPy-Array mit der verfügbaren Leistung in W je Datenpunkt
+    """
+    import numpy as np
+
+    anzahl = len(daten['nrg'])
+    goe_leistung_w = daten['nrg'][:, 11] * 10
+    puffer = konf['ladeleistung_puffer_W']
+
+    # Reihenfolge der Rechenschritte wie in goe_ladeleistung_bestimmen, damit auch Kommawerte bitgleich sind
+    lade_soll_w = np.zeros(anzahl, dtype=np.int64)
+    if konf['laden_prio'] == 'Überschuss':
+        laedt, entlaedt = daten['BatteryCharging'], daten['BatteryDischarging']
+        lade_soll_w = np.select([laedt & ~entlaedt, ~laedt & entlaedt, ~laedt & ~entlaedt],
+                                [daten['GridFeedIn_W'] + goe_leistung_w + daten['Pac_total_W'] - puffer,
+                                 daten['GridFeedIn_W'] + goe_leistung_w - daten['Pac_total_W'] - puffer,
+                                 daten['GridFeedIn_W'] + goe_leistung_w - puffer], 0)
+    elif konf['laden_prio'] == 'PV':
+        lade_soll_w = daten['Production_W'] - daten['Consumption_W'] + goe_leistung_w - puffer
+    elif konf['laden_prio'] == 'PV+SB':
+        lade_soll_w = np.where(daten['USOC'] > konf['min_batterie_soc'],
+                               daten['Production_W'] - daten['Consumption_W'] + goe_leistung_w + konf['sb_max_w']
+                               - puffer,
+                               daten['Production_W'] - daten['Consumption_W'] + goe_leistung_w - puffer)
+    elif konf['laden_prio'] == 'frei':
+        lade_soll_w = np.full(anzahl, 99999, dtype=np.int64)
+    return lade_soll_w
+
+
+def goe_ladeleistung_bestimmen_vektor(daten: dict, konf: dict, lade_soll_w=None) -> dict:
+    """Rechnet goe_ladeleistung_bestimmen für alle Datenpunkte aus energielog_laden auf einmal mit NumPy nach, inkl.
+    der Sprungbegrenzung sprung_max_a und der gelernten Ladekurve. Die Ladekurve entwickelt sich dabei wie in der
+    Hauptschleife: vor jedem Datenpunkt, bei dem ladekurve_lernen_erlaubt gilt, wird die aktuelle Ladeleistung beim
+    aktuellen amp-Wert eingerechnet. Das Ergebnis ist identisch mit dem der skalaren Funktion.
+
+    :param daten: dict-Objekt mit NumPy-Arrays aus energielog_laden
+    :param konf: dict-Objekt mit der Konfiguration, deren Ladeverhalten nachgerechnet werden soll
+    :param lade_soll_w: Verfügbare Leistung je Datenpunkt, z.B. aus UeberschussPrognose.reihe. Standard ist
+        ueberschuss_bestimmen_vektor
+    :return: dict-Objekt mit Arrays 'A' und 'W' wie bei goe_ladeleistung_bestimmen und 'gueltig' (False, wo die
+        skalare Funktion wegen einer Division durch 0 abbrechen würde)
+    """
+    import numpy as np
+
+    nrg = daten['nrg']
+    anzahl = len(nrg)
+    goe_u = nrg[:, 0:3].sum(axis=1) / 3
+    goe_leistung_w = nrg[:, 11] * 10
+    if lade_soll_w is None:
+        lade_soll_w = ueberschuss_bestimmen_vektor(daten, konf)
+
+    # Umrechnung Watt → Ampere, Drehstrom oder Wechselstrom
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lade_soll_amp = np.where((nrg[:, 0:3] != 0).all(axis=1), lade_soll_w / (3 ** 0.5 * goe_u),
+                                 lade_soll_w / nrg[:, 0])
+    gueltig = np.isfinite(lade_soll_amp)
+    lade_soll_amp = np.floor(np.where(gueltig, lade_soll_amp, 0)).astype(np.int64)
+    lade_soll_amp = np.where(lade_soll_w == 99999, 32, lade_soll_amp)
+    lade_soll_amp = np.minimum(lade_soll_amp, daten['cbl'])
+    lade_soll_amp = np.where(daten['loe'] == 1, np.minimum(lade_soll_amp, daten['loa']), lade_soll_amp)
+    lade_soll_amp = np.maximum(lade_soll_amp, konf['zoe_modus'] * 6)
+
+    amp_ist = daten['amp'].astype(np.int64)
+    if not konf['simulieren']:
+        sprung = lade_soll_amp - amp_ist
+        lade_soll_amp = np.where(sprung > konf['sprung_max_a'], amp_ist + konf['sprung_max_a'],
+                                 np.where(sprung < -konf['sprung_max_a'], amp_ist - konf['sprung_max_a'],
+                                          lade_soll_amp))
+
+    # Ladekurve je Datenpunkt wie die Ladekurve-Klasse: Spalte a enthält den bis dahin geglätteten Wert bei amp == a.
+    # Die Glättung selbst ist eine Rekursion und läuft je Messpunkt, alles Weitere für alle Datenpunkte gemeinsam.
+    startkurve = Ladekurve({0: 0} | konf['ladekurve'], konf['ladekurve_glaettung'])
+    glaettung = konf['ladekurve_glaettung']
+    spalten = LADEKURVE_MAX_A + 1
+    lernt = (daten['car'] == 2) & (daten['alw'] == 1) & (goe_leistung_w > 0)
+    kurve = np.empty((anzahl, spalten))
+    zeilen_nr = np.arange(anzahl)
+    for a in range(spalten):
+        lern_zeilen = np.flatnonzero(lernt & (amp_ist == a))
+        werte = [startkurve.watt[a]]
+        for watt in goe_leistung_w[lern_zeilen].tolist():
+            werte.append(watt if np.isnan(werte[-1]) else glaettung * watt + (1 - glaettung) * werte[-1])
+        kurve[:, a] = np.array(werte)[np.searchsorted(lern_zeilen, zeilen_nr, side='right')]
+
+    # Lineare Interpolation zwischen den bekannten Nachbarn und monotone Hülle, je Datenpunkt
+    bekannt = ~np.isnan(kurve)
+    spalte = np.arange(spalten)
+    links = np.maximum.accumulate(np.where(bekannt, spalte, -1), axis=1)
+    rechts = np.minimum.accumulate(np.where(bekannt, spalte, spalten)[:, ::-1], axis=1)[:, ::-1]
+    innen = ~bekannt & (links >= 0) & (rechts < spalten)
+    links_w = np.take_along_axis(kurve, np.clip(links, 0, spalten - 1), axis=1)
+    rechts_w = np.take_along_axis(kurve, np.clip(rechts, 0, spalten - 1), axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kurve = np.where(innen, links_w + (rechts_w - links_w) * (spalte - links) / (rechts - links), kurve)
+    huelle = np.fmax.accumulate(kurve, axis=1)
+
+    # Höchster Strom, dessen Leistung laut Hülle höchstens lade_soll_w ist, dann Leistung laut Kurve
+    lade_soll_amp = np.minimum(lade_soll_amp, (huelle <= lade_soll_w[:, None]).sum(axis=1) - 1)
+    innerhalb = (lade_soll_amp >= 0) & (lade_soll_amp < spalten)
+    wert = kurve[zeilen_nr, np.clip(lade_soll_amp, 0, spalten - 1)]
+    lade_soll_w = np.where(innerhalb & ~np.isnan(wert), np.round(wert), lade_soll_w)
+
+    return {'A': np.where(gueltig, lade_soll_amp, 0), 'W': np.where(gueltig, lade_soll_w, 0), 'gueltig': gueltig}
+
+
+# Alle Messwerte des Metrik-Endpunkts: Name → (Typ, Hilfetext). Zeiten in Sekunden, Leistungen in W.
+METRIKEN = {
+    'sbgoe_abrufdauer_sekunden': ('histogram', 'Dauer der Datenabfrage je Gerät'),
+    'sbgoe_abruf_fehler_total': ('counter', 'Fehlgeschlagene Datenabfragen je Gerät'),
+    'sbgoe_schutzschalter_offen_total': ('counter', 'Pausen der Datenabfrage nach Fehlern in Folge je Gerät'),
+    'sbgoe_veraltete_daten_total': ('counter', 'Zyklen mit den letzten gültigen statt aktuellen Daten je Gerät'),
+    'sbgoe_berechnung_sekunden': ('histogram', 'Rechenzeit von goe_ladeleistung_bestimmen'),
+    'sbgoe_setzen_sekunden': ('histogram', 'Antwortzeit beim Setzen eines Go-E-Parameters'),
+    'sbgoe_setzen_fehler_total': ('counter', 'Fehlgeschlagenes Setzen von Go-E-Parametern'),
+    'sbgoe_log_schreiben_sekunden': ('histogram', 'Dauer eines Schreibvorgangs des LogSchreibers'),
+    'sbgoe_log_verworfen_total': ('counter', 'Verworfene Logzeilen'),
+    'sbgoe_takte_uebersprungen_total': ('counter', 'Übersprungene Takte der Hauptschleife'),
+    'sbgoe_ladestrom_vorgabe_ampere': ('gauge', 'Aktuelle Ladestrom-Vorgabe'),
+    'sbgoe_ladeleistung_watt': ('gauge', 'Aktuelle Ladeleistung laut Go-E'),
+    'sbgoe_ueberschuss_watt': ('gauge', 'Verfügbare Leistung laut ueberschuss_bestimmen'),
+    'sbgoe_ueberschuss_prognose_watt': ('gauge', 'Verfügbare Leistung laut UeberschussPrognose'),
+    'sbgoe_abfrage_intervall_sekunden': ('gauge', 'Aktuelles Abfrageintervall laut AbfragePlaner je Gerät'),
+}
+METRIKEN_GRENZEN = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # Histogramm-Buckets in s
+
+
+class Metriken:
+    """Sammelt die Messwerte aus METRIKEN für den Prometheus-Endpunkt. Alle Methoden sind threadsicher und billig
+    genug für jeden Zyklus. Labels werden als Schlüsselwortargumente übergeben, z.B. geraet='SB'. Namen, die nicht mit
+    passendem Typ in METRIKEN stehen, werden schon beim Aufruf mit ValueError abgelehnt, statt später den ganzen
+    Endpunkt zu stören."""
+
+    def __init__(self):
+        import threading
+
+        self.lock = threading.Lock()
+        self.werte = {}  # (Name, Labels) → Zahl, bei Histogrammen [Anzahl je Bucket inkl. +Inf, Summe, Anzahl]
+
+    @staticmethod
+    def _pruefen(name: str, typ: str):
+        """Lehnt Namen ab, die nicht mit diesem Typ in METRIKEN stehen."""
+        if METRIKEN.get(name, (None,))[0] != typ:
+            raise ValueError(f'Fehler:  Metrik {name} ist nicht als {typ} in METRIKEN eingetragen!')
+
+    def beobachten(self, name: str, wert: float, **labels):
+        """Trägt einen Wert in ein Histogramm ein."""
+        import bisect
+
+        self._pruefen(name, 'histogram')
+        schluessel = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogramm = self.werte.get(schluessel)
+            if histogramm is None:
+                histogramm = self.werte[schluessel] = [[0] * (len(METRIKEN_GRENZEN) + 1), 0.0, 0]
+            histogramm[0][bisect.bisect_left(METRIKEN_GRENZEN, wert)] += 1
+            histogramm[1] += wert
+            histogramm[2] += 1
+
+    def zaehlen(self, name: str, anzahl: float = 1, **labels):
+        """Erhöht einen Zähler."""
+        self._pruefen(name, 'counter')
+        schluessel = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.werte[schluessel] = self.werte.get(schluessel, 0) + anzahl
+
+    def setzen(self, name: str, wert: float, **labels):
+        """Setzt einen Momentanwert."""
+        self._pruefen(name, 'gauge')
+        with self.lock:
+            self.werte[(name, tuple(sorted(labels.items())))] = wert
+
+    def text(self) -> str:
+        """Alle Messwerte im Textformat von Prometheus (Version 0.0.4)."""
+        def labels_text(labels: tuple, zusatz: tuple = ()) -> str:
+            alle = labels + zusatz
+            if not alle:
+                return ''
+            return '{' + ','.join(f'{name}="{str(wert)}"' for name, wert in alle) + '}'
+
+        with self.lock:
+            werte = sorted((schluessel, wert if not isinstance(wert, list) else [list(wert[0]), wert[1], wert[2]])
+                           for schluessel, wert in self.werte.items())
+        zeilen = []
+        beschrieben = set()
+        for (name, labels), wert in werte:
+            typ, hilfe = METRIKEN[name]
+            if name not in beschrieben:
+                zeilen += [f'# HELP {name} {hilfe}', f'# TYPE {name} {typ}']
+                beschrieben.add(name)
+            if typ == 'histogram':
+                kumuliert = 0
+                for grenze, anzahl in zip(METRIKEN_GRENZEN + ('+Inf',), wert[0]):
+                    kumuliert += anzahl
+                    zeilen.append(f'{name}_bucket{labels_text(labels, (("le", grenze),))} {kumuliert}')
+                zeilen.append(f'{name}_sum{labels_text(labels)} {wert[1]}')
+                zeilen.append(f'{name}_count{labels_text(labels)} {wert[2]}')
+            else:
+                zeilen.append(f'{name}{labels_text(labels)} {wert}')
+        return '\n'.join(zeilen) + '\n'
+
+
+_metriken = None  # Gemeinsame Metriken des Programms, siehe metriken_holen
+
+
+def metriken_holen():
+    """Gibt die gemeinsamen Metriken des Programms zurück, sie werden beim ersten Aufruf erstellt.
+
+    :return: Metriken-Objekt
+    """
+    global _metriken
+    if _metriken is None:
+        _metriken = Metriken()
+    return _metriken
+
+
+def metriken_server_starten(konf: dict):
+    """Startet den Metrik-Endpunkt http://<metriken_adresse>:<metriken_port>/metrics in einem Hintergrund-Thread, falls
+    konf['metriken_port'] nicht 0 ist.
+
+    :param konf: dict-Objekt mit der aktuellen Konfiguration
+    :return: ThreadingHTTPServer-Objekt oder None, falls deaktiviert
+    """
+    import http.server
+    import threading
+
+    if not konf['metriken_port']:
+        return None
+
+    class MetrikenHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            daten = metriken_holen().text().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(daten)))
+            self.end_headers()
+            self.wfile.write(daten)
+
+        def log_message(self, format, *args):
+            pass  # Keine Zeile je Abfrage auf der Konsole
+
+    server = http.server.ThreadingHTTPServer((konf['metriken_adresse'], konf['metriken_port']), MetrikenHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='Metriken', daemon=True).start()
+    return server
+
+
+class Spur:
+    """Zeichnet Zeitspannen im Chrome-Trace-Event-Format auf (JSON Array Format, lesbar mit chrome://tracing oder
+    ui.perfetto.dev). Geschrieben wird über den LogSchreiber, die Hauptschleife wartet also nicht auf die SD-Karte.
+    Jeder Thread bekommt eine eigene Spur, parallele Abrufe liegen daher nebeneinander.
+
+    Eine bestehende Datei wird beim Start ersetzt, sonst stünden die neuen Ereignisse hinter der schließenden Klammer
+    des alten Arrays. Verwirft der LogSchreiber Ereignisse wegen voller Warteschlange, steht an ihrer Stelle eine
+    Zeitmarke "Spur-Ereignisse verworfen" mit der Anzahl in der Datei.
+
+    Eine inaktive Spur (dateiname None) nimmt alle Aufrufe an und tut nichts.
+    """
+
+    def __init__(self, dateiname: str = None, konf: dict = None):
+        import os
+        import threading
+        import time
+
+        self.dateiname = dateiname
+        self.konf = konf
+        self.aktiv = dateiname is not None
+        self.pid = os.getpid()
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+        self.offen = {}  # Thread-ID → (Name, Beginn in µs, args) der offenen Phase
+        self.threads = set()  # Threads, deren Name schon geschrieben wurde
+        self.verworfen = 0  # Verworfene Ereignisse, die noch nicht als Zeitmarke in der Datei stehen
+        if self.aktiv and os.path.isfile(dateiname):  # Der LogSchreiber legt die Datei dann mit '[' neu an
+            os.remove(dateiname)
+
+    def _jetzt_us(self) -> float:
+        import time
+
+        return round((time.perf_counter() - self.start) * 1e6, 1)
+
+    def _schreiben(self, ereignis: dict):
+        import json
+        import threading
+
+        tid = threading.get_ident()
+        ereignis = {'pid': self.pid, 'tid': tid} | ereignis  # Beim Beenden offener Phasen ist tid vorgegeben
+        zeilen = ''
+        with self.lock:
+            thread_neu = tid not in self.threads
+            if thread_neu:
+                self.threads.add(tid)
+                zeilen = json.dumps({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid,
+                                     'args': {'name': threading.current_thread().name}}) + ',\n'
+        verworfen, marke = self._verworfen_marke(tid)
+        if not log_schreiber_holen(self.konf).schreiben(self.dateiname, zeilen + marke + json.dumps(ereignis) + ',\n',
+                                                        '[\n'):
+            with self.lock:  # Warteschlange voll: beim nächsten Ereignis nachtragen
+                self.verworfen += verworfen + 1
+                if thread_neu:
+                    self.threads.discard(tid)
+
+    def _verworfen_marke(self, tid: int) -> tuple:
+        """Übernimmt die Zahl verworfener Ereignisse für eine Zeitmarke.
+
+        :return: Tuple (Anzahl, Zeile mit der Zeitmarke bzw. '' falls nichts verworfen wurde)
+        """
+        import json
+
+        with self.lock:
+            verworfen, self.verworfen = self.verworfen, 0
+        if not verworfen:
+            return 0, ''
+        return verworfen, json.dumps({'name': 'Spur-Ereignisse verworfen', 'cat': 'spur', 'ph': 'i', 's': 'g',
+                                      'pid': self.pid, 'tid': tid, 'ts': self._jetzt_us(),
+                                      'args': {'anzahl': verworfen}}) + ',\n'
+
+    def phase(self, name: str = None, **args):
+        """Beendet die offene Phase dieses Threads und beginnt eine neue. Damit lassen sich die Abschnitte der
+        Hauptschleife auch über continue hinweg lückenlos aufteilen.
+
+        :param name: Name der neuen Phase, None beendet nur die offene
+        :param args: Zusätzliche Werte, die im Trace-Viewer bei der Phase angezeigt werden
+        """
+        import threading
+
+        if not self.aktiv:
+            return
+        jetzt = self._jetzt_us()
+        tid = threading.get_ident()
+        offen = self.offen.pop(tid, None)
+        if offen is not None:
+            self._schreiben({'name': offen[0], 'cat': 'phase', 'ph': 'X', 'ts': offen[1],
+                             'dur': round(jetzt - offen[1], 1), 'args': offen[2]})
+        if name is not None:
+            self.offen[tid] = (name, jetzt, args)
+
+    def spanne(self, name: str, **args):
+        """Kontextmanager für eine einzelne Zeitspanne, z.B. einen Abruf in einem Worker-Thread."""
+        import contextlib
+
+        if not self.aktiv:
+            return contextlib.nullcontext()
+
+        @contextlib.contextmanager
+        def messen():
+            beginn = self._jetzt_us()
+            try:
+                yield
+            finally:
+                self._schreiben({'name': name, 'cat': 'spanne', 'ph': 'X', 'ts': beginn,
+                                 'dur': round(self._jetzt_us() - beginn, 1), 'args': args})
+        return messen()
+
+    def markieren(self, name: str, **args):
+        """Setzt eine Zeitmarke, z.B. für den Beginn eines Zyklus."""
+        if self.aktiv:
+            self._schreiben({'name': name, 'cat': 'marke', 'ph': 'i', 's': 'p', 'ts': self._jetzt_us(), 'args': args})
+
+    def beenden(self):
+        """Beendet alle offenen Phasen und schließt das JSON-Array ab."""
+        import json
+
+        if not self.aktiv:
+            return
+        jetzt = self._jetzt_us()
+        for tid, (name, beginn, args) in list(self.offen.items()):
+            self._schreiben({'name': name, 'cat': 'phase', 'ph': 'X', 'ts': beginn, 'dur': round(jetzt - beginn, 1),
+                             'args': args, 'tid': tid})
+        self.offen.clear()
+        verworfen, marke = self._verworfen_marke(0)
+        if not log_schreiber_holen(self.konf).schreiben(
+                self.dateiname, marke + json.dumps({'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0,
+                                                    'args': {'name': 'SB-GoE-Überschussladen'}}) + '\n]\n', '[\n'):
+            print(f'!!!!Spur <{self.dateiname}> konnte nicht abgeschlossen werden, {verworfen + 1} Ereignisse '
+                  f'verworfen. Das JSON-Array bleibt offen, chrome://tracing kann sie trotzdem laden.')
+        self.aktiv = False
+
+
+_spur = Spur()  # Gemeinsame Spur des Programms, inaktiv bis spur_starten aufgerufen wird
+
+
+def spur_starten(dateiname: str, konf: dict):
+    """Aktiviert die gemeinsame Spur des Programms, siehe Spur.
+
+    :param dateiname: Zieldatei für die Trace-Events, z.B. logs/spur.json
+    :param konf: dict-Objekt mit der aktuellen Konfiguration (für den LogSchreiber)
+    :return: Spur-Objekt
+    """
+    global _spur
+    _spur = Spur(dateiname, konf)
+    return _spur
+
+
+def spur_holen():
+    """Gibt die gemeinsame Spur des Programms zurück, ohne spur_starten eine inaktive Spur."""
+    return _spur
+
+
+class Stichprobenprofiler:
+    """Einfacher Sampling-Profiler ohne Zusatzpakete. Ein Hintergrund-Thread sieht alle intervall_s Sekunden in den
+    Stack des beobachteten Threads und zählt, in welchen Funktionen er gerade steckt. Stichproben, in denen der Thread
+    im ZyklusTakt auf den nächsten Takt wartet, zählen als Leerlauf und nicht zu den Funktionen.
+    """
+
+    def __init__(self, intervall_s: float = 0.005, thread_id: int = None):
+        """
+        :param intervall_s: Abstand der Stichproben in Sekunden
+        :param thread_id: Beobachteter Thread, Standard ist der aufrufende Thread
+        """
+        import collections
+        import threading
+
+        self.intervall_s = intervall_s
+        self.thread_id = thread_id or threading.get_ident()
+        self.eigen = collections.Counter()  # Funktion → Stichproben, in denen sie ganz oben auf dem Stack war
+        self.gesamt = collections.Counter()  # Funktion → Stichproben, in denen sie irgendwo im Stack war
+        self.stichproben = 0
+        self.leerlauf = 0
+        self.lock = threading.Lock()
+        self.stopp = threading.Event()
+        self.thread = threading.Thread(target=self._arbeiten, name='Stichprobenprofiler', daemon=True)
+
+    def starten(self):
+        """Startet die Stichproben im Hintergrund-Thread."""
+        self.thread.start()
+        return self
+
+    def stoppen(self):
+        """Beendet die Stichproben."""
+        self.stopp.set()
+
+    def _arbeiten(self):
+        import sys
+
+        leerlauf_code = ZyklusTakt.warten.__code__
+        while not self.stopp.wait(self.intervall_s):
+            rahmen = sys._current_frames().get(self.thread_id)
+            if rahmen is None:
+                continue
+            funktionen = []
+            while rahmen is not None:
+                code = rahmen.f_code
+                if code is leerlauf_code:
+                    break
+                funktionen.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{code.co_firstlineno})')
+                rahmen = rahmen.f_back
+            with self.lock:
+                self.stichproben += 1
+                if rahmen is not None:
+                    self.leerlauf += 1
+                elif funktionen:
+                    self.eigen[funktionen[0]] += 1
+                    self.gesamt.update(set(funktionen))
+
+    def top(self, anzahl: int = 10) -> list:
+        """Die Funktionen, in denen der Thread am häufigsten selbst gerechnet hat.
+
+        :return: Liste aus Tupeln (Funktion, Anteil eigen in %, Anteil gesamt inkl. aufgerufener Funktionen in %),
+            bezogen auf alle Stichproben außer Leerlauf
+        """
+        with self.lock:
+            aktiv = max(self.stichproben - self.leerlauf, 1)
+            return [(funktion, anzahl_eigen / aktiv * 100, self.gesamt[funktion] / aktiv * 100)
+                    for funktion, anzahl_eigen in self.eigen.most_common(anzahl)]
+
+    def zuruecksetzen(self):
+        """Beginnt eine neue Zählung."""
+        with self.lock:
+            self.eigen.clear()
+            self.gesamt.clear()
+            self.stichproben = 0
+            self.leerlauf = 0
+
+
+class ZyklusTakt:
+    """Taktgeber für die Hauptschleife auf einem festen Zeitraster mit monotoner Uhr. Die Zyklen beginnen immer im
+    Abstand periode_s, unabhängig davon, wie lange die Arbeit im Zyklus gedauert hat. Verpasste Takte werden
+    übersprungen statt nachgeholt. Zwischen den Takten schläft der Thread, statt regelmäßig nachzusehen.
+    """
+
+    def __init__(self, periode_s: float):
+        import collections
+        import threading
+        import time
+
+        self.periode_s = periode_s
+        self.naechster_takt = time.monotonic()  # Der erste Zyklus beginnt sofort
+        self.stopp = threading.Event()
+        self.stopp_signal = False  # Einfaches Flag für Signal-Handler, die das Event nicht setzen dürfen
+        self.wecker = None  # Socket-Paar (lesen, schreiben), signal.set_wakeup_fd schreibt je Signal ein Byte
+        self.verpasst = 0  # Anzahl übersprungener Takte
+        self.verspaetungen = collections.deque(maxlen=1000)  # Aufwach-Verspätung der letzten Takte in s
+
+    def warten(self, countdown: bool = False) -> bool:
+        """Schläft bis zum nächsten Takt.
+
+        :param countdown: Verbleibende Sekunden auf der Konsole herunterzählen (wacht dafür einmal je Sekunde auf)
+        :return: Bool-Wert False, falls der Takt mit stoppen() oder signal_stoppen() beendet wurde, sonst True
+        """
+        import math
+        import select
+        import time
+
+        self.naechster_takt += self.periode_s
+        jetzt = time.monotonic()
+        if jetzt >= self.naechster_takt:  # Zyklus hat länger gedauert als die Periode, verpasste Takte überspringen
+            verpasst = math.floor((jetzt - self.naechster_takt) / self.periode_s) + 1
+            self.naechster_takt += verpasst * self.periode_s
+            self.verpasst += verpasst
+            metriken_holen().zaehlen('sbgoe_takte_uebersprungen_total', verpasst)
+
+        while not self.gestoppt():
+            rest = self.naechster_takt - time.monotonic()
+            if rest <= 0:
+                break
+            if countdown:
+                print(f'{math.ceil(rest)}... ', end='', flush=True)
+                rest = rest - math.ceil(rest) + 1  # Bis zur nächsten vollen Sekunde vor dem Takt
+            if self.wecker is None:
+                self.stopp.wait(rest)
+            elif select.select([self.wecker[0]], [], [], rest)[0]:  # Ein Signal ist eingetroffen, Bytes verwerfen
+                try:
+                    while self.wecker[0].recv(4096):
+                        pass
+                except (BlockingIOError, InterruptedError):
+                    pass
+        if not self.gestoppt():
+            self.verspaetungen.append(time.monotonic() - self.naechster_takt)
+        return not self.gestoppt()
+
+    def gestoppt(self) -> bool:
+        """Wurde der Takt mit stoppen() oder signal_stoppen() beendet?"""
+        return self.stopp_signal or self.stopp.is_set()
+
+    def stoppen(self):
+        """Beendet das Warten sofort, aus einem anderen Thread oder einer asyncio-Loop. Auch folgende Aufrufe von
+        warten() kehren sofort zurück. Nicht aus einem Signal-Handler aufrufen, dafür gibt es signal_stoppen()."""
+        self.stopp.set()
+
+    def signal_stoppen(self):
+        """Beendet das Warten aus einem Signal-Handler: setzt nur ein Flag, denn Event.set() nimmt eine Sperre, die
+        der unterbrochene Haupt-Thread gerade halten kann. Sofort geweckt wird warten() nur nach signale_wecken(),
+        sonst prüft es das Flag, wenn seine Wartezeit abgelaufen ist."""
+        self.stopp_signal = True
+
+    def signale_wecken(self):
+        """Lässt jedes Signal ein wartendes warten() sofort aufwecken, über signal.set_wakeup_fd. Nur im Haupt-Thread
+        aufrufbar und nur für einen Takt je Prozess."""
+        import signal
+        import socket
+
+        self.wecker = socket.socketpair()
+        for wecker_socket in self.wecker:
+            wecker_socket.setblocking(False)
+        signal.set_wakeup_fd(self.wecker[1].fileno(), warn_on_full_buffer=False)
+
+    def statistik(self) -> str:
+        """Text mit der gemessenen Aufwach-Verspätung (Jitter) und den übersprungenen Takten"""
+        import statistics
+
+        if not self.verspaetungen:
+            return 'Keine Takte gemessen.'
+        sortiert = sorted(self.verspaetungen)
+        return (f'Jitter über {len(sortiert)} Takte: Mittel {statistics.fmean(sortiert) * 1000:.2f} ms, '
+                f'95 % {sortiert[min(int(len(sortiert) * 0.95), len(sortiert) - 1)] * 1000:.2f} ms, '
+                f'max. {sortiert[-1] * 1000:.2f} ms. Übersprungene Takte: {self.verpasst}.')
+
+
+class AbfragePlaner:
+    """Abfrage-Intervall je Gerät für Hauptprogramm.py, statt beide Geräte immer im Abstand wartezeit abzufragen.
+
+    Ist nichts zu regeln (kein Fahrzeug, car 1, oder Laden beendet, car 4, oder in den Modi Überschuss und PV keine
+    PV-Leistung), wächst das Intervall bis konf['abfrage_max_s']. Ein vom Programm pausiertes Laden (car 3 mit alw 0)
+    zählt nicht dazu, es soll ohne Verzögerung weiterladen, sobald wieder genug Leistung da ist. Sonst ist das
+    Intervall konf['wartezeit'], solange sich der Messwert des Geräts (SB: verfügbare Leistung, Go-E: Ladeleistung)
+    zwischen zwei Abfragen um weniger als konf['abfrage_schwelle_w'] ändert. Bei größeren Änderungen halbiert es sich
+    bis konf['abfrage_min_s'] und wächst danach wieder schrittweise.
+    """
+
+    GERAETE = ('Go-E', 'SB')
+
+    def __init__(self, konf: dict):
+        self.intervalle = {geraet: konf['wartezeit'] for geraet in self.GERAETE}  # Gerät → Intervall in s
+        self.messwerte = {}  # Gerät → Messwert der letzten neuen Daten in W
+
+    def anpassen(self, goe_status_i: GoEStatus, sb_status_i: SBStatus, neu: dict, konf: dict) -> dict:
+        """Passt die Intervalle nach einem Zyklus an.
+
+        :param goe_status_i: GoEStatus-Objekt aus den JSON-Daten und Metainformationen des Go-eChargers
+        :param sb_status_i: SBStatus-Objekt aus den JSON-Daten und Metainformationen der SonnenBatterie
+        :param neu: dict-Objekt {Gerät: Bool-Wert}, welche Geräte in diesem Zyklus neue Daten geliefert haben
+        :param konf: dict-Objekt mit der aktuellen Konfiguration
+        :return: dict-Objekt {Gerät: Intervall in s}
+        """
+        goe_leistung_w = goe_status_i.nrg[11] * 10
+        nichts_zu_regeln = goe_status_i.car in (1, 4) or (sb_status_i.Production_W == 0 and
+                                                              konf['laden_prio'] in ('Überschuss', 'PV'))
+        ziel = konf['abfrage_max_s'] if nichts_zu_regeln else konf['wartezeit']
+        messwerte = {'Go-E': goe_leistung_w, 'SB': ueberschuss_bestimmen(sb_status_i, goe_leistung_w, konf)}
+
+        for geraet in self.GERAETE:
+            intervall = self.intervalle[geraet]
+            if neu[geraet]:  # Nur neue Daten zeigen, ob sich etwas bewegt
+                alt = self.messwerte.get(geraet, messwerte[geraet])
+                self.messwerte[geraet] = messwerte[geraet]
+                if abs(messwerte[geraet] - alt) > konf['abfrage_schwelle_w']:
+                    intervall = intervall / 2
+                else:
+                    intervall = intervall * 2
+            # Ein Wechsel des Zustands (z.B. Fahrzeug angesteckt) gilt sofort auch für das andere Gerät
+            self.intervalle[geraet] = min(max(intervall, konf['abfrage_min_s']), ziel)
+            metriken_holen().setzen('sbgoe_abfrage_intervall_sekunden', self.intervalle[geraet], geraet=geraet)
+        return self.intervalle
+
+
+def abwarten(fehler: bool, konf: dict, takt: ZyklusTakt):
+    """Warten bis zum nächsten Zyklus
+
+    :param fehler: Wird die Funktion regulär (False) oder aus einem Fehler (True) heraus aufgerufen?
+    :param konf: dict-Objekt mit der aktuellen Konfiguration
+    :param takt: ZyklusTakt der Hauptschleife
+    :return: Bool-Wert False, falls das Warten durch takt.stoppen() oder takt.signal_stoppen() beendet wurde
+    """
+    spur_holen().phase('Warten')
+    print('-' * 10)
+    print('Zum Beenden des Programms Strg + C drücken.')
+
+    if konf['countdown']:
+        if fehler:
+            print('Nächster Versuch in ', end='', flush=True)
+        else:
+            print('Nächstes Update in ', end='', flush=True)
+    weiter = takt.warten(konf['countdown'])
     print('\n')
+    return weiter
 
 
 def konsole_leeren():